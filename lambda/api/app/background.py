@@ -1,5 +1,6 @@
-from threading import Thread
+from threading import Thread, local
 from queue import Queue
+import asyncio
 import json
 import os
 import requests
@@ -8,6 +9,21 @@ import traceback
 
 logger = logging.getLogger(__name__)
 
+# バックグラウンドスレッドごとに使い回すイベントループ
+_thread_state = local()
+
+
+def run_coroutine(coro):
+    """
+    バックグラウンドスレッド上でコルーチンを実行する
+    asyncio.run と違いタスクごとにイベントループを作り直さず、スレッド内で使い回す
+    """
+    loop = getattr(_thread_state, "loop", None)
+    if loop is None or loop.is_closed():
+        loop = asyncio.new_event_loop()
+        _thread_state.loop = loop
+    return loop.run_until_complete(coro)
+
 class BackgroundTaskExtension(Thread):
     def __init__(self):
         super().__init__()
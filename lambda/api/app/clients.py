@@ -1,15 +1,30 @@
 """
 共通のAWSクライアント設定
 """
+import asyncio
+import functools
 import json
 import logging
-import uuid
+import secrets
+from concurrent.futures import ThreadPoolExecutor
 import boto3
+from boto3.s3.transfer import TransferConfig
 from botocore.config import Config
 from config import settings
 
 logger = logging.getLogger(__name__)
 
+# S3オブジェクトを並列取得するスレッド数
+S3_DOWNLOAD_MAX_WORKERS = 16
+
+# S3クライアントのコネクションプール上限（botocore の既定値は 10）
+# s3_download_pool のスレッドに加えて、転送マネージャー（マルチパートコピー・大きな画像の取得）が
+# 同じクライアントで並行に接続を使うため、スレッド数より大きくしておく
+S3_MAX_POOL_CONNECTIONS = 64
+
+# AgentCore クライアントのコネクションプール上限（botocore の既定値は 10）
+AGENTCORE_MAX_POOL_CONNECTIONS = 32
+
 
 def create_s3_client():
     """
@@ -22,7 +37,12 @@ def create_s3_client():
             signature_version='s3v4',
             s3={
                 'addressing_style': 'virtual'  # バケット仮想ホスト名を使用
-            }
+            },
+            # 並列取得でも接続を使い回せるようにプールを広げ、keep-alive を有効にする
+            max_pool_connections=S3_MAX_POOL_CONNECTIONS,
+            tcp_keepalive=True,
+            # 並列リクエストでのスロットリング（503 SlowDown）に送信レートを合わせて再試行する
+            retries={'max_attempts': 5, 'mode': 'adaptive'}
         )
     )
 
@@ -73,7 +93,10 @@ def create_bedrock_agentcore_client():
         region_name=settings.AWS_REGION,
         config=Config(
             read_timeout=300,
-            retries={'max_attempts': 3}
+            retries={'max_attempts': 3},
+            # 並行する呼び出しでも接続を使い回せるようにプールを広げ、keep-alive を有効にする
+            max_pool_connections=AGENTCORE_MAX_POOL_CONNECTIONS,
+            tcp_keepalive=True
         )
     )
 
@@ -96,6 +119,81 @@ dynamodb_resource = create_dynamodb_resource()
 sagemaker_runtime_client = create_sagemaker_runtime_client()
 bedrock_agentcore_client = create_bedrock_agentcore_client()
 
+@functools.lru_cache(maxsize=8)
+def _get_regional_bedrock_client(region_name):
+    """MODEL_REGION 以外のリージョン用の Bedrock Runtime クライアントを取得（リージョンごとに1つ作成）"""
+    return create_bedrock_client(region_name)
+
+
+def get_bedrock_client(region_name=None):
+    """
+    共有の Bedrock Runtime クライアントを取得
+
+    クライアントの作成はサービス定義の読み込みなどで時間がかかるため、呼び出しごとには作成しない
+
+    Args:
+        region_name (str, optional): リージョン名。未指定時はsettings.MODEL_REGIONを使用
+    """
+    if not region_name or region_name == settings.MODEL_REGION:
+        return bedrock_client
+    return _get_regional_bedrock_client(region_name)
+
+
+# S3転送設定（大きなオブジェクトはマルチパートで並列に転送する）
+s3_transfer_config = TransferConfig(
+    multipart_chunksize=8 * 1024 * 1024,
+    max_concurrency=4
+)
+
+# 大きなオブジェクトの取得設定（awscrt がある場合は CRT でバイト範囲GETをネイティブに並列化する）
+S3_RANGED_GET_THRESHOLD = 16 * 1024 * 1024
+s3_large_download_config = TransferConfig(
+    preferred_transfer_client='crt',
+    multipart_threshold=S3_RANGED_GET_THRESHOLD,
+    multipart_chunksize=16 * 1024 * 1024
+)
+
+# 大きなオブジェクトのサーバー側コピー設定（UploadPartCopy を並列に発行する）
+S3_MULTIPART_COPY_THRESHOLD = 100 * 1024 * 1024
+s3_copy_transfer_config = TransferConfig(
+    multipart_threshold=64 * 1024 * 1024,
+    multipart_chunksize=16 * 1024 * 1024,
+    max_concurrency=8
+)
+
+# 署名付きURL生成用のスレッドプール（同時アップロードのバーストに合わせてサイズを決める）
+S3_SIGNER_MAX_WORKERS = 32
+s3_signer_pool = ThreadPoolExecutor(
+    max_workers=S3_SIGNER_MAX_WORKERS, thread_name_prefix="s3sign")
+
+
+# S3オブジェクトの並列取得用スレッドプール（複数ページ画像の取得などで共有）
+s3_download_pool = ThreadPoolExecutor(
+    max_workers=S3_DOWNLOAD_MAX_WORKERS, thread_name_prefix="s3get")
+
+
+async def generate_presigned_url_async(client_method, params, expires_in, http_method=None):
+    """
+    S3の署名付きURLを専用スレッドプールで生成する
+
+    Args:
+        client_method (str): 'put_object' / 'get_object' など
+        params (dict): 署名対象のパラメータ
+        expires_in (int): 有効期限（秒）
+        http_method (str, optional): HTTPメソッド
+    """
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(
+        s3_signer_pool,
+        functools.partial(
+            s3_client.generate_presigned_url,
+            client_method,
+            Params=params,
+            ExpiresIn=expires_in,
+            HttpMethod=http_method
+        )
+    )
+
 
 class AgentClient:
     """Client for calling AgentCore Runtime"""
@@ -164,15 +262,11 @@ class AgentClient:
                 }
             })
             
-            session_id = str(uuid.uuid4()).replace('-', '') + str(uuid.uuid4()).replace('-', '')[:1]
+            # runtimeSessionId は33文字以上が必要
+            session_id = secrets.token_hex(17)[:33]
             
-            response = self.client.invoke_agent_runtime(
-                agentRuntimeArn=self.runtime_arn,
-                runtimeSessionId=session_id,
-                payload=payload
-            )
-            
-            response_body = response['response'].read()
+            # boto3 はブロッキングのため、スレッドで実行して他のコルーチンと並行させる
+            response_body = await asyncio.to_thread(self._invoke_runtime, session_id, payload)
             response_data = json.loads(response_body)
             
             return self._parse_response(response_data)
@@ -181,6 +275,23 @@ class AgentClient:
             logger.error(f"Error invoking agent: {e}")
             raise
     
+    def _invoke_runtime(self, session_id: str, payload: str) -> bytes:
+        """Call invoke_agent_runtime and read the whole response body
+        
+        Args:
+            session_id: Runtime session ID
+            payload: JSON payload
+            
+        Returns:
+            Raw response body
+        """
+        response = self.client.invoke_agent_runtime(
+            agentRuntimeArn=self.runtime_arn,
+            runtimeSessionId=session_id,
+            payload=payload
+        )
+        return response['response'].read()
+    
     def _parse_response(self, response_data: dict) -> str:
         """Parse AgentCore Runtime response
         
@@ -217,3 +328,18 @@ class AgentClient:
             logger.error(f"Error parsing response: {e}")
             logger.error(f"Response data: {response_data}")
             return f"Error parsing response: {str(e)}"
+
+
+_agent_client = None
+
+
+def get_agent_client():
+    """
+    プロセス全体で共有する AgentClient を取得（初回呼び出し時に生成）
+    
+    チェックやサービスをまたいで同じ AgentCore クライアントとコネクションプールを使い回す
+    """
+    global _agent_client
+    if _agent_client is None:
+        _agent_client = AgentClient()
+    return _agent_client
@@ -7,6 +7,7 @@ class Settings:
     # AWS設定
     BUCKET_NAME: str = os.getenv("BUCKET_NAME", "")
     AWS_REGION: str = os.getenv("AWS_REGION", "ap-northeast-1")
+    S3_CONCURRENCY: int = int(os.getenv("S3_CONCURRENCY", "8"))
 
     # DynamoDB設定
     IMAGES_TABLE_NAME: str = os.getenv("IMAGES_TABLE_NAME", "")
@@ -14,6 +15,13 @@ class Settings:
     TOOLS_TABLE_NAME: str = os.getenv("TOOLS_TABLE_NAME", "")
     DATACHECK_PROJECTS_TABLE_NAME: str = os.getenv("DATACHECK_PROJECTS_TABLE_NAME", "")
     FEEDBACK_TABLE_NAME: str = os.getenv("FEEDBACK_TABLE_NAME", "")
+    EXTRACTION_CACHE_TABLE_NAME: str = os.getenv("EXTRACTION_CACHE_TABLE_NAME", "")
+    EXTRACTION_CACHE_TTL_SECONDS: int = int(os.getenv("EXTRACTION_CACHE_TTL_SECONDS", str(7 * 24 * 3600)))
+    OCR_CACHE_TABLE_NAME: str = os.getenv("OCR_CACHE_TABLE_NAME", "")
+    OCR_CACHE_TTL_SECONDS: int = int(os.getenv("OCR_CACHE_TTL_SECONDS", str(7 * 24 * 3600)))
+
+    # パイプライン設定（ジョブ内で同時に OCR→情報抽出 を実行する画像数）
+    PIPELINE_BATCH_SIZE: int = int(os.getenv("PIPELINE_BATCH_SIZE", "2"))
 
     # 機能フラグ
     ENABLE_OCR: bool = os.getenv("ENABLE_OCR", "true").lower() == "true"
@@ -34,6 +42,7 @@ class Settings:
     
     # Agent設定
     AGENT_RUNTIME_ARN: str = os.getenv("AGENT_RUNTIME_ARN", "")
+    MAX_LLM_CONCURRENCY: int = int(os.getenv("MAX_LLM_CONCURRENCY", "6"))
 
 
 # グローバル設定インスタンス
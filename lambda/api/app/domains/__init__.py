@@ -11,6 +11,7 @@ from .extraction_engine import (
 )
 from .ocr_engine import (
     perform_ocr,
+    perform_ocr_cached,
     perform_ocr_single_page,
     perform_ocr_multipage,
     perform_ocr_individual_page,
@@ -42,6 +43,7 @@ __all__ = [
     "get_s3_object_bytes",
     # OCR
     "perform_ocr",
+    "perform_ocr_cached",
     "perform_ocr_single_page",
     "perform_ocr_multipage",
     "perform_ocr_individual_page",
@@ -4,11 +4,10 @@ from domains.prompts import (
 )
 from utils.helpers import safe_get_from_dynamo_data, float_to_decimal
 from config import settings
-from utils.bedrock import call_bedrock, call_bedrock_with_retry, parse_converse_response, extract_json_from_response, parse_extraction_response
+from utils.bedrock import call_bedrock, call_bedrock_with_retry, call_bedrock_until_json, parse_converse_response, extract_json_from_response, parse_extraction_response
 from clients import s3_client
 from domains.template import generate_unified_template
 import logging
-import base64
 import uuid
 
 from repositories import get_app_schema, get_extraction_fields_for_app, get_field_names_for_app, get_custom_prompt_for_app, DEFAULT_APP
@@ -29,7 +28,7 @@ def extract_information_from_single_image_with_ocr(
     単一画像+OCR結果での情報抽出（純粋関数版）
     
     Args:
-        image_data: 画像のバイナリデータ
+        image_data: 画像のバイナリデータ（None の場合はOCR結果のみで抽出する）
         content_type: 画像のコンテンツタイプ (e.g., 'image/jpeg')
         ocr_result: OCR結果の辞書
         app_extraction_fields: 抽出フィールド定義
@@ -42,11 +41,9 @@ def extract_information_from_single_image_with_ocr(
     try:
         logger.info("単一画像情報抽出を開始")
 
-        # 画像をBase64エンコード
-        image_base64 = base64.b64encode(image_data).decode('utf-8')
-
-        logger.info(
-            f"画像を取得しました: {content_type}, サイズ: {len(image_data)} バイト")
+        if image_data:
+            logger.info(
+                f"画像を取得しました: {content_type}, サイズ: {len(image_data)} バイト")
 
         # 抽出対象の項目リストを生成
         extraction_fields = []
@@ -153,7 +150,7 @@ def extract_information_from_single_image_with_ocr(
         }]
 
         # マルチモーダルでプロンプト作成（画像がある場合）
-        if image_base64:
+        if image_data:
             logger.info("画像を含むマルチモーダルプロンプトを作成します")
 
             # 画像フォーマットを取得
@@ -227,7 +224,7 @@ def extract_information_from_multi_images_with_ocr(
     複数画像+OCR結果での情報抽出（純粋関数版）
     
     Args:
-        page_images: 画像のバイナリデータのリスト
+        page_images: 画像のバイナリデータのリスト（空の場合はOCR結果のみで抽出する）
         content_type: 画像のコンテンツタイプ (e.g., 'image/jpeg')
         ocr_results: OCR結果のリスト
         app_extraction_fields: 抽出フィールド定義
@@ -240,9 +237,6 @@ def extract_information_from_multi_images_with_ocr(
     try:
         logger.info("複数画像情報抽出を開始")
 
-        if not page_images:
-            raise ValueError("画像データを取得できませんでした")
-
         if not ocr_results:
             raise ValueError("OCR結果が見つかりません")
 
@@ -374,9 +368,8 @@ def extract_information_from_multi_images_without_ocr(
 
             logger.info(f"複数画像（{len(images_data)}枚）でLLM呼び出しを開始")
 
-            # Bedrock APIを呼び出し
-            response = call_bedrock(messages, system_prompts)
-            response_text = parse_converse_response(response)
+            # Bedrock APIを呼び出し（JSONを受信し終えた時点で応答の読み込みを終える）
+            response_text = call_bedrock_until_json(messages, system_prompts)
 
             logger.info(f"LLMレスポンス取得完了: {len(response_text)} 文字")
 
@@ -464,9 +457,8 @@ def extract_information_from_single_image_without_ocr(
 
             logger.info("OCRなしモードでLLM呼び出しを開始")
 
-            # Bedrock APIを呼び出し
-            response = call_bedrock(messages, system_prompts)
-            response_text = parse_converse_response(response)
+            # Bedrock APIを呼び出し（JSONを受信し終えた時点で応答の読み込みを終える）
+            response_text = call_bedrock_until_json(messages, system_prompts)
 
             logger.info(f"LLMレスポンス取得完了: {len(response_text)} 文字")
 
@@ -493,10 +485,11 @@ def extract_information_from_single_image_without_ocr(
         raise
 
 
-def get_multipage_ocr_results(image_id: str) -> list:
-    """複数ページOCR結果を取得"""
+def get_multipage_ocr_results(image_id: str, image_data: dict = None) -> list:
+    """複数ページOCR結果を取得（image_data を渡した場合は再取得しない）"""
     try:
-        image_data = get_image(image_id)
+        if image_data is None:
+            image_data = get_image(image_id)
         ocr_result = safe_get_from_dynamo_data(image_data, "ocr_result", {})
 
         # 複数ページOCR結果を取得
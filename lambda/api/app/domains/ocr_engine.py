@@ -1,14 +1,76 @@
 from config import settings
-from clients import s3_client, sagemaker_runtime_client
+from clients import s3_client, s3_download_pool, sagemaker_runtime_client
+from utils.helpers import read_s3_body
+import hashlib
 import json
 import logging
 import base64
 
 from repositories import get_extraction_fields_for_app, get_field_names_for_app, DEFAULT_APP
 from repositories import get_image, update_extracted_info, update_image_status, update_ocr_result
+from repositories import get_cached_ocr_result, put_cached_ocr_result
 
 logger = logging.getLogger(__name__)
 
+# OCR時に取得した画像を情報抽出へ引き継ぐ際のメモリ上限（超えた分は抽出時にS3から再取得する）
+PRELOADED_IMAGES_MAX_BYTES = 200 * 1024 * 1024
+
+
+def _keep_preloaded_image(preloaded_images, s3_key: str, image_bytes: bytes, content_type: str) -> None:
+    """
+    OCR用に取得した画像を情報抽出で再利用できるよう保持する
+
+    Args:
+        preloaded_images: S3キー → (画像データ, Content-Type) の辞書。None の場合は何もしない
+    """
+    if preloaded_images is None:
+        return
+
+    total_bytes = sum(len(data) for data, _ in preloaded_images.values())
+    if total_bytes + len(image_bytes) > PRELOADED_IMAGES_MAX_BYTES:
+        logger.info(f"画像の引き継ぎ上限を超えたため保持しません: {s3_key}")
+        return
+
+    preloaded_images[s3_key] = (image_bytes, content_type)
+
+
+def _get_image_bytes(s3_key: str, preloaded_images: dict = None):
+    """
+    OCR対象の画像を取得する（preloaded_images に先読み済みの画像があればそれを使う）
+
+    S3から取得した画像は情報抽出で再利用できるよう preloaded_images に保持する
+    """
+    if preloaded_images and s3_key in preloaded_images:
+        return preloaded_images[s3_key][0]
+
+    s3_response = s3_client.get_object(Bucket=settings.BUCKET_NAME, Key=s3_key)
+    image_bytes = read_s3_body(s3_response)
+    _keep_preloaded_image(preloaded_images, s3_key, image_bytes,
+                          s3_response.get('ContentType', 'image/jpeg'))
+    return image_bytes
+
+
+def prefetch_images(s3_keys: list) -> dict:
+    """
+    画像をS3から並列に先読みする
+
+    Returns:
+        S3キー → (画像データ, Content-Type) の辞書（取得に失敗した画像は含まない）
+    """
+    def fetch(s3_key):
+        try:
+            s3_response = s3_client.get_object(Bucket=settings.BUCKET_NAME, Key=s3_key)
+            return s3_key, read_s3_body(s3_response), s3_response.get('ContentType', 'image/jpeg')
+        except Exception as e:
+            logger.warning(f"画像の先読みに失敗しました {s3_key}: {str(e)}")
+            return None
+
+    preloaded_images = {}
+    for fetched in s3_download_pool.map(fetch, s3_keys):
+        if fetched is not None:
+            _keep_preloaded_image(preloaded_images, *fetched)
+    return preloaded_images
+
 
 def perform_ocr(image_data):
     """画像データに対してOCR処理を実行し、結果を返す（SageMakerエンドポイント使用）"""
@@ -100,18 +162,46 @@ def perform_ocr(image_data):
         }
 
 
-def perform_ocr_single_page(s3_key: str):
+# OCR結果キャッシュのバージョン（OCR結果の形式や前処理を変えたら上げる）
+OCR_ENGINE_VERSION = "1"
+
+
+def perform_ocr_cached(image_data):
+    """
+    画像の内容が同じOCR結果がキャッシュにあればそれを返し、なければ perform_ocr を実行する
+
+    キーには画像のハッシュに加えて、OCRエンジンのバージョンとエンドポイント設定を含める
+    """
+    digest = hashlib.sha256()
+    digest.update(
+        f"{OCR_ENGINE_VERSION}:{settings.SAGEMAKER_ENDPOINT_NAME}:"
+        f"{settings.SAGEMAKER_INFERENCE_COMPONENT_NAME}:".encode("utf-8"))
+    digest.update(image_data)
+    cache_key = digest.hexdigest()
+
+    ocr_result = get_cached_ocr_result(cache_key)
+    if ocr_result is not None:
+        logger.info(f"OCRキャッシュを使用: {len(ocr_result.get('words', []))}単語")
+        return ocr_result
+
+    ocr_result = perform_ocr(image_data)
+
+    # エラー結果はキャッシュしない
+    if "error" not in ocr_result:
+        put_cached_ocr_result(cache_key, ocr_result)
+    return ocr_result
+
+
+def perform_ocr_single_page(s3_key: str, preloaded_images: dict = None):
     """
     単一ページのOCR処理
     """
     try:
         # S3から画像を取得
-        bucket_name = settings.BUCKET_NAME
-        s3_response = s3_client.get_object(Bucket=bucket_name, Key=s3_key)
-        image_data = s3_response['Body'].read()
+        image_data = _get_image_bytes(s3_key, preloaded_images)
 
-        # perform_ocr関数を使用
-        ocr_result = perform_ocr(image_data)
+        # perform_ocr関数を使用（同じ画像のOCR結果はキャッシュから取得）
+        ocr_result = perform_ocr_cached(image_data)
 
         # エラーチェック
         if "error" in ocr_result:
@@ -128,15 +218,18 @@ def perform_ocr_single_page(s3_key: str):
         raise
 
 
-def perform_ocr_multipage(image_id: str):
+def perform_ocr_multipage(image_id: str, image_data: dict = None, preloaded_images: dict = None):
     """
-    複数ページのOCR処理
+    複数ページのOCR処理（image_data を渡した場合は再取得しない）
+
+    preloaded_images を渡した場合、取得した画像を S3キー → (画像データ, Content-Type) で格納する
     """
     try:
         logger.info(f"複数ページOCR処理を開始: {image_id}")
 
         # 画像データを取得
-        image_data = get_image(image_id)
+        if image_data is None:
+            image_data = get_image(image_id)
         converted_s3_keys = image_data.get("converted_s3_key")
 
         if not converted_s3_keys or not isinstance(converted_s3_keys, list):
@@ -151,7 +244,8 @@ def perform_ocr_multipage(image_id: str):
                     f"ページ {i+1}/{len(converted_s3_keys)} OCR処理中: {s3_key}")
 
                 # 単一ページOCR処理
-                page_ocr_result = perform_ocr_single_page(s3_key)
+                page_ocr_result = perform_ocr_single_page(
+                    s3_key, preloaded_images)
 
                 # ページ情報を追加
                 page_result = {
@@ -185,13 +279,14 @@ def perform_ocr_multipage(image_id: str):
         raise
 
 
-def perform_ocr_individual_page(image_id: str):
-    """個別ページのOCR処理"""
+def perform_ocr_individual_page(image_id: str, image_data: dict = None, preloaded_images: dict = None):
+    """個別ページのOCR処理（image_data を渡した場合は再取得しない）"""
     try:
         logger.info(f"個別ページ処理を実行: {image_id}")
 
         # 画像情報を取得
-        image_data = get_image(image_id)
+        if image_data is None:
+            image_data = get_image(image_id)
         if not image_data:
             raise ValueError(f"Image not found: {image_id}")
 
@@ -200,14 +295,10 @@ def perform_ocr_individual_page(image_id: str):
         if isinstance(s3_key, list):
             s3_key = s3_key[0]  # リストの場合は最初の要素
 
-        from clients import s3_client
-        from config import settings
-        s3_response = s3_client.get_object(
-            Bucket=settings.BUCKET_NAME, Key=s3_key)
-        image_bytes = s3_response['Body'].read()
+        image_bytes = _get_image_bytes(s3_key, preloaded_images)
 
         # OCR処理を行う
-        ocr_result = perform_ocr(image_bytes)
+        ocr_result = perform_ocr_cached(image_bytes)
 
         # OCR結果にエラーがある場合の処理
         if "error" in ocr_result:
@@ -235,13 +326,14 @@ def perform_ocr_individual_page(image_id: str):
         raise
 
 
-def perform_ocr_single_image(image_id: str):
-    """単一画像のOCR処理"""
+def perform_ocr_single_image(image_id: str, image_data: dict = None, preloaded_images: dict = None):
+    """単一画像のOCR処理（image_data を渡した場合は再取得しない）"""
     try:
         logger.info(f"単一画像処理を実行: {image_id}")
 
         # 画像情報を取得
-        image_data = get_image(image_id)
+        if image_data is None:
+            image_data = get_image(image_id)
         if not image_data:
             raise ValueError(f"Image not found: {image_id}")
 
@@ -250,14 +342,10 @@ def perform_ocr_single_image(image_id: str):
         if isinstance(s3_key, list):
             s3_key = s3_key[0]
 
-        from clients import s3_client
-        from config import settings
-        s3_response = s3_client.get_object(
-            Bucket=settings.BUCKET_NAME, Key=s3_key)
-        image_bytes = s3_response['Body'].read()
+        image_bytes = _get_image_bytes(s3_key, preloaded_images)
 
         # OCR処理を行う
-        ocr_result = perform_ocr(image_bytes)
+        ocr_result = perform_ocr_cached(image_bytes)
 
         # OCR結果にエラーがある場合の処理
         if "error" in ocr_result:
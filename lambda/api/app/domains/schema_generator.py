@@ -6,24 +6,31 @@ from utils.bedrock import call_bedrock, parse_converse_response
 
 logger = logging.getLogger(__name__)
 
+# ```json ... ``` ブロックを抽出する正規表現
+_JSON_BLOCK_RE = re.compile(r'```json\s*(.*?)\s*```', re.DOTALL)
 
-def generate_schema_fields_from_image(image_data, instructions=None):
+
+def generate_schema_fields_from_image(image_data, instructions=None, mime_type=None):
     """
     画像からスキーマのフィールド部分のみを生成する関数
 
     Args:
         image_data (bytes): 画像データ
         instructions (str, optional): スキーマ生成の指示
+        mime_type (str, optional): 画像のMIMEタイプ（既知の場合。未指定時は画像データから判定）
 
     Returns:
         dict: 生成されたフィールド定義 {"fields": [...]} の形式
     """
     try:
         # 画像のMIMEタイプを判定
-        image_type = imghdr.what(None, h=image_data)
-        if not image_type:
-            image_type = 'jpeg'  # デフォルト
-        content_type = f"image/{image_type}"
+        if mime_type:
+            content_type = mime_type
+        else:
+            image_type = imghdr.what(None, h=image_data)
+            if not image_type:
+                image_type = 'jpeg'  # デフォルト
+            content_type = f"image/{image_type}"
 
         # システムプロンプト
         system_prompts = [{
@@ -321,8 +328,7 @@ def generate_schema_fields_from_image(image_data, instructions=None):
         fields_text = parse_converse_response(response)
 
         # JSONテキストからフィールド定義を抽出
-        json_match = re.search(r'```json\s*(.*?)\s*```',
-                               fields_text, re.DOTALL)
+        json_match = _JSON_BLOCK_RE.search(fields_text)
         if json_match:
             fields_json = json_match.group(1)
         else:
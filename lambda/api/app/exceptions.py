@@ -0,0 +1,18 @@
+"""
+アプリケーション共通の例外
+"""
+
+
+class BadRequestError(ValueError):
+    """リクエスト内容が不正な場合の例外（400 を返す）"""
+    pass
+
+
+class NotFoundError(ValueError):
+    """指定されたリソースが見つからない場合の例外（404 を返す）"""
+    pass
+
+
+class ConflictError(ValueError):
+    """リソースの状態が処理の前提条件を満たさない場合の例外（409 を返す）"""
+    pass
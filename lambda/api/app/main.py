@@ -3,21 +3,49 @@ from routers.ocr import set_background_task
 from routers.agent import set_background_task as set_agent_background_task
 from routers.datacheck import set_background_task as set_datacheck_background_task
 from background import BackgroundTaskExtension
+from exceptions import BadRequestError, NotFoundError, ConflictError
 import logging
-from fastapi import FastAPI
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, Request
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import ORJSONResponse
 
 from routers import health, ocr, upload, extraction, schema, s3_sync, agent, datacheck
+from services.schema_service import SchemaService
+from services.upload_service import UploadService
 
 # アプリケーション全体のログレベル設定
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-app = FastAPI()
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """起動時にサービスを一度だけ生成し、app.state で共有する"""
+    app.state.schema_service = SchemaService()
+    app.state.upload_service = UploadService()
+    yield
+
+
+# orjson でレスポンスをシリアライズ（標準 json より高速）
+app = FastAPI(default_response_class=ORJSONResponse, lifespan=lifespan)
 
 # バックグラウンドタスク拡張機能を初期化
 background_task = BackgroundTaskExtension()
 
+
+# 想定外の例外を 500 に変換するミドルウェア
+# CORS ミドルウェアより先に登録して内側で実行し、500 応答にも CORS ヘッダーが付くようにする
+# （Exception ハンドラーは CORS の外側の ServerErrorMiddleware で実行されるため使わない）
+@app.middleware("http")
+async def unhandled_exception_middleware(request: Request, call_next):
+    try:
+        return await call_next(request)
+    except Exception as e:
+        logger.exception(f"Unhandled error in {request.method} {request.url.path}")
+        return ORJSONResponse(status_code=500, content={"detail": f"Error: {str(e)}"})
+
+
 # CORS 設定
 origins = ["*"]
 
@@ -46,9 +74,30 @@ set_agent_background_task(background_task)
 set_datacheck_background_task(background_task)
 
 
+# 例外ハンドラー（ルーターごとの try/except を集約）
+@app.exception_handler(BadRequestError)
+async def bad_request_error_handler(request: Request, exc: BadRequestError):
+    logger.warning(f"{request.method} {request.url.path}: {str(exc)}")
+    return ORJSONResponse(status_code=400, content={"detail": str(exc)})
+
+
+@app.exception_handler(NotFoundError)
+async def not_found_error_handler(request: Request, exc: NotFoundError):
+    logger.warning(f"{request.method} {request.url.path}: {str(exc)}")
+    return ORJSONResponse(status_code=404, content={"detail": str(exc)})
+
+
+@app.exception_handler(ConflictError)
+async def conflict_error_handler(request: Request, exc: ConflictError):
+    logger.warning(f"{request.method} {request.url.path}: {str(exc)}")
+    return ORJSONResponse(status_code=409, content={"detail": str(exc)})
+
+
 # リクエスト完了時にバックグラウンドタスクに通知するミドルウェア
+# 例外が外側まで伝わった場合も必ず通知する
 @app.middleware("http")
 async def send_done_message(request, call_next):
-    response = await call_next(request)
-    background_task.done()
-    return response
+    try:
+        return await call_next(request)
+    finally:
+        background_task.done()
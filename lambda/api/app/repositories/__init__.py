@@ -3,9 +3,12 @@ Data access layer for DynamoDB operations
 """
 from .image_repository import (
     create_image_record,
+    create_image_records_batch,
     get_images,
     get_image,
+    get_images_batch,
     update_image_status,
+    bulk_update_image_status,
     update_ocr_result,
     update_extracted_info,
     update_converted_image,
@@ -15,6 +18,7 @@ from .image_repository import (
     get_children_by_parent_id,
     determine_parent_status,
     check_and_update_parent_status,
+    update_download_url_cache,
 )
 from .job_repository import (
     create_job,
@@ -26,8 +30,12 @@ from .job_repository import (
 from .schema_repository import (
     DEFAULT_APP,
     load_app_schemas,
+    load_app_schemas_page,
     get_app_schemas,
     get_app_schema,
+    find_app,
+    app_exists,
+    get_app_config,
     get_extraction_fields_for_app,
     get_field_names_for_app,
     get_app_display_name,
@@ -35,14 +43,26 @@ from .schema_repository import (
     get_custom_prompt_for_app,
     update_app_schema,
     delete_app_schema,
+    invalidate_app_schema_cache,
+)
+from .extraction_cache_repository import (
+    get_cached_extraction,
+    put_cached_extraction,
+)
+from .ocr_cache_repository import (
+    get_cached_ocr_result,
+    put_cached_ocr_result,
 )
 
 __all__ = [
     # Image operations
     "create_image_record",
+    "create_image_records_batch",
     "get_images",
     "get_image",
+    "get_images_batch",
     "update_image_status",
+    "bulk_update_image_status",
     "update_ocr_result",
     "update_extracted_info",
     "update_converted_image",
@@ -52,6 +72,7 @@ __all__ = [
     "get_children_by_parent_id",
     "determine_parent_status",
     "check_and_update_parent_status",
+    "update_download_url_cache",
     # Job operations
     "create_job",
     "get_job",
@@ -61,8 +82,12 @@ __all__ = [
     # Schema operations
     "DEFAULT_APP",
     "load_app_schemas",
+    "load_app_schemas_page",
     "get_app_schemas",
     "get_app_schema",
+    "find_app",
+    "app_exists",
+    "get_app_config",
     "get_extraction_fields_for_app",
     "get_field_names_for_app",
     "get_app_display_name",
@@ -70,4 +95,11 @@ __all__ = [
     "get_custom_prompt_for_app",
     "update_app_schema",
     "delete_app_schema",
+    "invalidate_app_schema_cache",
+    # Extraction cache operations
+    "get_cached_extraction",
+    "put_cached_extraction",
+    # OCR cache operations
+    "get_cached_ocr_result",
+    "put_cached_ocr_result",
 ]
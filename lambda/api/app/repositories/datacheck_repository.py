@@ -85,6 +85,25 @@ def update_project_status(project_id, status):
     logger.info(f"Updated project {project_id} status to {status}")
 
 
+def add_confirmed_document(project_id, document_id):
+    """OCR確認済みドキュメントをプロジェクトに記録し、確認済み件数を返す（同じドキュメントは1件として数える）"""
+    table = get_projects_table()
+    timestamp = datetime.utcnow().isoformat()
+    
+    response = table.update_item(
+        Key={"project_id": project_id},
+        UpdateExpression="ADD confirmed_document_ids :document_ids SET updated_at = :updated_at",
+        ExpressionAttributeValues={
+            ":document_ids": {document_id},
+            ":updated_at": timestamp
+        },
+        ReturnValues="UPDATED_NEW"
+    )
+    confirmed_ids = response.get("Attributes", {}).get("confirmed_document_ids", set())
+    logger.info(f"Project {project_id}: {len(confirmed_ids)} documents confirmed")
+    return len(confirmed_ids)
+
+
 def update_project_job_id(project_id, job_id):
     """プロジェクトにOCRジョブIDを紐付け"""
     table = get_projects_table()
@@ -0,0 +1,80 @@
+from clients import dynamodb_resource
+import logging
+import time
+from typing import Optional
+from config import settings
+
+logger = logging.getLogger(__name__)
+
+
+def get_extraction_cache_table():
+    """
+    抽出結果キャッシュテーブルのリソースを取得する
+
+    Returns:
+        DynamoDB テーブルリソース。テーブル名が未設定の場合は None（キャッシュ無効）
+    """
+    table_name = settings.EXTRACTION_CACHE_TABLE_NAME
+    if not table_name:
+        return None
+
+    return dynamodb_resource.Table(table_name)
+
+
+def get_cached_extraction(cache_key: str) -> Optional[dict]:
+    """
+    キャッシュ済みの抽出結果を取得する
+
+    キャッシュは最適化のためのものなので、取得に失敗しても例外は投げずに None を返す
+
+    Args:
+        cache_key: 画像・スキーマ等から計算したキャッシュキー
+
+    Returns:
+        {"extracted_info": ..., "mapping": ...}。キャッシュがない場合は None
+    """
+    table = get_extraction_cache_table()
+    if table is None:
+        return None
+
+    try:
+        response = table.get_item(Key={"cache_key": cache_key})
+        item = response.get("Item")
+        if not item:
+            return None
+
+        # TTL による削除は遅延があるため、期限切れの項目はここで弾く
+        if int(item.get("expires_at", 0)) <= int(time.time()):
+            return None
+
+        return {
+            "extracted_info": item.get("extracted_info", {}),
+            "mapping": item.get("mapping", {})
+        }
+    except Exception as e:
+        logger.warning(f"抽出キャッシュの取得に失敗しました: {str(e)}")
+        return None
+
+
+def put_cached_extraction(cache_key: str, extracted_info: dict, mapping: dict) -> None:
+    """
+    抽出結果をキャッシュに保存する
+
+    Args:
+        cache_key: 画像・スキーマ等から計算したキャッシュキー
+        extracted_info: 抽出された情報（Decimal 変換済み）
+        mapping: 抽出情報とOCR結果のマッピング（Decimal 変換済み）
+    """
+    table = get_extraction_cache_table()
+    if table is None:
+        return
+
+    try:
+        table.put_item(Item={
+            "cache_key": cache_key,
+            "extracted_info": extracted_info,
+            "mapping": mapping,
+            "expires_at": int(time.time()) + settings.EXTRACTION_CACHE_TTL_SECONDS
+        })
+    except Exception as e:
+        logger.warning(f"抽出キャッシュの保存に失敗しました: {str(e)}")
@@ -4,6 +4,8 @@ from boto3.dynamodb.conditions import Key, Attr
 from botocore.exceptions import ClientError
 from fastapi import HTTPException
 from datetime import datetime
+import random
+import time
 import uuid
 from config import settings
 
@@ -26,9 +28,51 @@ def get_images_table():
     return dynamodb_resource.Table(table_name)
 
 
+def _build_image_item(image_id, filename, s3_key, app_name="default", status="pending", converted_s3_key=None,
+                      page_processing_mode="combined", total_pages=None, page_number=None, parent_document_id=None,
+                      project_id=None, document_type=None, ocr_confirmed=False, content_type=None):
+    """
+    画像レコードの項目を組み立てる（引数は create_image_record と同じ）
+    """
+    item = {
+        "id": image_id,
+        "filename": filename,
+        "s3_key": s3_key,
+        "upload_time": datetime.now().isoformat(),
+        "status": status,
+        "app_name": app_name,
+        "page_processing_mode": page_processing_mode
+    }
+
+    # ページ関連の情報を追加
+    if total_pages is not None:
+        item["total_pages"] = total_pages
+    if page_number is not None:
+        item["page_number"] = page_number
+    if parent_document_id is not None:
+        item["parent_document_id"] = parent_document_id
+
+    # 変換後のS3キーがある場合は追加
+    if converted_s3_key:
+        item["converted_s3_key"] = converted_s3_key
+        item["s3_key"] = converted_s3_key  # 変換後のキーを優先
+
+    # データチェック用フィールド
+    if project_id:
+        item["project_id"] = project_id
+    if document_type:
+        item["document_type"] = document_type
+    if ocr_confirmed is not None:
+        item["ocr_confirmed"] = ocr_confirmed
+    if content_type:
+        item["content_type"] = content_type
+
+    return item
+
+
 def create_image_record(image_id, filename, s3_key, app_name="default", status="pending", converted_s3_key=None,
                         page_processing_mode="combined", total_pages=None, page_number=None, parent_document_id=None,
-                        project_id=None, document_type=None, ocr_confirmed=False):
+                        project_id=None, document_type=None, ocr_confirmed=False, content_type=None):
     """
     画像レコードを作成する
 
@@ -43,6 +87,7 @@ def create_image_record(image_id, filename, s3_key, app_name="default", status="
         total_pages (int, optional): 総ページ数
         page_number (int, optional): ページ番号（個別処理の場合）
         parent_document_id (str, optional): 親ドキュメントID（個別処理の場合）
+        content_type (str, optional): アップロード時に指定されたContent-Type
 
     Returns:
         str: 作成された画像のID
@@ -51,39 +96,16 @@ def create_image_record(image_id, filename, s3_key, app_name="default", status="
         image_id = str(uuid.uuid4())
 
     table = get_images_table()
-    current_time = datetime.now().isoformat()
 
     try:
-        item = {
-            "id": image_id,
-            "filename": filename,
-            "s3_key": s3_key,
-            "upload_time": current_time,
-            "status": status,
-            "app_name": app_name,
-            "page_processing_mode": page_processing_mode
-        }
-
-        # ページ関連の情報を追加
-        if total_pages is not None:
-            item["total_pages"] = total_pages
-        if page_number is not None:
-            item["page_number"] = page_number
-        if parent_document_id is not None:
-            item["parent_document_id"] = parent_document_id
-
-        # 変換後のS3キーがある場合は追加
-        if converted_s3_key:
-            item["converted_s3_key"] = converted_s3_key
-            item["s3_key"] = converted_s3_key  # 変換後のキーを優先
-
-        # データチェック用フィールド
-        if project_id:
-            item["project_id"] = project_id
-        if document_type:
-            item["document_type"] = document_type
-        if ocr_confirmed is not None:
-            item["ocr_confirmed"] = ocr_confirmed
+        item = _build_image_item(
+            image_id, filename, s3_key, app_name=app_name, status=status,
+            converted_s3_key=converted_s3_key, page_processing_mode=page_processing_mode,
+            total_pages=total_pages, page_number=page_number,
+            parent_document_id=parent_document_id, project_id=project_id,
+            document_type=document_type, ocr_confirmed=ocr_confirmed,
+            content_type=content_type
+        )
 
         table.put_item(Item=item)
         return image_id
@@ -93,6 +115,43 @@ def create_image_record(image_id, filename, s3_key, app_name="default", status="
             status_code=500, detail=f"Database error: {str(e)}")
 
 
+def create_image_records_batch(records):
+    """
+    複数の画像レコードをまとめて作成する（BatchWriteItem）
+
+    Args:
+        records (list): create_image_record のキーワード引数の辞書のリスト（image_id は必須）
+
+    Returns:
+        list: 作成された画像IDのリスト
+    """
+    if not records:
+        return []
+
+    table = get_images_table()
+
+    try:
+        # batch_writer が 25 件ごとの分割と UnprocessedItems の再送を行う
+        with table.batch_writer() as batch:
+            for record in records:
+                batch.put_item(Item=_build_image_item(**record))
+        logger.info(f"{len(records)} 件の画像レコードを一括作成しました")
+        return [record["image_id"] for record in records]
+    except Exception as e:
+        logger.error(f"画像レコード一括作成エラー: {str(e)}")
+        raise HTTPException(
+            status_code=500, detail=f"Database error: {str(e)}")
+
+
+# 画像一覧で参照する属性（OCR結果・抽出結果など大きな属性を読み込まないよう射影する）
+_IMAGE_LIST_ATTRIBUTES = (
+    "id", "filename", "s3_key", "upload_time", "status", "job_id", "app_name",
+    "page_processing_mode", "total_pages", "page_number", "parent_document_id"
+)
+_IMAGE_LIST_ATTRIBUTE_NAMES = {f"#a{i}": attr for i, attr in enumerate(_IMAGE_LIST_ATTRIBUTES)}
+_IMAGE_LIST_PROJECTION = ", ".join(_IMAGE_LIST_ATTRIBUTE_NAMES)
+
+
 def get_images(app_name=None):
     """
     画像一覧を取得する
@@ -100,35 +159,48 @@ def get_images(app_name=None):
     Args:
         app_name (str, optional): アプリケーション名でフィルタリング
                                  指定時はGSI(AppNameIndex)でquery実行
-                                 未指定時はscanで全件取得（1MB制限あり）
+                                 未指定時はscanで全件取得
 
     Returns:
         list: 画像レコードのリスト
 
     注意:
-        app_name未指定時はDynamoDB scanを使用するため、1MBのデータサイズ制限があります。
-        大量のレコードがある場合、全てのデータを取得できない可能性があります。
+        一覧表示に必要な属性のみを射影して取得し、1MBを超える場合はページングして全件を取得します。
+        app_name未指定時はDynamoDB scanを使用するため、テーブル全体を読み込みます。
         本番環境では必ずapp_nameを指定してGSI経由でのquery使用を推奨します。
     """
     table = get_images_table()
 
     try:
+        request_kwargs = {
+            "ProjectionExpression": _IMAGE_LIST_PROJECTION,
+            "ExpressionAttributeNames": _IMAGE_LIST_ATTRIBUTE_NAMES
+        }
         if app_name:
             # GSI(AppNameIndex)を使用してアプリ名でフィルタリング
-            # queryは効率的で1MB制限の影響を受けにくい
-            response = table.query(
+            read_page = table.query
+            request_kwargs.update(
                 IndexName="AppNameIndex",
                 KeyConditionExpression=Key('app_name').eq(app_name),
                 ScanIndexForward=False  # 降順（新しい順）
             )
             logger.info(f"GSI経由でアプリ '{app_name}' の画像を取得")
         else:
-            # 全件取得（警告: DynamoDB scanは1MB制限があり、大規模データでは不完全な結果になる）
-            response = table.scan()
-            logger.warning("scanで全件取得中 - 大量データがある場合は一部のレコードが取得されない可能性があります")
+            # 全件取得（警告: scanはテーブル全体を読み込む）
+            read_page = table.scan
+            logger.warning("scanで全件取得中 - app_nameを指定したquery の使用を推奨します")
+
+        items = []
+        while True:
+            response = read_page(**request_kwargs)
+            items.extend(response.get('Items', []))
+            last_key = response.get('LastEvaluatedKey')
+            if not last_key:
+                break
+            request_kwargs['ExclusiveStartKey'] = last_key
 
         images = []
-        for item in response.get('Items', []):
+        for item in items:
             images.append({
                 "id": item.get("id"),
                 "name": item.get("filename"),
@@ -188,6 +260,46 @@ def update_image_status(image_id, status, job_id=None):
             status_code=500, detail=f"Database error: {str(e)}")
 
 
+def bulk_update_image_status(items):
+    """
+    複数画像のステータスをまとめて更新する（アイテムごとに UpdateItem を実行）
+    親ドキュメントのステータス再計算は行わないため、トップレベルの画像に使用する
+
+    更新は互いに独立しているため、1件の失敗で他の更新を取り消さず、失敗したIDを返す
+
+    Args:
+        items (list): (画像ID, ステータス) のリスト
+
+    Returns:
+        list: 更新に失敗した画像IDのリスト
+    """
+    if not items:
+        return []
+
+    table = get_images_table()
+
+    def update_one(item):
+        image_id, status = item
+        try:
+            table.update_item(
+                Key={"id": image_id},
+                UpdateExpression="SET #status = :status",
+                ExpressionAttributeNames={"#status": "status"},
+                ExpressionAttributeValues={":status": status}
+            )
+            return None
+        except ClientError as e:
+            logger.error(f"画像ステータス更新エラー: {image_id}: {str(e)}")
+            return image_id
+
+    # 対象はプロジェクト内の数件のみのため、S3 用のスレッドプールは使わず順に更新する
+    results = [update_one(item) for item in items]
+
+    failed_ids = [image_id for image_id in results if image_id is not None]
+    logger.info(f"{len(items) - len(failed_ids)}/{len(items)} 件の画像ステータスを更新しました")
+    return failed_ids
+
+
 def update_ocr_result(image_id: str, ocr_result: dict, extraction_status: str = "processing") -> None:
     """
     OCR結果を更新する
@@ -250,6 +362,61 @@ def update_extracted_info(image_id, extracted_info, extraction_mapping, status="
             status_code=500, detail=f"Database error: {str(e)}")
 
 
+# BatchGetItem 1回あたりの最大キー数
+BATCH_GET_MAX_KEYS = 100
+
+# 未処理キー（UnprocessedKeys）の再リクエスト設定
+BATCH_GET_MAX_ATTEMPTS = 8
+BATCH_GET_RETRY_BASE_DELAY = 0.05  # 秒
+BATCH_GET_RETRY_MAX_DELAY = 2.0  # 秒
+
+
+def get_images_batch(image_ids):
+    """
+    複数の画像情報をまとめて取得する（BatchGetItem）
+
+    Args:
+        image_ids (list): 画像IDのリスト
+
+    Returns:
+        dict: 画像ID -> 画像情報（見つからなかったIDは含まない）
+    """
+    if not image_ids:
+        return {}
+
+    table = get_images_table()
+    unique_ids = list(dict.fromkeys(image_ids))
+    images = {}
+
+    try:
+        for i in range(0, len(unique_ids), BATCH_GET_MAX_KEYS):
+            request_items = {
+                table.name: {"Keys": [{"id": image_id} for image_id in unique_ids[i:i + BATCH_GET_MAX_KEYS]]}
+            }
+            # スロットリング等で未処理となったキーは、指数バックオフ（フルジッター）を挟んで再リクエストする
+            for attempt in range(BATCH_GET_MAX_ATTEMPTS):
+                if attempt > 0:
+                    time.sleep(random.uniform(
+                        0, min(BATCH_GET_RETRY_BASE_DELAY * 2 ** attempt, BATCH_GET_RETRY_MAX_DELAY)))
+                response = dynamodb_resource.batch_get_item(RequestItems=request_items)
+                for item in response.get("Responses", {}).get(table.name, []):
+                    images[item["id"]] = item
+                request_items = response.get("UnprocessedKeys") or None
+                if not request_items:
+                    break
+            else:
+                unprocessed = len(request_items.get(table.name, {}).get("Keys", []))
+                logger.error(f"画像一括取得で未処理のキーが残りました: {unprocessed} 件")
+                raise HTTPException(
+                    status_code=503, detail="Database is busy. Please retry later.")
+
+        return images
+    except ClientError as e:
+        logger.error(f"画像一括取得エラー: {str(e)}")
+        raise HTTPException(
+            status_code=500, detail=f"Database error: {str(e)}")
+
+
 def get_image(image_id):
     """
     画像情報を取得する
@@ -277,7 +444,7 @@ def get_image(image_id):
 
 
 def update_converted_image(image_id, converted_s3_key, status=None, original_size=None, resized_size=None,
-                           page_processing_mode=None, total_pages=None):
+                           page_processing_mode=None, total_pages=None, content_type=None):
     """
     変換後の画像情報を更新する
 
@@ -289,6 +456,7 @@ def update_converted_image(image_id, converted_s3_key, status=None, original_siz
         resized_size (tuple, optional): リサイズ後の画像サイズ (width, height)
         page_processing_mode (str, optional): ページ処理モード
         total_pages (int, optional): 総ページ数
+        content_type (str, optional): 変換後画像のContent-Type
 
     Returns:
         bool: 更新が成功したかどうか
@@ -327,6 +495,10 @@ def update_converted_image(image_id, converted_s3_key, status=None, original_siz
             update_expression += ", total_pages = :total_pages"
             expression_values[":total_pages"] = total_pages
 
+        if content_type:
+            update_expression += ", content_type = :content_type"
+            expression_values[":content_type"] = content_type
+
         expression_names = {}
         if status:
             expression_names["#status"] = "status"
@@ -382,7 +554,8 @@ def delete_images_by_app_name(app_name: str):
 def create_individual_page_record(page_id: str, parent_image_id: str, filename: str,
                                   converted_s3_key: str,
                                   page_number: int, total_pages: int, app_name: str,
-                                  original_size: tuple, new_size: tuple):
+                                  original_size: tuple, new_size: tuple,
+                                  content_type: str = "image/jpeg"):
     """
     個別ページのレコードを作成する
 
@@ -397,6 +570,7 @@ def create_individual_page_record(page_id: str, parent_image_id: str, filename:
         app_name (str): アプリケーション名
         original_size (tuple): 元のサイズ
         new_size (tuple): 新しいサイズ
+        content_type (str): 変換後画像のContent-Type
     """
     table = get_images_table()
     current_time = datetime.now().isoformat()
@@ -415,7 +589,8 @@ def create_individual_page_record(page_id: str, parent_image_id: str, filename:
             "total_pages": total_pages,
             "parent_document_id": parent_image_id,
             "original_size": list(original_size) if original_size else None,
-            "new_size": list(new_size) if new_size else None
+            "new_size": list(new_size) if new_size else None,
+            "content_type": content_type
         }
 
         table.put_item(Item=item)
@@ -535,30 +710,81 @@ def check_and_update_parent_status(parent_id: str):
         logger.error(f"親ステータス更新エラー: {str(e)}")
 
 
-def get_images_by_project_id(project_id):
-    """プロジェクトIDで画像を取得する（GSI使用）"""
+def get_images_by_project_id(project_id, attrs=None):
+    """
+    プロジェクトIDで画像を取得する（GSI使用）
+
+    Args:
+        project_id (str): プロジェクトID
+        attrs (Iterable[str], optional): 取得する属性。指定した場合は extracted_info などの大きな属性を転送しない
+
+    Returns:
+        list: 画像情報のリスト
+    """
     table = get_images_table()
+    query_kwargs = {
+        "IndexName": "project_id-index",
+        "KeyConditionExpression": Key("project_id").eq(project_id)
+    }
+    if attrs:
+        # 予約語と衝突しないよう属性名はプレースホルダーで指定する
+        names = {f"#a{i}": attr for i, attr in enumerate(attrs)}
+        query_kwargs["ProjectionExpression"] = ", ".join(names)
+        query_kwargs["ExpressionAttributeNames"] = names
     try:
-        response = table.query(
-            IndexName="project_id-index",
-            KeyConditionExpression=Key("project_id").eq(project_id)
-        )
+        response = table.query(**query_kwargs)
         return response.get("Items", [])
     except ClientError as e:
         logger.error(f"Error querying images by project_id: {str(e)}")
         raise
 
 
-def update_image_ocr_confirmed(image_id, confirmed):
-    """OCR確認フラグを更新する"""
+def update_image_ocr_confirmed(image_id, confirmed, project_id=None):
+    """
+    OCR確認フラグを更新する
+
+    project_id を指定した場合は、そのプロジェクトに属する画像のみ更新する（追加の読み込みはしない）
+
+    Returns:
+        bool: 更新した場合は True、画像が存在しないかプロジェクトに属さない場合は False
+    """
     table = get_images_table()
+    update_kwargs = {
+        "Key": {"id": image_id},
+        "UpdateExpression": "SET ocr_confirmed = :confirmed",
+        "ExpressionAttributeValues": {":confirmed": confirmed}
+    }
+    if project_id is not None:
+        update_kwargs["ConditionExpression"] = "project_id = :project_id"
+        update_kwargs["ExpressionAttributeValues"][":project_id"] = project_id
     try:
-        table.update_item(
-            Key={"id": image_id},
-            UpdateExpression="SET ocr_confirmed = :confirmed",
-            ExpressionAttributeValues={":confirmed": confirmed}
-        )
+        table.update_item(**update_kwargs)
         logger.info(f"Updated OCR confirmed flag for image {image_id}: {confirmed}")
+        return True
     except ClientError as e:
+        if e.response.get("Error", {}).get("Code") == "ConditionalCheckFailedException":
+            logger.warning(f"Image {image_id} does not belong to project {project_id}")
+            return False
         logger.error(f"Error updating OCR confirmed flag: {str(e)}")
         raise
+
+
+def update_download_url_cache(image_id, download_url_cache):
+    """
+    生成済みのダウンロード用署名付きURLを画像レコードに保存する
+
+    キャッシュは最適化のためのものなので、保存に失敗しても例外は投げない
+
+    Args:
+        image_id (str): 画像ID
+        download_url_cache (dict): {"expires_at": 有効期限(UNIX時刻), "content_type": ..., "presigned_urls": [...]}
+    """
+    table = get_images_table()
+    try:
+        table.update_item(
+            Key={"id": image_id},
+            UpdateExpression="SET download_url_cache = :cache",
+            ExpressionAttributeValues={":cache": download_url_cache}
+        )
+    except ClientError as e:
+        logger.warning(f"ダウンロードURLキャッシュの保存に失敗しました: {str(e)}")
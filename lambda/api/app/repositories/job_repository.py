@@ -4,7 +4,7 @@ from boto3.dynamodb.conditions import Key
 from botocore.exceptions import ClientError
 from fastapi import HTTPException
 from datetime import datetime
-import uuid
+import secrets
 from config import settings
 
 logger = logging.getLogger(__name__)
@@ -54,7 +54,7 @@ def create_job(job_id=None, status="processing"):
         str: 作成されたジョブのID
     """
     if not job_id:
-        job_id = str(uuid.uuid4())
+        job_id = secrets.token_hex(16)
 
     table = get_jobs_table()
     current_time = datetime.now().isoformat()
@@ -203,7 +203,7 @@ def create_agent_job(image_id: str):
     Returns:
         str: Job ID
     """
-    job_id = str(uuid.uuid4())
+    job_id = secrets.token_hex(16)
     table = get_jobs_table()
     current_time = datetime.now().isoformat()
 
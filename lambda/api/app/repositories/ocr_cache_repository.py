@@ -0,0 +1,78 @@
+from clients import dynamodb_resource
+import logging
+import time
+import orjson
+from typing import Optional
+from config import settings
+
+logger = logging.getLogger(__name__)
+
+
+def get_ocr_cache_table():
+    """
+    OCR結果キャッシュテーブルのリソースを取得する
+
+    Returns:
+        DynamoDB テーブルリソース。テーブル名が未設定の場合は None（キャッシュ無効）
+    """
+    table_name = settings.OCR_CACHE_TABLE_NAME
+    if not table_name:
+        return None
+
+    return dynamodb_resource.Table(table_name)
+
+
+def get_cached_ocr_result(cache_key: str) -> Optional[dict]:
+    """
+    キャッシュ済みのOCR結果を取得する
+
+    キャッシュは最適化のためのものなので、取得に失敗しても例外は投げずに None を返す
+
+    Args:
+        cache_key: 画像のハッシュとOCRエンジンのバージョンから計算したキャッシュキー
+
+    Returns:
+        OCR結果（perform_ocr の戻り値と同じ形式）。キャッシュがない場合は None
+    """
+    table = get_ocr_cache_table()
+    if table is None:
+        return None
+
+    try:
+        response = table.get_item(Key={"cache_key": cache_key})
+        item = response.get("Item")
+        if not item:
+            return None
+
+        # TTL による削除は遅延があるため、期限切れの項目はここで弾く
+        if int(item.get("expires_at", 0)) <= int(time.time()):
+            return None
+
+        return orjson.loads(item["ocr_result"])
+    except Exception as e:
+        logger.warning(f"OCRキャッシュの取得に失敗しました: {str(e)}")
+        return None
+
+
+def put_cached_ocr_result(cache_key: str, ocr_result: dict) -> None:
+    """
+    OCR結果をキャッシュに保存する
+
+    座標の float を Decimal に変換せずに済むよう、JSON文字列として保存する
+
+    Args:
+        cache_key: 画像のハッシュとOCRエンジンのバージョンから計算したキャッシュキー
+        ocr_result: perform_ocr の戻り値
+    """
+    table = get_ocr_cache_table()
+    if table is None:
+        return
+
+    try:
+        table.put_item(Item={
+            "cache_key": cache_key,
+            "ocr_result": orjson.dumps(ocr_result).decode("utf-8"),
+            "expires_at": int(time.time()) + settings.OCR_CACHE_TTL_SECONDS
+        })
+    except Exception as e:
+        logger.warning(f"OCRキャッシュの保存に失敗しました: {str(e)}")
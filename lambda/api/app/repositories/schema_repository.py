@@ -1,7 +1,10 @@
 import logging
 import os
+import threading
+from datetime import datetime
 import boto3
 from botocore.exceptions import ClientError
+from cachetools import TTLCache, cached
 
 logger = logging.getLogger(__name__)
 
@@ -11,50 +14,64 @@ DEFAULT_APP = "shipping_ocr"
 # DynamoDB クライアント
 dynamodb = boto3.resource('dynamodb')
 
+# アプリ設定参照用キャッシュの有効期間（秒）
+# 抽出処理ごとの設定参照を減らしつつ、他のコンテナでの更新も短時間で反映されるようにする
+APP_INDEX_CACHE_TTL = 60
 
-def load_app_schemas():
+_app_index_cache = TTLCache(maxsize=1, ttl=APP_INDEX_CACHE_TTL)
+_app_index_lock = threading.Lock()
+
+
+def _get_schemas_table():
+    """スキーマテーブルを取得する"""
+    schemas_table_name = os.environ.get('SCHEMAS_TABLE_NAME')
+    if not schemas_table_name:
+        logger.error("SCHEMAS_TABLE_NAME 環境変数が設定されていません")
+        raise ValueError("SCHEMAS_TABLE_NAME environment variable is not set")
+
+    return dynamodb.Table(schemas_table_name)
+
+
+def _to_app_data(item):
+    """DynamoDB のアイテムをアプリデータに変換する"""
+    return {
+        'name': item.get('name'),
+        'display_name': item.get('display_name', item.get('name')),
+        'description': item.get('description', ''),
+        'fields': item.get('fields', []),
+        'input_methods': item.get('input_methods', {'file_upload': True, 's3_sync': False}),
+        'custom_prompt': item.get('custom_prompt', ''),
+        # False の場合、情報抽出で画像を使わずOCR結果のみをLLMに渡す
+        'needs_vision': item.get('needs_vision', True)
+    }
+
+
+def load_app_schemas_page(limit=50, start_key=None):
     """
-    アプリケーションスキーマを取得する
-    DynamoDB から全てのアプリスキーマを取得
-    取得できない場合はエラーを返す
+    アプリケーションスキーマを1ページ分取得する
+
+    Args:
+        limit (int): 1ページあたりの最大件数
+        start_key (dict, optional): 前ページの LastEvaluatedKey
+
+    Returns:
+        tuple: (アプリデータのリスト, 次ページの開始キー。最終ページの場合は None)
     """
     try:
-        # DynamoDB からスキーマを取得
-        schemas_table_name = os.environ.get('SCHEMAS_TABLE_NAME')
-        if not schemas_table_name:
-            logger.error("SCHEMAS_TABLE_NAME 環境変数が設定されていません")
-            raise ValueError("SCHEMAS_TABLE_NAME environment variable is not set")
-            
-        logger.info(f"DynamoDB からスキーマを取得します: {schemas_table_name}")
-        schemas_table = dynamodb.Table(schemas_table_name)
-        
-        # schema_type='app' の全てのレコードを取得
-        response = schemas_table.query(
-            KeyConditionExpression=boto3.dynamodb.conditions.Key('schema_type').eq('app')
-        )
-        
-        if 'Items' in response and response['Items']:
-            # 各アプリのデータを配列に格納
-            apps = []
-            for item in response['Items']:
-                # 新しい構造: 直接アプリデータとして扱う
-                app_data = {
-                    'name': item.get('name'),
-                    'display_name': item.get('display_name', item.get('name')),
-                    'description': item.get('description', ''),
-                    'fields': item.get('fields', []),
-                    'input_methods': item.get('input_methods', {'file_upload': True, 's3_sync': False}),
-                    'custom_prompt': item.get('custom_prompt', '')
-                }
-                apps.append(app_data)
-            
-            logger.info(f"DynamoDB から {len(apps)} 個のアプリスキーマを読み込みました")
-            return {"apps": apps}
-        else:
-            logger.warning("DynamoDB からスキーマを取得できませんでした")
-            # スキーマが見つからない場合は空の配列を返す
-            return {"apps": []}
-    
+        schemas_table = _get_schemas_table()
+
+        query_kwargs = {
+            'KeyConditionExpression': boto3.dynamodb.conditions.Key('schema_type').eq('app'),
+            'Limit': limit
+        }
+        if start_key:
+            query_kwargs['ExclusiveStartKey'] = start_key
+
+        response = schemas_table.query(**query_kwargs)
+
+        apps = [_to_app_data(item) for item in response.get('Items', [])]
+        return apps, response.get('LastEvaluatedKey')
+
     except ClientError as e:
         logger.error(f"DynamoDB からのスキーマ取得エラー: {str(e)}")
         raise
@@ -63,6 +80,31 @@ def load_app_schemas():
         raise
 
 
+def load_app_schemas():
+    """
+    アプリケーションスキーマを取得する
+    DynamoDB から全てのアプリスキーマをページングしながら取得
+    取得できない場合はエラーを返す
+    """
+    logger.info("DynamoDB からスキーマを取得します")
+
+    apps = []
+    start_key = None
+    while True:
+        page, start_key = load_app_schemas_page(limit=100, start_key=start_key)
+        apps.extend(page)
+        if not start_key:
+            break
+
+    if apps:
+        logger.info(f"DynamoDB から {len(apps)} 個のアプリスキーマを読み込みました")
+    else:
+        # スキーマが見つからない場合は空の配列を返す
+        logger.warning("DynamoDB からスキーマを取得できませんでした")
+
+    return {"apps": apps}
+
+
 # グローバル変数を削除し、代わりに毎回DynamoDBから取得する関数を使用
 def get_app_schemas():
     """
@@ -73,32 +115,28 @@ def get_app_schemas():
 
 
 def get_app_schema(app_name):
-    """指定されたアプリのスキーマを取得"""
-    app_schemas = get_app_schemas()
-    for app in app_schemas.get("apps", []):
-        if app["name"] == app_name:
-            return app
-    
-    logger.warning(f"App '{app_name}' not found in schemas")
-    # アプリが見つからない場合はデフォルトの空スキーマを返す
-    return {"name": app_name, "fields": []}
-
+    """
+    指定されたアプリのスキーマを取得
+    全アプリを読み込まず、主キー（schema_type, name）で1件だけ取得する
+    """
+    try:
+        response = _get_schemas_table().get_item(
+            Key={'schema_type': 'app', 'name': app_name})
+    except ClientError as e:
+        logger.error(f"DynamoDB からのスキーマ取得エラー: {str(e)}")
+        raise
 
-def get_extraction_fields_for_app(app_name):
-    """指定されたアプリ用の抽出フィールドを取得"""
-    app_schemas = get_app_schemas()
-    for app in app_schemas.get("apps", []):
-        if app["name"] == app_name:
-            return {"fields": app["fields"]}
+    item = response.get('Item')
+    if item:
+        return _to_app_data(item)
 
     logger.warning(f"App '{app_name}' not found in schemas")
-    # アプリが見つからない場合は空のフィールドリストを返す
-    return {"fields": []}
+    # アプリが見つからない場合はデフォルトの空スキーマを返す
+    return {"name": app_name, "fields": []}
 
 
-def get_field_names_for_app(app_name):
-    """指定されたアプリの抽出フィールド名リストを取得（階層構造対応）"""
-    fields = get_extraction_fields_for_app(app_name)["fields"]
+def _collect_field_names(fields):
+    """抽出フィールド定義からフィールド名リストを作成する（階層構造対応）"""
     field_names = []
     
     def extract_field_names(fields, prefix=""):
@@ -123,33 +161,118 @@ def get_field_names_for_app(app_name):
     return field_names
 
 
+@cached(_app_index_cache, lock=_app_index_lock)
+def _get_app_index():
+    """
+    アプリ名 -> アプリデータ の索引を取得する（TTL付きでキャッシュ）
+    抽出処理などの参照専用。更新前の読み取りには get_app_schema を使用する
+
+    フィールド名リストは索引の作成時に一度だけ計算し、field_names として保持する
+    """
+    return {
+        app["name"]: {**app, "field_names": tuple(_collect_field_names(app["fields"]))}
+        for app in load_app_schemas().get("apps", [])
+    }
+
+
+def invalidate_app_schema_cache():
+    """アプリ設定参照用キャッシュを破棄する（スキーマの更新・削除時に呼び出す）"""
+    with _app_index_lock:
+        _app_index_cache.clear()
+
+
+def find_app(app_name):
+    """
+    アプリデータをTTL付きキャッシュの索引から取得する（アプリ名の存在確認などの参照専用）
+
+    Returns:
+        dict: アプリデータ（_to_app_data と同じ形式）。アプリが見つからない場合は None
+    """
+    app = _get_app_index().get(app_name)
+    if app is None:
+        return None
+
+    # キャッシュ上の索引を呼び出し側で書き換えられないようにコピーを返す
+    app_data = dict(app)
+    app_data.pop("field_names", None)
+    return app_data
+
+
+def app_exists(app_name):
+    """
+    アプリが存在するか確認する
+
+    TTL付きキャッシュの索引に無い場合は、他のコンテナで作成された直後の可能性があるため
+    主キーで直接確認する（存在した場合は索引を破棄し、以降の参照に反映させる）
+    """
+    if find_app(app_name) is not None:
+        return True
+
+    response = _get_schemas_table().get_item(
+        Key={'schema_type': 'app', 'name': app_name},
+        ProjectionExpression='#name',
+        ExpressionAttributeNames={'#name': 'name'})
+    if 'Item' not in response:
+        return False
+
+    invalidate_app_schema_cache()
+    return True
+
+
+def get_app_config(app_name):
+    """
+    抽出処理などで参照するアプリ設定をまとめて取得する（TTL付きキャッシュの索引を使用）
+
+    Returns:
+        dict: display_name, extraction_fields ({"fields": [...]}), field_names,
+              custom_prompt, input_methods, needs_vision。アプリが見つからない場合は既定値
+    """
+    app = _get_app_index().get(app_name)
+    if app is None:
+        logger.warning(f"App '{app_name}' not found in schemas")
+        # アプリが見つからない場合はデフォルト設定を返す
+        return {
+            "display_name": app_name,
+            "extraction_fields": {"fields": []},
+            "field_names": [],
+            "custom_prompt": "",
+            "input_methods": {"file_upload": True, "s3_sync": False},
+            "needs_vision": True
+        }
+
+    return {
+        "display_name": app.get("display_name", app_name),
+        "extraction_fields": {"fields": app["fields"]},
+        "field_names": list(app["field_names"]),
+        "custom_prompt": app.get("custom_prompt", ""),
+        "input_methods": app.get("input_methods", {"file_upload": True, "s3_sync": False}),
+        "needs_vision": app.get("needs_vision", True)
+    }
+
+
+def get_extraction_fields_for_app(app_name):
+    """指定されたアプリ用の抽出フィールドを取得"""
+    return get_app_config(app_name)["extraction_fields"]
+
+
+def get_field_names_for_app(app_name):
+    """指定されたアプリの抽出フィールド名リストを取得（階層構造対応）"""
+    return get_app_config(app_name)["field_names"]
+
+
 def get_app_display_name(app_name):
     """アプリの表示名を取得"""
-    app_schemas = get_app_schemas()
-    for app in app_schemas.get("apps", []):
-        if app["name"] == app_name:
-            return app.get("display_name", app_name)
-    return app_name
+    return get_app_config(app_name)["display_name"]
 
 
 def get_app_input_methods(app_name):
     """アプリの入力方法設定を取得"""
-    app_schemas = get_app_schemas()
-    for app in app_schemas.get("apps", []):
-        if app["name"] == app_name:
-            input_methods = app.get("input_methods", {"file_upload": True, "s3_sync": False})
-            return input_methods
-    # アプリが見つからない場合はデフォルト設定を返す
-    return {"file_upload": True, "s3_sync": False}
+    return get_app_config(app_name)["input_methods"]
     
 
 def get_custom_prompt_for_app(app_name):
     """指定されたアプリ用のカスタムプロンプトを取得"""
-    app_schemas = get_app_schemas()
-    for app in app_schemas.get("apps", []):
-        if app["name"] == app_name:
-            return app.get("custom_prompt", "")
-    return ""
+    return get_app_config(app_name)["custom_prompt"]
 
 
 def update_app_schema(app_name, app_data):
@@ -165,10 +288,9 @@ def update_app_schema(app_name, app_data):
         schemas_table = dynamodb.Table(schemas_table_name)
         
         # 現在の日時を取得
-        from datetime import datetime
         current_time = datetime.now().isoformat()
         
-        # 既存のレコードを取得して created_at を保持
+        # 既存のレコードを取得して created_at（と未指定の needs_vision）を保持
         try:
             existing_response = schemas_table.get_item(
                 Key={
@@ -176,9 +298,10 @@ def update_app_schema(app_name, app_data):
                     'name': app_name
                 }
             )
-            created_at = existing_response.get('Item', {}).get('created_at', current_time)
+            existing_item = existing_response.get('Item', {})
         except:
-            created_at = current_time
+            existing_item = {}
+        created_at = existing_item.get('created_at', current_time)
         
         # 新しい構造でスキーマを保存
         item = {
@@ -188,6 +311,7 @@ def update_app_schema(app_name, app_data):
             'description': app_data.get('description', ''),
             'fields': app_data.get('fields', []),
             'input_methods': app_data.get('input_methods', {'file_upload': True, 's3_sync': False}),
+            'needs_vision': app_data.get('needs_vision', existing_item.get('needs_vision', True)),
             'created_at': created_at,
             'updated_at': current_time
         }
@@ -197,6 +321,7 @@ def update_app_schema(app_name, app_data):
             item['custom_prompt'] = app_data['custom_prompt']
         
         schemas_table.put_item(Item=item)
+        invalidate_app_schema_cache()
         
         logger.info(f"スキーマを更新しました: {app_name}")
         return True
@@ -226,6 +351,8 @@ def delete_app_schema(app_name):
             }
         )
         
+        invalidate_app_schema_cache()
+        
         logger.info(f"スキーマを削除しました: {app_name}")
         return True
         
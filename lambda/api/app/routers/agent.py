@@ -1,6 +1,6 @@
 """Agent API router."""
 
-from fastapi import APIRouter, HTTPException
+from fastapi import APIRouter
 import logging
 
 from services.agent_service import AgentService
@@ -25,12 +25,7 @@ async def get_tools():
     Returns:
         List of available tools
     """
-    try:
-        result = await agent_service.get_available_tools()
-        return result
-    except Exception as e:
-        logger.error(f"Error getting tools: {str(e)}")
-        raise HTTPException(status_code=500, detail=f"Error: {str(e)}")
+    return await agent_service.get_available_tools()
 
 
 @router.post("/{image_id}")
@@ -43,12 +38,8 @@ async def start_agent_correction(image_id: str):
     Returns:
         Job ID
     """
-    try:
-        job_id = await agent_service.start_agent_correction(image_id)
-        return {"jobId": job_id}
-    except Exception as e:
-        logger.error(f"Error starting agent correction: {str(e)}")
-        raise HTTPException(status_code=500, detail=f"Error: {str(e)}")
+    job_id = await agent_service.start_agent_correction(image_id)
+    return {"jobId": job_id}
 
 
 @router.get("/status/{job_id}")
@@ -61,11 +52,4 @@ async def get_agent_job_status(job_id: str):
     Returns:
         Job status and results
     """
-    try:
-        result = await agent_service.get_agent_job_status(job_id)
-        return result
-    except ValueError as e:
-        raise HTTPException(status_code=404, detail=str(e))
-    except Exception as e:
-        logger.error(f"Error getting job status: {str(e)}")
-        raise HTTPException(status_code=500, detail=f"Error: {str(e)}")
+    return await agent_service.get_agent_job_status(job_id)
@@ -1,4 +1,4 @@
-from fastapi import APIRouter, HTTPException
+from fastapi import APIRouter
 import logging
 
 from schemas import ExtractionRequest
@@ -18,44 +18,25 @@ def set_background_task(background_task):
 
 
 @router.get("/{image_id}")
-async def get_extraction_result(image_id: str):
-    """情報抽出結果を取得する"""
-    try:
-        result = await extraction_service.get_extraction_result(image_id)
-        return result
-    except Exception as e:
-        logger.error(f"Error getting extraction result: {str(e)}")
-        raise HTTPException(status_code=500, detail=f"Error: {str(e)}")
+async def get_extraction_result(image_id: str, status_only: bool = False):
+    """情報抽出結果を取得する（status_only=true の場合は抽出結果を含めない）"""
+    return await extraction_service.get_extraction_result(image_id, status_only)
 
 
 @router.post("/{image_id}")
 async def start_extraction(image_id: str, request: ExtractionRequest):
     """情報抽出を開始する"""
-    try:
-        result = await extraction_service.start_extraction(image_id, request)
-        return result
-    except Exception as e:
-        logger.error(f"Error starting extraction: {str(e)}")
-        raise HTTPException(status_code=500, detail=f"Error: {str(e)}")
+    return await extraction_service.start_extraction(image_id, request)
 
 
 @router.get("/status/{image_id}")
 async def get_extraction_status(image_id: str):
     """情報抽出のステータスを取得する"""
-    try:
-        result = await extraction_service.get_extraction_status(image_id)
-        return result
-    except Exception as e:
-        logger.error(f"Error getting extraction status: {str(e)}")
-        raise HTTPException(status_code=500, detail=f"Error: {str(e)}")
+    return await extraction_service.get_extraction_status(image_id)
 
 
 @router.post("/edit/{image_id}")
 async def update_extraction_result(image_id: str, edited_data: dict):
     """情報抽出結果を更新する"""
-    try:
-        await extraction_service.update_extraction_result(image_id, edited_data)
-        return {"status": "success", "message": "Extraction results updated successfully"}
-    except Exception as e:
-        logger.error(f"Error updating extraction result: {str(e)}")
-        raise HTTPException(status_code=500, detail=f"Error: {str(e)}")
+    await extraction_service.update_extraction_result(image_id, edited_data)
+    return {"status": "success", "message": "Extraction results updated successfully"}
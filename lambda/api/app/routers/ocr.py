@@ -1,4 +1,4 @@
-from fastapi import APIRouter, HTTPException, UploadFile, File
+from fastapi import APIRouter, UploadFile, File
 import logging
 
 from schemas import (
@@ -22,65 +22,43 @@ def set_background_task(background_task):
 @router.post("/start", response_model=JobStartResponse)
 async def start_ocr(request: OcrStartRequest = OcrStartRequest()):
     """OCR処理を開始する"""
-    try:
-        job_id = await ocr_service.start_ocr_job(request.app_name)
-        return JobStartResponse(jobId=job_id)
-    except Exception as e:
-        logger.error(f"OCR job start error: {str(e)}")
-        raise HTTPException(status_code=500, detail=f"Error: {str(e)}")
+    job_id = await ocr_service.start_ocr_job(request.app_name)
+    return JobStartResponse(jobId=job_id)
 
 
 @router.get("/status/{job_id}")
 async def get_ocr_status(job_id: str):
     """OCRジョブのステータスを取得する"""
-    try:
-        status = await ocr_service.get_job_status(job_id)
-        return status
-    except Exception as e:
-        logger.error(f"Error getting job status: {str(e)}")
-        raise HTTPException(status_code=500, detail=f"Error: {str(e)}")
+    return await ocr_service.get_job_status(job_id)
 
 
 @router.get("/result/{image_id}", response_model=OcrResultResponse)
 async def get_ocr_result(image_id: str):
     """OCR結果を取得する"""
-    try:
-        result = await ocr_service.get_ocr_result(image_id)
-        return result
-    except Exception as e:
-        logger.error(f"Error getting OCR result: {str(e)}")
-        raise HTTPException(status_code=500, detail=f"Error: {str(e)}")
+    return await ocr_service.get_ocr_result(image_id)
 
 
 @router.post("/edit/{image_id}")
 async def update_ocr_result(image_id: str, edited_ocr_data: dict):
     """OCR結果を更新する"""
-    try:
-        await ocr_service.update_ocr_result(image_id, edited_ocr_data)
-        return {"status": "success", "message": "OCR results updated successfully"}
-    except Exception as e:
-        logger.error(f"Error updating OCR result: {str(e)}")
-        raise HTTPException(status_code=500, detail=f"Error: {str(e)}")
+    await ocr_service.update_ocr_result(image_id, edited_ocr_data)
+    return {"status": "success", "message": "OCR results updated successfully"}
 
 
 @router.post("/start/{image_id}")
 async def start_ocr_for_image(image_id: str):
     """指定した画像IDのOCR処理を開始する"""
-    try:
-        from repositories import update_image_status
-        from services.image_processing_pipeline import ImageProcessingPipeline
-        
-        # ステータスをprocessingに更新
-        update_image_status(image_id, "processing")
-        
-        # バックグラウンドで処理
-        if ocr_service.background_task:
-            ocr_service.background_task.add_task(
-                ImageProcessingPipeline().process_complete_pipeline,
-                image_id
-            )
-        
-        return {"status": "processing", "image_id": image_id}
-    except Exception as e:
-        logger.error(f"Error starting OCR for image: {str(e)}")
-        raise HTTPException(status_code=500, detail=f"Error: {str(e)}")
+    from repositories import update_image_status
+    from services.image_processing_pipeline import ImageProcessingPipeline
+    
+    # ステータスをprocessingに更新
+    update_image_status(image_id, "processing")
+    
+    # バックグラウンドで処理
+    if ocr_service.background_task:
+        ocr_service.background_task.add_task(
+            ImageProcessingPipeline().process_complete_pipeline,
+            image_id
+        )
+    
+    return {"status": "processing", "image_id": image_id}
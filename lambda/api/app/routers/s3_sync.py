@@ -1,6 +1,6 @@
 from fastapi import APIRouter, HTTPException
 import logging
-from typing import Optional
+from typing import List, Optional
 
 from services.s3_sync_service import S3SyncService
 
@@ -31,3 +31,14 @@ async def import_s3_file(app_name: str, file_data: dict):
     except Exception as e:
         logger.error(f"Error importing S3 file: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Error: {str(e)}")
+
+
+@router.post("/{app_name}/import/batch")
+async def import_s3_files(app_name: str, files: List[dict]):
+    """S3バケットから複数ファイルをまとめてインポートする"""
+    try:
+        result = await s3_sync_service.import_s3_files(app_name, files)
+        return result
+    except Exception as e:
+        logger.error(f"Error importing S3 files: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"Error: {str(e)}")
@@ -1,138 +1,116 @@
-from fastapi import APIRouter, HTTPException
+from fastapi import APIRouter, Query, Request, Response, Depends
 import logging
-from typing import Optional
+from typing import Any, Optional
 
 from schemas import (
     AppCreateRequest, AppUpdateRequest, SchemaGenerateRequest,
-    PresignedUrlRequest, CustomPromptRequest, SchemaSaveRequest
+    PresignedUrlRequest, CustomPromptRequest, SchemaSaveRequest, AppListResponse
 )
 from services.schema_service import SchemaService
 
 logger = logging.getLogger(__name__)
 router = APIRouter(tags=["Schema & Apps"])
 
-# スキーマサービスのインスタンス
-schema_service = SchemaService()
+
+def get_schema_service(request: Request) -> SchemaService:
+    """lifespan で生成したスキーマサービスを取得する"""
+    return request.app.state.schema_service
+
+
+def _with_etag(request: Request, response: Response, result: Any, etag: str) -> Any:
+    """
+    ETag と Cache-Control を付けて結果を返す（本文は response_model を通して FastAPI がシリアライズする）
+    If-None-Match が一致する場合は本文なしの 304 を返す
+    """
+    headers = {"ETag": etag, "Cache-Control": "private, max-age=10"}
+
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match and (if_none_match.strip() == "*"
+                          or etag in (tag.strip() for tag in if_none_match.split(","))):
+        return Response(status_code=304, headers=headers)
+    response.headers.update(headers)
+    return result
 
 
 # アプリ管理エンドポイント
-@router.get("/apps")
-async def get_apps():
-    """アプリ一覧を取得する"""
-    try:
-        result = await schema_service.get_apps_list()
-        return result
-    except Exception as e:
-        logger.error(f"Error getting apps list: {str(e)}")
-        raise HTTPException(status_code=500, detail=f"Error: {str(e)}")
+@router.get("/apps", response_model=AppListResponse, response_model_exclude_none=True)
+async def get_apps(
+    request: Request,
+    response: Response,
+    limit: Optional[int] = Query(None, ge=1, le=100),
+    next_token: Optional[str] = None,
+    schema_service: SchemaService = Depends(get_schema_service)
+):
+    """アプリ一覧を取得する（limit 指定時はページング）"""
+    if limit is not None:
+        result, etag = await schema_service.get_apps_page(limit, next_token)
+    else:
+        result, etag = await schema_service.get_apps_list()
+    return _with_etag(request, response, result, etag)
 
 
 @router.get("/apps/{app_name}")
-async def get_app_details(app_name: str):
+async def get_app_details(app_name: str, schema_service: SchemaService = Depends(get_schema_service)):
     """アプリ詳細を取得する"""
-    try:
-        result = await schema_service.get_app_details(app_name)
-        return result
-    except Exception as e:
-        logger.error(f"Error getting app details: {str(e)}")
-        raise HTTPException(status_code=500, detail=f"Error: {str(e)}")
+    return await schema_service.get_app_details(app_name)
 
 
 @router.get("/apps/{app_name}/fields")
-async def get_app_fields(app_name: str):
+async def get_app_fields(app_name: str, request: Request, response: Response,
+                         schema_service: SchemaService = Depends(get_schema_service)):
     """アプリのフィールド一覧を取得する"""
-    try:
-        result = await schema_service.get_app_fields(app_name)
-        return result
-    except Exception as e:
-        logger.error(f"Error getting app fields: {str(e)}")
-        raise HTTPException(status_code=500, detail=f"Error: {str(e)}")
+    result, etag = await schema_service.get_app_fields(app_name)
+    return _with_etag(request, response, result, etag)
 
 
 @router.get("/apps/{app_name}/custom-prompt")
-async def get_custom_prompt(app_name: str):
+async def get_custom_prompt(app_name: str, request: Request, response: Response,
+                            schema_service: SchemaService = Depends(get_schema_service)):
     """カスタムプロンプトを取得する"""
-    try:
-        result = await schema_service.get_custom_prompt(app_name)
-        return result
-    except Exception as e:
-        logger.error(f"Error getting custom prompt: {str(e)}")
-        raise HTTPException(status_code=500, detail=f"Error: {str(e)}")
+    result, etag = await schema_service.get_custom_prompt(app_name)
+    return _with_etag(request, response, result, etag)
 
 
 @router.put("/apps/{app_name}/custom-prompt")
-async def update_custom_prompt(app_name: str, request: CustomPromptRequest):
+async def update_custom_prompt(app_name: str, request: CustomPromptRequest, schema_service: SchemaService = Depends(get_schema_service)):
     """カスタムプロンプトを更新する"""
-    try:
-        await schema_service.update_custom_prompt(app_name, request)
-        return {"status": "success", "message": "Custom prompt updated successfully"}
-    except Exception as e:
-        logger.error(f"Error updating custom prompt: {str(e)}")
-        raise HTTPException(status_code=500, detail=f"Error: {str(e)}")
+    await schema_service.update_custom_prompt(app_name, request)
+    return {"status": "success", "message": "Custom prompt updated successfully"}
 
 
 @router.post("/apps")
-async def create_app(app_data: dict):
+async def create_app(app_data: dict, schema_service: SchemaService = Depends(get_schema_service)):
     """新しいアプリを作成または更新する"""
-    try:
-        result = await schema_service.create_app(app_data)
-        return result
-    except Exception as e:
-        logger.error(f"Error creating app: {str(e)}")
-        raise HTTPException(status_code=400, detail=str(e))
+    return await schema_service.create_app(app_data)
 
 
 @router.delete("/apps/{app_name}")
-async def delete_app(app_name: str):
+async def delete_app(app_name: str, schema_service: SchemaService = Depends(get_schema_service)):
     """アプリを削除する"""
-    try:
-        await schema_service.delete_app(app_name)
-        return {"status": "success", "message": f"App '{app_name}' deleted successfully"}
-    except Exception as e:
-        logger.error(f"Error deleting app: {str(e)}")
-        raise HTTPException(status_code=500, detail=f"Error: {str(e)}")
+    await schema_service.delete_app(app_name)
+    return {"status": "success", "message": f"App '{app_name}' deleted successfully"}
 
 
 # スキーマ管理エンドポイント
 @router.post("/schema/save")
-async def save_schema(request: SchemaSaveRequest):
+async def save_schema(request: SchemaSaveRequest, schema_service: SchemaService = Depends(get_schema_service)):
     """スキーマを保存する"""
-    try:
-        result = await schema_service.save_schema(request)
-        return result
-    except Exception as e:
-        logger.error(f"Error saving schema: {str(e)}")
-        raise HTTPException(status_code=400, detail=str(e))
+    return await schema_service.save_schema(request)
 
 
 @router.post("/schema/generate-presigned-url")
-async def generate_schema_presigned_url(request: PresignedUrlRequest):
+async def generate_schema_presigned_url(request: PresignedUrlRequest, schema_service: SchemaService = Depends(get_schema_service)):
     """スキーマ用の署名付きURLを生成する"""
-    try:
-        result = await schema_service.generate_schema_presigned_url(request)
-        return result
-    except Exception as e:
-        logger.error(f"Error generating schema presigned URL: {str(e)}")
-        raise HTTPException(status_code=500, detail=f"Error: {str(e)}")
+    return await schema_service.generate_schema_presigned_url(request)
 
 
 @router.post("/schema/generate")
-async def generate_schema(request: SchemaGenerateRequest):
+async def generate_schema(request: SchemaGenerateRequest, schema_service: SchemaService = Depends(get_schema_service)):
     """スキーマを自動生成する"""
-    try:
-        result = await schema_service.generate_schema(request)
-        return result
-    except Exception as e:
-        logger.error(f"Error generating schema: {str(e)}")
-        raise HTTPException(status_code=500, detail=f"Error: {str(e)}")
+    return await schema_service.generate_schema(request)
 
 
 @router.put("/schema/update/{app_name}")
-async def update_schema(app_name: str, request: SchemaSaveRequest):
+async def update_schema(app_name: str, request: SchemaSaveRequest, schema_service: SchemaService = Depends(get_schema_service)):
     """既存のスキーマを更新する"""
-    try:
-        result = await schema_service.update_schema(app_name, request)
-        return result
-    except Exception as e:
-        logger.error(f"Error updating schema: {str(e)}")
-        raise HTTPException(status_code=400, detail=str(e))
+    return await schema_service.update_schema(app_name, request)
@@ -1,67 +1,47 @@
-from fastapi import APIRouter, HTTPException
+from fastapi import APIRouter, Request, Response, Depends
 import logging
 
 from schemas import (
-    PresignedUrlRequest, PresignedUrlResponse, UploadCompleteRequest,
+    PresignedUrlRequest, PresignedUrlResponse, UploadCompleteRequest, ImageListResponse,
 )
 from services.upload_service import UploadService
 
 logger = logging.getLogger(__name__)
 router = APIRouter(tags=["Upload"])
 
-# アップロードサービスのインスタンス
-upload_service = UploadService()
+def get_upload_service(request: Request) -> UploadService:
+    """lifespan で生成したアップロードサービスを取得する"""
+    return request.app.state.upload_service
 
 
 @router.post("/generate-presigned-url", response_model=PresignedUrlResponse)
-async def generate_presigned_url(request: PresignedUrlRequest):
+async def generate_presigned_url(request: PresignedUrlRequest, upload_service: UploadService = Depends(get_upload_service)):
     """署名付きURLを生成して返す"""
-    try:
-        result = await upload_service.generate_presigned_url(request)
-        return result
-    except Exception as e:
-        logger.error(f"Error generating presigned URL: {str(e)}")
-        raise HTTPException(status_code=500, detail=f"Error: {str(e)}")
+    return await upload_service.generate_presigned_url(request)
 
 
 @router.post("/upload-complete")
-async def upload_complete(request: UploadCompleteRequest):
+async def upload_complete(request: UploadCompleteRequest, upload_service: UploadService = Depends(get_upload_service)):
     """アップロード完了を処理する"""
-    try:
-        result = await upload_service.handle_upload_complete(request)
-        return result
-    except Exception as e:
-        logger.error(f"Error handling upload complete: {str(e)}")
-        raise HTTPException(status_code=500, detail=f"Error: {str(e)}")
+    return await upload_service.handle_upload_complete(request)
 
 
 @router.get("/image/{image_id}")
-async def get_image(image_id: str):
+async def get_image(image_id: str, request: Request, upload_service: UploadService = Depends(get_upload_service)):
     """画像を取得して返す"""
-    try:
-        return await upload_service.get_image_stream(image_id)
-    except Exception as e:
-        logger.error(f"Error getting image: {str(e)}")
-        raise HTTPException(status_code=500, detail=f"Error: {str(e)}")
+    range_header = request.headers.get("range")
+    return await upload_service.get_image_stream(image_id, range_header)
 
 
 @router.get("/generate-presigned-download-url/{image_id}")
-async def generate_presigned_download_url(image_id: str):
+async def generate_presigned_download_url(image_id: str, upload_service: UploadService = Depends(get_upload_service)):
     """ダウンロード用の署名付きURLを生成する"""
-    try:
-        result = await upload_service.generate_download_url(image_id)
-        return result
-    except Exception as e:
-        logger.error(f"Error generating download URL: {str(e)}")
-        raise HTTPException(status_code=500, detail=f"Error: {str(e)}")
+    return await upload_service.generate_download_url(image_id)
 
 
-@router.get("/images")
-async def get_images(app_name: str = None):
+# 検証済みのモデルを pydantic-core で直接JSON化して返すため response_model は使わない（スキーマはドキュメント用に記載）
+@router.get("/images", responses={200: {"model": ImageListResponse}})
+async def get_images(app_name: str = None, upload_service: UploadService = Depends(get_upload_service)):
     """画像一覧を取得する"""
-    try:
-        result = await upload_service.get_images_list(app_name)
-        return result
-    except Exception as e:
-        logger.error(f"Error getting images list: {str(e)}")
-        raise HTTPException(status_code=500, detail=f"Error: {str(e)}")
+    result = await upload_service.get_images_list(app_name)
+    return Response(content=result.model_dump_json(exclude_none=True), media_type="application/json")
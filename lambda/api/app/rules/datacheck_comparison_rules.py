@@ -1,4 +1,8 @@
 """データチェック比較ルール定義"""
+from collections import namedtuple
+from sys import intern
+from types import MappingProxyType
+from typing import Final
 
 COMPARISON_RULES = {
     "work_order_vs_invoice": {
@@ -138,3 +142,60 @@ COMPARISON_RULES = {
         ]
     }
 }
+
+
+def _intern(obj):
+    """ルール内のキー・文字列を再帰的にインターン化する"""
+    if isinstance(obj, dict):
+        return {intern(k) if isinstance(k, str) else k: _intern(v) for k, v in obj.items()}
+    if isinstance(obj, list):
+        return [_intern(x) for x in obj]
+    if isinstance(obj, str):
+        return intern(obj)
+    return obj
+
+
+# 読み取り専用として公開（内側の dict/list はプロンプト生成時に json.dumps するためそのまま）
+COMPARISON_RULES: Final = MappingProxyType(_intern(COMPARISON_RULES))
+
+_WORK_ORDER_VS_INVOICE: Final = COMPARISON_RULES["work_order_vs_invoice"]
+_WORK_ORDER_VS_EXPORT: Final = COMPARISON_RULES["work_order_vs_export"]
+_INVOICE_VS_EXPORT: Final = COMPARISON_RULES["invoice_vs_export"]
+
+
+def get_rule(comparison_type):
+    """比較タイプから比較ルールを取得する（bytes も受け付ける）"""
+    if isinstance(comparison_type, bytes):
+        comparison_type = comparison_type.decode("utf-8")
+    match comparison_type:
+        case "work_order_vs_invoice":
+            return _WORK_ORDER_VS_INVOICE
+        case "work_order_vs_export":
+            return _WORK_ORDER_VS_EXPORT
+        case "invoice_vs_export":
+            return _INVOICE_VS_EXPORT
+        case _:
+            raise KeyError(comparison_type)
+
+
+# (doc1_type, doc2_type) -> 比較タイプ
+RULES_BY_DOC_PAIR: Final = MappingProxyType({
+    (rule["doc1_type"], rule["doc2_type"]): comparison_type
+    for comparison_type, rule in COMPARISON_RULES.items()
+})
+
+# 比較項目をフラットなタプルとして保持（ホットパスでのネストした dict 参照を避ける）
+ComparisonPair = namedtuple(
+    "ComparisonPair", "comparison_type field1 field2 display1 display2 hint")
+
+ALL_PAIRS: Final = tuple(
+    ComparisonPair(comparison_type, p["field1"], p["field2"], p["display1"], p["display2"], p["hint"])
+    for comparison_type, rule in COMPARISON_RULES.items()
+    for p in rule["field_pairs"]
+)
+
+# 比較タイプ -> 比較項目のタプル
+PAIRS_BY_TYPE: Final = MappingProxyType({
+    comparison_type: tuple(p for p in ALL_PAIRS if p.comparison_type == comparison_type)
+    for comparison_type in COMPARISON_RULES
+})
@@ -1,14 +1,36 @@
 """
 Pydantic schemas for API request/response validation
+
+各スキーマは初回アクセス時にサブモジュールから読み込む（PEP 562）。
 """
-from .ocr import OcrWord, OcrResult, OcrResultResponse, OcrStartRequest
-from .upload import PresignedUrlRequest, PresignedUrlResponse, UploadCompleteRequest
-from .extraction import ExtractionRequest, ExtractionResult
-from .schema import SchemaField, SchemaGenerateRequest, SchemaSaveRequest
-from .job import JobStatus, JobStartResponse
-from .image import ImageInfo, ImageListResponse
-from .app import AppCreateRequest, AppUpdateRequest, CustomPromptRequest
-from .common import ErrorResponse, SuccessResponse
+import importlib
+
+# スキーマ名 -> 定義しているサブモジュール
+_SCHEMA_MODULES = {
+    "OcrWord": "ocr",
+    "OcrResult": "ocr",
+    "OcrResultResponse": "ocr",
+    "OcrStartRequest": "ocr",
+    "PresignedUrlRequest": "upload",
+    "PresignedUrlResponse": "upload",
+    "UploadCompleteRequest": "upload",
+    "ExtractionRequest": "extraction",
+    "ExtractionResult": "extraction",
+    "SchemaField": "schema",
+    "SchemaGenerateRequest": "schema",
+    "SchemaSaveRequest": "schema",
+    "JobStatus": "job",
+    "JobStartResponse": "job",
+    "ImageInfo": "image",
+    "ImageListResponse": "image",
+    "AppCreateRequest": "app",
+    "AppUpdateRequest": "app",
+    "CustomPromptRequest": "app",
+    "AppInfo": "app",
+    "AppListResponse": "app",
+    "ErrorResponse": "common",
+    "SuccessResponse": "common",
+}
 
 __all__ = [
     # OCR
@@ -37,7 +59,18 @@ __all__ = [
     "AppCreateRequest",
     "AppUpdateRequest",
     "CustomPromptRequest",
+    "AppInfo",
+    "AppListResponse",
     # Common
     "ErrorResponse",
     "SuccessResponse",
 ]
+
+
+def __getattr__(name):
+    module_name = _SCHEMA_MODULES.get(name)
+    if module_name is None:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    value = getattr(importlib.import_module(f".{module_name}", __name__), name)
+    globals()[name] = value
+    return value
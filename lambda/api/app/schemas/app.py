@@ -1,4 +1,4 @@
-from pydantic import BaseModel
+from pydantic import BaseModel, ConfigDict
 from typing import Optional, List, Dict, Any
 
 
@@ -23,3 +23,24 @@ class AppUpdateRequest(BaseModel):
 class CustomPromptRequest(BaseModel):
     """カスタムプロンプト更新リクエスト"""
     custom_prompt: str
+
+
+class AppInfo(BaseModel):
+    """アプリ情報"""
+    model_config = ConfigDict(frozen=True, extra="ignore")
+
+    name: str
+    display_name: Optional[str] = None
+    description: Optional[str] = None
+    fields: List[Dict[str, Any]] = []
+    input_methods: Dict[str, Any] = {}
+    custom_prompt: Optional[str] = None
+    needs_vision: bool = True
+
+
+class AppListResponse(BaseModel):
+    """アプリ一覧レスポンス"""
+    model_config = ConfigDict(frozen=True, extra="ignore")
+
+    apps: List[AppInfo]
+    next_token: Optional[str] = None
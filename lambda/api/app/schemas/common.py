@@ -1,9 +1,11 @@
-from pydantic import BaseModel
+from pydantic import BaseModel, ConfigDict
 from typing import Optional, Dict, Any
 
 
 class ErrorResponse(BaseModel):
     """エラーレスポンス"""
+    model_config = ConfigDict(frozen=True)
+
     error: str
     detail: Optional[str] = None
     status_code: int
@@ -11,6 +13,8 @@ class ErrorResponse(BaseModel):
 
 class SuccessResponse(BaseModel):
     """成功レスポンス"""
+    model_config = ConfigDict(frozen=True)
+
     status: str
     message: str
     data: Optional[Dict[str, Any]] = None
@@ -1,10 +1,12 @@
-from pydantic import BaseModel
-from typing import Optional, Dict, Any, List
+from pydantic import BaseModel, ConfigDict
+from typing import Optional, List
 from datetime import datetime
 
 
 class FileInfo(BaseModel):
     """ファイル情報"""
+    model_config = ConfigDict(extra="forbid", str_strip_whitespace=True)
+
     type: str  # datacheck_work_order, datacheck_invoice, datacheck_export_declaration
     filename: str
     content_type: str
@@ -12,12 +14,16 @@ class FileInfo(BaseModel):
 
 class ProjectInitRequest(BaseModel):
     """プロジェクト初期化リクエスト"""
+    model_config = ConfigDict(extra="forbid", str_strip_whitespace=True)
+
     name: Optional[str] = None
     files: List[FileInfo]
 
 
 class DocumentInfo(BaseModel):
     """ドキュメント情報"""
+    model_config = ConfigDict(from_attributes=True, frozen=True)
+
     document_id: str
     document_type: str
     presigned_url: str
@@ -26,23 +32,31 @@ class DocumentInfo(BaseModel):
 
 class ProjectInitResponse(BaseModel):
     """プロジェクト初期化レスポンス"""
+    model_config = ConfigDict(from_attributes=True, frozen=True)
+
     project_id: str
     documents: List[DocumentInfo]
 
 
 class ProjectCreateRequest(BaseModel):
     """プロジェクト作成リクエスト"""
+    model_config = ConfigDict(extra="forbid", str_strip_whitespace=True)
+
     name: Optional[str] = None
 
 
 class ProjectCreateResponse(BaseModel):
     """プロジェクト作成レスポンス"""
+    model_config = ConfigDict(from_attributes=True, frozen=True)
+
     project_id: str
     created_at: str
 
 
 class DocumentUploadRequest(BaseModel):
     """帳票アップロードリクエスト"""
+    model_config = ConfigDict(extra="forbid", str_strip_whitespace=True)
+
     filename: str
     content_type: str
     document_type: str  # work_order, invoice, export_declaration
@@ -50,6 +64,8 @@ class DocumentUploadRequest(BaseModel):
 
 class FeedbackRequest(BaseModel):
     """フィードバックリクエスト"""
+    model_config = ConfigDict(extra="forbid", str_strip_whitespace=True)
+
     feedback_type: str  # "good" or "bad"
     doc1_name: str
     doc2_name: str
@@ -67,6 +83,8 @@ class FeedbackRequest(BaseModel):
 
 class DocumentUploadResponse(BaseModel):
     """帳票アップロードレスポンス"""
+    model_config = ConfigDict(from_attributes=True, frozen=True)
+
     presigned_url: str
     document_id: str
     s3_key: str
@@ -74,32 +92,41 @@ class DocumentUploadResponse(BaseModel):
 
 class DocumentUploadCompleteRequest(BaseModel):
     """帳票アップロード完了リクエスト"""
+    model_config = ConfigDict(extra="forbid", str_strip_whitespace=True)
+
     document_id: str
     filename: str
 
 
 class CheckExecuteRequest(BaseModel):
     """データチェック実行リクエスト"""
-    pass
+    model_config = ConfigDict(extra="forbid", str_strip_whitespace=True)
 
 
 class ComparisonItem(BaseModel):
     """比較項目の詳細"""
+    # LLMが数値で値を返す場合があるため文字列に寄せる
+    model_config = ConfigDict(from_attributes=True, frozen=True, coerce_numbers_to_str=True)
+
     field1_name: str
     field2_name: str
     field1_display: str
     field2_display: str
-    value1: str
-    value2: str
+    value1: Optional[str] = None
+    value2: Optional[str] = None
     status: str  # "match" or "mismatch"
     reason: str  # LLMが判断した理由
 
 
 class CheckResult(BaseModel):
     """チェック結果"""
+    model_config = ConfigDict(from_attributes=True, frozen=True)
+
     comparison_type: str  # work_order_vs_invoice, work_order_vs_export, invoice_vs_export
     doc1_name: str
     doc2_name: str
+    doc1_id: Optional[str] = None
+    doc2_id: Optional[str] = None
     total_items: int
     matched_items: int
     match_rate: int
@@ -108,16 +135,31 @@ class CheckResult(BaseModel):
 
 class CheckExecuteResponse(BaseModel):
     """データチェック実行レスポンス"""
+    model_config = ConfigDict(from_attributes=True, frozen=True)
+
     project_id: str
     status: str
     results: Optional[List[CheckResult]] = None
 
 
+class ProjectDocument(BaseModel):
+    """プロジェクト内のドキュメント情報"""
+    model_config = ConfigDict(from_attributes=True, frozen=True)
+
+    id: str
+    document_type: Optional[str] = None
+    filename: str
+    status: str
+    ocr_confirmed: bool = False
+
+
 class ProjectResponse(BaseModel):
     """プロジェクト情報レスポンス"""
+    model_config = ConfigDict(from_attributes=True, frozen=True)
+
     project_id: str
     name: Optional[str]
     status: str
     created_at: str
-    documents: List[Dict[str, Any]]
-    check_result: Optional[List[Dict[str, Any]]] = None
+    documents: List[ProjectDocument]
+    check_result: Optional[List[CheckResult]] = None
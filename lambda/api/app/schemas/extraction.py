@@ -1,4 +1,4 @@
-from pydantic import BaseModel
+from pydantic import BaseModel, ConfigDict
 from typing import Optional, List, Dict, Any
 from .ocr import OcrWord
 
@@ -12,6 +12,8 @@ class ExtractionRequest(BaseModel):
 
 class ExtractionResult(BaseModel):
     """情報抽出結果"""
+    model_config = ConfigDict(frozen=True)
+
     extracted_data: Dict[str, Any]
     status: str
     error: Optional[str] = None
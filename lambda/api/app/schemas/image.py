@@ -1,19 +1,27 @@
-from pydantic import BaseModel
-from typing import Optional, List
+from pydantic import BaseModel, ConfigDict
+from typing import Optional, List, Union
 
 
 class ImageInfo(BaseModel):
     """画像情報"""
+    model_config = ConfigDict(frozen=True, extra="ignore")
+
     id: str
-    filename: str
-    s3_key: str
-    status: str
-    upload_time: Optional[str] = None
-    app_name: Optional[str] = None
-    page_processing_mode: Optional[str] = None
+    name: Optional[str] = None
+    s3_key: Optional[Union[str, List[str]]] = None
+    uploadTime: Optional[str] = None
+    status: Optional[str] = None
+    jobId: Optional[str] = None
+    appName: Optional[str] = None
+    pageProcessingMode: Optional[str] = None
+    totalPages: Optional[int] = None
+    pageNumber: Optional[int] = None
+    parentDocumentId: Optional[str] = None
 
 
 class ImageListResponse(BaseModel):
     """画像リストレスポンス"""
+    model_config = ConfigDict(frozen=True, extra="ignore")
+
     images: List[ImageInfo]
-    total_count: int
+    total: int
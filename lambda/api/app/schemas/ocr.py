@@ -1,9 +1,11 @@
-from pydantic import BaseModel
+from pydantic import BaseModel, ConfigDict
 from typing import Optional, List, Dict
 
 
 class OcrWord(BaseModel):
     """OCR認識された単語の情報"""
+    model_config = ConfigDict(frozen=True, extra="ignore", populate_by_name=True)
+
     id: int
     content: str
     rec_score: Optional[float] = None
@@ -14,6 +16,8 @@ class OcrWord(BaseModel):
 
 class OcrResult(BaseModel):
     """OCR処理結果"""
+    model_config = ConfigDict(frozen=True)
+
     words: List[OcrWord]
     text: Optional[str] = None
     word_count: Optional[int] = None
@@ -24,6 +28,8 @@ class OcrResult(BaseModel):
 
 class OcrResultResponse(BaseModel):
     """OCR結果取得APIのレスポンス"""
+    model_config = ConfigDict(frozen=True)
+
     filename: Optional[str]
     s3_key: Optional[str]
     uploadTime: Optional[str]
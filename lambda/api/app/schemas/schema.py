@@ -24,3 +24,5 @@ class SchemaSaveRequest(BaseModel):
     description: Optional[str] = None
     fields: List[Dict[str, Any]]
     input_methods: Dict[str, Any]
+    # 未指定の場合は保存済みの値を維持する（新規作成時は True）
+    needs_vision: Optional[bool] = None
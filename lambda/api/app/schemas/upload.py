@@ -1,4 +1,4 @@
-from pydantic import BaseModel
+from pydantic import BaseModel, ConfigDict
 
 
 class PresignedUrlRequest(BaseModel):
@@ -11,6 +11,8 @@ class PresignedUrlRequest(BaseModel):
 
 class PresignedUrlResponse(BaseModel):
     """プリサインドURL取得レスポンス"""
+    model_config = ConfigDict(frozen=True)
+
     presigned_url: str
     s3_key: str
     image_id: str
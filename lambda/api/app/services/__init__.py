@@ -1,13 +1,10 @@
 """
 Services package
-"""
 
-# Import all services to make them available
-from . import ocr_service
-from . import upload_service
-from . import extraction_service
-from . import schema_service
-from . import s3_sync_service
+各サービスモジュールは初回アクセス時に読み込む（PEP 562）。
+コールドスタート時に未使用のサービスの import コストを払わないため。
+"""
+import importlib
 
 __all__ = [
     'ocr_service',
@@ -16,3 +13,11 @@ __all__ = [
     'schema_service',
     's3_sync_service'
 ]
+
+
+def __getattr__(name):
+    if name in __all__:
+        module = importlib.import_module(f".{name}", __name__)
+        globals()[name] = module
+        return module
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
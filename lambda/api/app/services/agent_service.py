@@ -1,24 +1,70 @@
 """Service for agent-based OCR correction."""
 
-import json
+import asyncio
 import logging
+import re
 from typing import Dict, Any, Optional
 
+import orjson
+
 from repositories import get_image
 from repositories.job_repository import create_agent_job, update_agent_job, get_job
-from clients import AgentClient
+from clients import get_agent_client
+from utils import orjson_default
 from config import settings
-from background import BackgroundTaskExtension
+from exceptions import NotFoundError
+from background import BackgroundTaskExtension, run_coroutine
 
 logger = logging.getLogger(__name__)
 
+# エージェント応答からJSONを取り出す正規表現（コードブロック内を優先し、なければ最も外側の {...}）
+_FENCED_JSON_RE = re.compile(r"```(?:json)?\s*(\{.*?\})\s*```", re.DOTALL)
+_BARE_JSON_RE = re.compile(r"\{.*\}", re.DOTALL)
+
+# エージェント用システムプロンプトのテンプレート（{body} に抽出結果のJSONを埋め込む）
+_SYSTEM_PROMPT_TMPL = """あなたはOCR抽出結果を検証し、誤りを修正するアシスタントです。
+
+## タスク
+以下のOCR抽出結果を検証し、誤りがあれば修正してください。
+
+## OCR抽出結果
+{body}
+
+## 指示
+- 利用可能なツールを使って、抽出結果の正確性を検証してください
+- 数値計算がある場合は、検算ツールを使用して計算の正確性を確認してください
+- データベースに登録されている情報と照合し、不一致があれば修正案を提示してください
+
+## 出力形式
+修正が必要な場合のみ、以下のJSON形式で出力してください：
+{{
+  "suggestions": [
+    {{
+      "field": "フィールド名（例: client_info.address）",
+      "original_value": "元の値",
+      "suggested_value": "修正後の値",
+      "reason": "修正理由",
+      "confidence": "high" | "medium" | "low",
+      "tool_used": "使用したツール名（例: get_customer_by_name）"
+    }}
+  ]
+}}
+
+修正が不要な場合は空の配列を返してください：
+{{
+  "suggestions": []
+}}
+"""
+
 
 class AgentService:
     """Service for agent-based OCR correction suggestions"""
     
     def __init__(self, background_task: Optional[BackgroundTaskExtension] = None):
-        self.agent_client = AgentClient()
+        self.agent_client = get_agent_client()
         self.background_task = background_task
+        # 実行中のフォールバックタスク（GCで破棄されないよう参照を保持）
+        self._tasks = set()
     
     async def start_agent_correction(self, image_id: str) -> str:
         """Start agent correction job
@@ -41,8 +87,10 @@ class AgentService:
                 )
                 logger.info(f"Started agent job {job_id} with task ID {task_id}")
             else:
-                # Fallback: synchronous execution (for testing)
-                await self._process_agent_correction_async(job_id, image_id)
+                # Fallback: schedule on the running event loop
+                task = asyncio.create_task(self._process_agent_correction_async(job_id, image_id))
+                self._tasks.add(task)
+                task.add_done_callback(self._tasks.discard)
             
             return job_id
             
@@ -57,8 +105,7 @@ class AgentService:
             job_id: Job ID
             image_id: Image ID
         """
-        import asyncio
-        asyncio.run(self._process_agent_correction_async(job_id, image_id))
+        run_coroutine(self._process_agent_correction_async(job_id, image_id))
     
     async def _process_agent_correction_async(self, job_id: str, image_id: str):
         """Process agent correction in background
@@ -73,7 +120,7 @@ class AgentService:
             # Get OCR extraction results
             image_data = get_image(image_id)
             if not image_data:
-                raise ValueError(f"Image not found: {image_id}")
+                raise NotFoundError(f"Image not found: {image_id}")
             
             extracted_info = image_data.get("extracted_info", {})
             if not extracted_info:
@@ -117,7 +164,7 @@ class AgentService:
         """
         job = get_job(job_id)
         if not job:
-            raise ValueError(f"Job not found: {job_id}")
+            raise NotFoundError(f"Job not found: {job_id}")
         
         return {
             "job_id": job_id,
@@ -151,39 +198,12 @@ class AgentService:
         Returns:
             System prompt string
         """
-        return f"""あなたはOCR抽出結果を検証し、誤りを修正するアシスタントです。
-
-## タスク
-以下のOCR抽出結果を検証し、誤りがあれば修正してください。
-
-## OCR抽出結果
-{json.dumps(extracted_info, ensure_ascii=False, indent=2)}
-
-## 指示
-- 利用可能なツールを使って、抽出結果の正確性を検証してください
-- 数値計算がある場合は、検算ツールを使用して計算の正確性を確認してください
-- データベースに登録されている情報と照合し、不一致があれば修正案を提示してください
-
-## 出力形式
-修正が必要な場合のみ、以下のJSON形式で出力してください：
-{{
-  "suggestions": [
-    {{
-      "field": "フィールド名（例: client_info.address）",
-      "original_value": "元の値",
-      "suggested_value": "修正後の値",
-      "reason": "修正理由",
-      "confidence": "high" | "medium" | "low",
-      "tool_used": "使用したツール名（例: get_customer_by_name）"
-    }}
-  ]
-}}
-
-修正が不要な場合は空の配列を返してください：
-{{
-  "suggestions": []
-}}
-"""
+        body = orjson.dumps(
+            extracted_info,
+            default=orjson_default,
+            option=orjson.OPT_INDENT_2 | orjson.OPT_NON_STR_KEYS
+        ).decode("utf-8")
+        return _SYSTEM_PROMPT_TMPL.format_map({"body": body})
     
 
     def _parse_agent_response(self, response_text: str) -> list[dict]:
@@ -197,23 +217,17 @@ class AgentService:
         """
         try:
             # Extract JSON from response
-            if "```json" in response_text:
-                json_start = response_text.find("```json") + 7
-                json_end = response_text.find("```", json_start)
-                json_str = response_text[json_start:json_end].strip()
-            elif "```" in response_text:
-                json_start = response_text.find("```") + 3
-                json_end = response_text.find("```", json_start)
-                json_str = response_text[json_start:json_end].strip()
+            match = _FENCED_JSON_RE.search(response_text)
+            if match:
+                json_str = match.group(1)
             else:
-                json_start = response_text.find("{")
-                json_end = response_text.rfind("}") + 1
-                if json_start >= 0 and json_end > json_start:
-                    json_str = response_text[json_start:json_end]
-                else:
-                    json_str = response_text
+                match = _BARE_JSON_RE.search(response_text)
+                if not match:
+                    logger.warning("No JSON found in agent response")
+                    return []
+                json_str = match.group(0)
             
-            result = json.loads(json_str)
+            result = orjson.loads(json_str)
             suggestions = result.get("suggestions", [])
             
             logger.info(f"Parsed {len(suggestions)} suggestions from agent response")
@@ -239,7 +253,7 @@ class AgentService:
             # Get OCR extraction results
             image_data = get_image(image_id)
             if not image_data:
-                raise ValueError(f"Image not found: {image_id}")
+                raise NotFoundError(f"Image not found: {image_id}")
             
             extracted_info = image_data.get("extracted_info", {})
             if not extracted_info:
@@ -1,22 +1,196 @@
-from clients import s3_client
+from clients import s3_client, s3_transfer_config, generate_presigned_url_async
+import asyncio
+import contextvars
 import logging
+import random
 import uuid
 import json
-import re
+import orjson
+from functools import lru_cache
+from botocore.exceptions import ClientError
 from repositories import datacheck_repository
 from repositories.image_repository import (
     create_image_record, get_images_by_project_id, 
-    update_image_status, update_image_ocr_confirmed, update_converted_image
+    update_image_status, update_image_ocr_confirmed, update_converted_image,
+    bulk_update_image_status
 )
 from schemas.datacheck import *
+from rules.datacheck_comparison_rules import COMPARISON_RULES, get_rule
 from config import settings
+from exceptions import NotFoundError, ConflictError
 from services.ocr_service import OcrService
-from clients import AgentClient
-from utils import resize_image, convert_pdf_to_image
+from clients import AgentClient, get_agent_client
+from background import run_coroutine
+from utils import (
+    resize_image, convert_pdf_to_image, buffer_pool, orjson_default, probe_image_size, safe_filename,
+    IMAGE_MAX_DIMENSION, IMAGE_HEADER_PROBE_BYTES
+)
 from datetime import datetime
 
 logger = logging.getLogger(__name__)
 
+# リクエスト（asyncio タスク）単位のドキュメント一覧キャッシュ: (project_id, attrs) -> documents
+_docs_cache: contextvars.ContextVar = contextvars.ContextVar("datacheck_docs_cache", default=None)
+
+
+# LLM（AgentCore）呼び出しの同時実行数を制限するセマフォ（チェックはバックグラウンドのイベントループで実行）
+_LLM_SEM = asyncio.Semaphore(settings.MAX_LLM_CONCURRENCY)
+
+# スロットリング時のリトライ設定
+LLM_RETRY_ATTEMPTS = 3
+LLM_RETRY_BASE_DELAY = 1.0  # 秒
+LLM_RETRY_MAX_DELAY = 8.0  # 秒
+_THROTTLING_ERROR_CODES = frozenset({
+    "ThrottlingException",
+    "TooManyRequestsException",
+    "ServiceQuotaExceededException",
+})
+
+
+async def _invoke_with_retry(agent_client: AgentClient, **kwargs) -> str:
+    """同時実行数を制限してAgentCoreを呼び出し、スロットリング時は指数バックオフでリトライ"""
+    for attempt in range(LLM_RETRY_ATTEMPTS):
+        async with _LLM_SEM:
+            try:
+                return await agent_client.invoke_agent(**kwargs)
+            except ClientError as e:
+                error_code = e.response.get("Error", {}).get("Code")
+                if error_code not in _THROTTLING_ERROR_CODES or attempt == LLM_RETRY_ATTEMPTS - 1:
+                    raise
+        # 待機中はセマフォを解放して他の呼び出しに枠を譲る
+        delay = min(LLM_RETRY_MAX_DELAY, LLM_RETRY_BASE_DELAY * 2 ** attempt) + random.uniform(0, LLM_RETRY_BASE_DELAY)
+        logger.warning(f"Agent invocation throttled ({error_code}), retrying in {delay:.1f}s")
+        await asyncio.sleep(delay)
+
+
+# データチェック対象のドキュメント数（作業依頼書・INVOICE・輸出申告事項登録）
+DATACHECK_DOCUMENT_COUNT = 3
+
+# 比較用のシステムプロンプト（固定文字列のためモジュールロード時に一度だけ定義）
+_SYSTEM_PROMPT = """あなたは2つのドキュメントのデータを比較する専門家です。
+
+# 判断基準
+1. **表記ゆれは許容**: "ABC Company" と "ABC Co., Ltd." は同一とみなす
+2. **言語の違いは許容**: "東京" と "Tokyo" は同一とみなす
+3. **数値の単位は無視**: "1,500 kg" と "1500" は同一とみなす（数値部分のみ比較）
+4. **港コード比較**: 港名の場合は lookup_port_code ツールを使って港コードを取得し比較
+5. **計算ロジック**: FOB価格の場合は CIF * 0.9 を計算して検証（誤差5%許容）
+
+# 重要: 必ず以下のJSON形式で回答してください
+他の説明文は一切不要です。JSONのみを出力してください。
+
+{
+  "results": [
+    {
+      "field1": "フィールド名1",
+      "field2": "フィールド名2",
+      "value1": "値1",
+      "value2": "値2",
+      "match": true,
+      "reason": "判断理由"
+    }
+  ],
+  "total": 5,
+  "matched": 3
+}"""
+
+
+# LLM出力からJSONオブジェクトを取り出すためのデコーダー
+_JSON_DECODER = json.JSONDecoder()
+
+
+def _to_prompt_json(obj) -> str:
+    """プロンプトに埋め込むJSON文字列を生成（インデント2・非ASCIIはそのまま）"""
+    return orjson.dumps(
+        obj,
+        default=orjson_default,
+        option=orjson.OPT_INDENT_2 | orjson.OPT_NON_STR_KEYS
+    ).decode("utf-8")
+
+
+@lru_cache(maxsize=8)
+def _serialize_field_pairs(comparison_type: str) -> str:
+    """比較タイプごとの比較項目JSONをキャッシュ（ルールは読み取り専用のため不変）"""
+    return _to_prompt_json(get_rule(comparison_type)["field_pairs"])
+
+
+def _escape_format(text: str) -> str:
+    """str.format のテンプレートに埋め込めるよう波括弧をエスケープ"""
+    return text.replace("{", "{{").replace("}", "}}")
+
+
+# 比較タイプごとのユーザープロンプトテンプレート（ドキュメントデータ以外はロード時に組み立て済み）
+PROMPT_TEMPLATES = {
+    comparison_type: f"""以下の項目について、2つのドキュメントの値が一致しているか判断してください。
+
+# ドキュメント1: {_escape_format(rules["doc1_name"])}
+{{doc1_json}}
+
+# ドキュメント2: {_escape_format(rules["doc2_name"])}
+{{doc2_json}}
+
+# 比較項目
+{_escape_format(_serialize_field_pairs(comparison_type))}"""
+    for comparison_type, rules in COMPARISON_RULES.items()
+}
+
+
+# ドックレシートのフィールド定義: (name, display, doc_type, field, recommendation)
+_DOCK_RECEIPT_FIELDS = (
+    ("exporter_name", "輸出者名", "datacheck_work_order", "exporter_name", None),
+    ("deadline", "締切日", "datacheck_work_order", "deadline", None),
+    ("loading_port", "積込港", "datacheck_work_order", "loading_port", None),
+    ("final_destination", "最終仕向地", "datacheck_work_order", "final_destination", None),
+    ("invoice_no", "Invoice No.", "datacheck_invoice", "invoice_no", None),
+    ("country_code", "国コード", "datacheck_export_declaration", "country_code", None),
+    ("export_cert_division", "輸出認証等区分", "datacheck_export_declaration", "export_cert_division", None),
+    ("container_number", "コンテナナンバー", None, None, "CLPを確認しましょう"),
+    ("ship_number", "船番号", None, None, "CLPを確認しましょう"),
+    ("booking_number", "Booking Number", None, None, "Booking Confirmationを確認しましょう"),
+)
+
+# 未入力フィールドに付与するレコメンデーション: name -> recommendation
+_DOCK_RECEIPT_RECOMMENDATIONS = {
+    name: recommendation
+    for name, _, _, _, recommendation in _DOCK_RECEIPT_FIELDS
+    if recommendation
+}
+
+# ドキュメント名マッピング
+_DOC_NAMES = {
+    "datacheck_work_order": "作業依頼書",
+    "datacheck_invoice": "INVOICE",
+    "datacheck_export_declaration": "輸出申告事項登録"
+}
+
+
+def _build_dock_receipt_field(row: tuple, doc_map: dict) -> dict:
+    """フィールド定義1行分のドックレシート項目を組み立てる"""
+    name, display, doc_type, field, recommendation = row
+    if doc_type is None:
+        # 未入力フィールド（レコメンデーション付き）
+        return {"name": name, "display": display, "value": "", "source": None,
+                "filled": False, "recommendation": recommendation}
+    doc = doc_map.get(doc_type)
+    if doc is None:
+        return {"name": name, "display": display, "value": "", "source": None, "filled": False}
+    value = doc["data"].get(field, "")
+    return {
+        "name": name,
+        "display": display,
+        "value": value,
+        "source": _DOC_NAMES.get(doc_type),
+        "source_document_id": doc["id"],
+        "filled": bool(value)
+    }
+
+
+# ステータス確認・プロジェクト表示に必要なドキュメント属性
+_STATUS_ATTRS = ("id", "status", "ocr_confirmed", "document_type", "filename")
+
+# アップロード完了処理に必要なドキュメント属性
+_UPLOAD_ATTRS = ("id", "s3_key", "filename", "content_type")
+
 
 class DataCheckService:
     """データチェックサービス"""
@@ -25,6 +199,33 @@ class DataCheckService:
         self.bucket_name = settings.BUCKET_NAME
         self.background_task = background_task
         self.ocr_service = OcrService(background_task)
+        # チェック・サービス間で共有するAgentClient
+        self.agent_client = get_agent_client()
+    
+    async def _get_docs(self, project_id: str, attrs: tuple = None) -> list:
+        """
+        プロジェクトのドキュメント一覧を取得（同一リクエスト内ではキャッシュを使う）
+        
+        attrs を指定した場合はその属性のみ取得する（全属性を取得済みならそれを使う）
+        """
+        cache = _docs_cache.get()
+        if cache is None:
+            cache = {}
+            _docs_cache.set(cache)
+        full_docs = cache.get((project_id, None))
+        if full_docs is not None:
+            return full_docs
+        key = (project_id, attrs)
+        if key not in cache:
+            cache[key] = get_images_by_project_id(project_id, attrs)
+        return cache[key]
+    
+    def _invalidate_docs(self, project_id: str):
+        """ドキュメント更新後にキャッシュを破棄"""
+        cache = _docs_cache.get()
+        if cache is not None:
+            for key in [key for key in cache if key[0] == project_id]:
+                del cache[key]
     
     async def create_project(self, name=None):
         """プロジェクトを作成"""
@@ -43,17 +244,18 @@ class DataCheckService:
         documents = []
         for file_info in request.files:
             document_id = str(uuid.uuid4())
-            s3_key = f"uploads/{document_id}_{datetime.now().isoformat()}_{file_info.filename}"
+            # document_id で一意になるため、日時は含めずファイル名をその配下に置く
+            s3_key = f"uploads/{document_id}/{safe_filename(file_info.filename)}"
             
             # presigned URL生成
-            presigned_url = s3_client.generate_presigned_url(
+            presigned_url = await generate_presigned_url_async(
                 'put_object',
-                Params={
+                {
                     'Bucket': self.bucket_name,
                     'Key': s3_key,
                     'ContentType': file_info.content_type
                 },
-                ExpiresIn=3600
+                3600
             )
             
             # ImagesTableに登録 - app_nameにdocument_typeを使用
@@ -65,7 +267,8 @@ class DataCheckService:
                 status="uploading",
                 project_id=project_id,
                 document_type=file_info.type,
-                ocr_confirmed=False
+                ocr_confirmed=False,
+                content_type=file_info.content_type
             )
             
             documents.append({
@@ -80,76 +283,137 @@ class DataCheckService:
     
     async def upload_complete(self, project_id: str):
         """アップロード完了処理 - PDF変換・画像リサイズを実行"""
-        documents = get_images_by_project_id(project_id)
+        documents = await self._get_docs(project_id, _UPLOAD_ATTRS)
         
-        for doc in documents:
-            doc_id = doc["id"]
-            s3_key = doc["s3_key"]
-            filename = doc["filename"]
-            
-            try:
-                # S3オブジェクトの存在確認とContent-Type取得
+        # ドキュメントごとのS3処理は独立しているため、同時実行数を制限して並行に処理する
+        semaphore = asyncio.Semaphore(settings.S3_CONCURRENCY)
+        
+        async def process_one(doc):
+            async with semaphore:
+                return await asyncio.to_thread(self._process_uploaded_document, doc)
+        
+        outcomes = await asyncio.gather(*[process_one(doc) for doc in documents], return_exceptions=True)
+        
+        # 単純なステータス更新はまとめて書き込む
+        failed_ids = await asyncio.to_thread(bulk_update_image_status, [
+            outcome for outcome in outcomes if outcome and not isinstance(outcome, Exception)
+        ])
+        self._invalidate_docs(project_id)
+        # 更新できなかったドキュメントは処理されないため、プロジェクトを進めずにエラーとする（再実行で再試行できる）
+        if failed_ids:
+            raise RuntimeError(f"Failed to update document status for project {project_id}: {failed_ids}")
+        
+        datacheck_repository.update_project_status(project_id, "pending")
+        logger.info(f"Upload completed for project {project_id}")
+        
+        return {"project_id": project_id, "status": "pending"}
+    
+    def _process_uploaded_document(self, doc: dict):
+        """
+        アップロードされたドキュメント1件を処理（PDF変換の登録・画像リサイズ）
+        
+        Args:
+            doc: ドキュメント情報
+        
+        Returns:
+            一括更新するステータス (ドキュメントID, ステータス)。個別に更新済みの場合は None
+        """
+        doc_id = doc["id"]
+        s3_key = doc["s3_key"]
+        filename = doc["filename"]
+        
+        try:
+            # Content-Typeは登録時の値を使う（未登録の古いレコードのみS3から取得）
+            content_type = doc.get("content_type")
+            if not content_type:
                 s3_response = s3_client.head_object(
                     Bucket=self.bucket_name,
                     Key=s3_key
                 )
                 content_type = s3_response.get('ContentType', 'application/octet-stream')
+            
+            # ファイル種別を判定
+            is_pdf = content_type == 'application/pdf' or filename.lower().endswith('.pdf')
+            is_image = content_type.startswith('image/')
+            
+            if is_pdf:
+                # PDF変換処理
+                update_image_status(doc_id, "converting")
+                from main import background_task
+                background_task.add_task(convert_pdf_to_image, doc_id, s3_key)
+                logger.info(f"Started PDF conversion for document {doc_id}")
                 
-                # ファイル種別を判定
-                is_pdf = content_type == 'application/pdf' or filename.lower().endswith('.pdf')
-                is_image = content_type.startswith('image/')
+            elif is_image:
+                # 先頭部分だけを取得して画像サイズを判定し、リサイズ不要なら全体をダウンロードしない
+                header_data = s3_client.get_object(
+                    Bucket=self.bucket_name,
+                    Key=s3_key,
+                    Range=f"bytes=0-{IMAGE_HEADER_PROBE_BYTES - 1}"
+                )['Body'].read()
+                is_complete = len(header_data) < IMAGE_HEADER_PROBE_BYTES
+                size = probe_image_size(header_data)
+                if size and size[0] <= IMAGE_MAX_DIMENSION and size[1] <= IMAGE_MAX_DIMENSION:
+                    logger.info(f"No resize needed for document {doc_id}")
+                    return doc_id, "pending"
                 
-                if is_pdf:
-                    # PDF変換処理
-                    update_image_status(doc_id, "converting")
-                    from main import background_task
-                    background_task.add_task(convert_pdf_to_image, doc_id, s3_key)
-                    logger.info(f"Started PDF conversion for document {doc_id}")
-                    
-                elif is_image:
-                    # 画像リサイズ処理
-                    s3_obj = s3_client.get_object(Bucket=self.bucket_name, Key=s3_key)
-                    image_data = s3_obj['Body'].read()
+                # 画像リサイズ処理（プールのバッファへ直接ダウンロード・書き出し）
+                with buffer_pool.acquire() as download_buffer, buffer_pool.acquire() as upload_buffer:
+                    if is_complete:
+                        # 先頭部分の取得でファイル全体を読み込めている
+                        download_buffer.write(header_data)
+                    else:
+                        s3_client.download_fileobj(
+                            self.bucket_name, s3_key, download_buffer, Config=s3_transfer_config)
                     
-                    resized_image_data, was_resized, orig_size, new_size = resize_image(image_data)
+                    _, was_resized, orig_size, new_size = resize_image(
+                        download_buffer, output=upload_buffer)
                     
                     if was_resized:
-                        converted_s3_key = f"converted/{datetime.now().isoformat()}_{filename}"
-                        s3_client.put_object(
-                            Bucket=self.bucket_name,
-                            Key=converted_s3_key,
-                            Body=resized_image_data,
-                            ContentType=content_type
+                        converted_s3_key = f"converted/{doc_id}/{safe_filename(filename)}"
+                        s3_client.upload_fileobj(
+                            upload_buffer,
+                            self.bucket_name,
+                            converted_s3_key,
+                            ExtraArgs={"ContentType": content_type},
+                            Config=s3_transfer_config
                         )
-                        update_converted_image(doc_id, converted_s3_key, "pending", orig_size, new_size)
-                        logger.info(f"Resized image for document {doc_id}")
-                    else:
-                        update_image_status(doc_id, "pending")
-                        logger.info(f"No resize needed for document {doc_id}")
+                
+                if was_resized:
+                    update_converted_image(
+                        doc_id, converted_s3_key, "pending", orig_size, new_size,
+                        content_type=content_type)
+                    logger.info(f"Resized image for document {doc_id}")
                 else:
-                    # その他のファイルはそのままpendingに
-                    update_image_status(doc_id, "pending")
-                    
-            except Exception as e:
-                logger.error(f"Error processing document {doc_id}: {str(e)}")
-                update_image_status(doc_id, "failed")
-        
-        datacheck_repository.update_project_status(project_id, "pending")
-        logger.info(f"Upload completed for project {project_id}")
+                    logger.info(f"No resize needed for document {doc_id}")
+                    return doc_id, "pending"
+            else:
+                # その他のファイルはそのままpendingに
+                return doc_id, "pending"
+                
+        except Exception as e:
+            logger.error(f"Error processing document {doc_id}: {str(e)}")
+            return doc_id, "failed"
         
-        return {"project_id": project_id, "status": "pending"}
+        return None
     
     async def execute_ocr(self, project_id: str):
         """OCR実行"""
-        documents = get_images_by_project_id(project_id)
+        documents = await self._get_docs(project_id, _STATUS_ATTRS)
         
         if len(documents) != 3:
-            raise ValueError(f"Expected 3 documents, found {len(documents)}")
+            raise ConflictError(f"Expected 3 documents, found {len(documents)}")
         
         # 各ドキュメントのステータスをpendingに設定（まだの場合）
-        for doc in documents:
-            if doc.get("status") not in ["pending", "processing"]:
-                update_image_status(doc["id"], "pending")
+        pending_updates = [
+            (doc["id"], "pending") for doc in documents
+            if doc.get("status") not in ["pending", "processing"]
+        ]
+        if pending_updates:
+            failed_ids = await asyncio.to_thread(bulk_update_image_status, pending_updates)
+            self._invalidate_docs(project_id)
+            # pending にできなかったドキュメントはOCRされないため、ジョブを開始せずにエラーとする
+            if failed_ids:
+                raise RuntimeError(f"Failed to set pending status for project {project_id}: {failed_ids}")
         
         # 既存のOCRサービスを利用（app_name指定なしで全pending画像を処理）
         job_id = await self.ocr_service.start_ocr_job(app_name=None)
@@ -163,13 +427,15 @@ class DataCheckService:
     
     async def confirm_ocr(self, project_id: str, document_id: str):
         """OCR確認完了"""
-        update_image_ocr_confirmed(document_id, True)
+        # プロジェクトに属さないドキュメントIDを確認済みとして数えないよう、条件付き更新で所属を確認する
+        if not update_image_ocr_confirmed(document_id, True, project_id=project_id):
+            raise NotFoundError(f"Document {document_id} not found in project {project_id}")
+        self._invalidate_docs(project_id)
         
-        # 全てのドキュメントが確認済みかチェック
-        documents = get_images_by_project_id(project_id)
-        all_confirmed = all(doc.get("ocr_confirmed", False) for doc in documents)
+        # 全てのドキュメントが確認済みかチェック（プロジェクト側の確認済み件数で判定し、一覧の再取得はしない）
+        confirmed_count = datacheck_repository.add_confirmed_document(project_id, document_id)
         
-        if all_confirmed:
+        if confirmed_count >= DATACHECK_DOCUMENT_COUNT:
             datacheck_repository.update_project_status(project_id, "ready_for_check")
             logger.info(f"All documents confirmed for project {project_id}")
         
@@ -177,17 +443,17 @@ class DataCheckService:
     
     async def execute_check(self, project_id: str):
         """データチェック実行（非同期）"""
-        documents = get_images_by_project_id(project_id)
+        documents = await self._get_docs(project_id, _STATUS_ATTRS)
         
         # 前提条件チェック
         if len(documents) != 3:
-            raise ValueError("3つのドキュメントが必要です")
+            raise ConflictError("3つのドキュメントが必要です")
         
         if not all(doc.get("status") == "completed" for doc in documents):
-            raise ValueError("全てのドキュメントのOCR処理が完了している必要があります")
+            raise ConflictError("全てのドキュメントのOCR処理が完了している必要があります")
         
         if not all(doc.get("ocr_confirmed", False) for doc in documents):
-            raise ValueError("全てのドキュメントのOCR結果を確認してください")
+            raise ConflictError("全てのドキュメントのOCR結果を確認してください")
         
         # ステータスを更新してすぐ返す
         datacheck_repository.update_project_status(project_id, "checking")
@@ -200,15 +466,15 @@ class DataCheckService:
     
     def _execute_check_async(self, project_id: str):
         """バックグラウンドでチェック実行"""
-        import asyncio
-        asyncio.run(self._execute_check_task(project_id))
+        # バックグラウンドスレッドのイベントループを使い回す（チェックごとに作り直さない）
+        run_coroutine(self._execute_check_task(project_id))
     
     async def _execute_check_task(self, project_id: str):
         """実際のチェック処理"""
-        from rules.datacheck_comparison_rules import COMPARISON_RULES
+        from rules.datacheck_comparison_rules import get_rule, RULES_BY_DOC_PAIR, PAIRS_BY_TYPE
         
         try:
-            documents = get_images_by_project_id(project_id)
+            documents = await self._get_docs(project_id)
             
             # ドキュメントをタイプ別に分類（IDも保持）
             doc_map = {}
@@ -221,64 +487,40 @@ class DataCheckService:
                 doc_id_map[doc_type] = doc.get("id")
             
             logger.info(f"Document types found: {list(doc_map.keys())}")
-            logger.info(f"Document data sample: {json.dumps({k: str(v)[:100] for k, v in doc_map.items()}, ensure_ascii=False)}")
+            logger.info(f"Document data sample: {orjson.dumps({k: str(v)[:100] for k, v in doc_map.items()}, option=orjson.OPT_NON_STR_KEYS).decode('utf-8')}")
             
-            # AgentClientを初期化
-            agent_client = AgentClient()
+            agent_client = self.agent_client
             
-            results = []
+            # 比較ルールに定義されたドキュメントの組み合わせのうち、両方揃っているものを対象にする
+            specs = [
+                (comparison_type, doc1_type, doc2_type, get_rule(comparison_type))
+                for (doc1_type, doc2_type), comparison_type in RULES_BY_DOC_PAIR.items()
+                if doc1_type in doc_map and doc2_type in doc_map
+            ]
             
-            # 比較1: 作業依頼書 vs INVOICE
-            if "datacheck_work_order" in doc_map and "datacheck_invoice" in doc_map:
-                rules = COMPARISON_RULES["work_order_vs_invoice"]
-                comparison_result = await self._execute_comparison_with_llm(
+            # 各比較は独立しているため、LLM呼び出しを並行に実行する
+            comparison_results = await asyncio.gather(*[
+                self._execute_comparison_with_llm(
                     agent_client,
-                    doc_map["datacheck_work_order"],
-                    doc_map["datacheck_invoice"],
-                    rules
+                    comparison_type,
+                    doc_map[doc1_type],
+                    doc_map[doc2_type],
+                    rules,
+                    PAIRS_BY_TYPE[comparison_type]
                 )
-                results.append({
-                    "comparison_type": "work_order_vs_invoice",
-                    "doc1_name": rules["doc1_name"],
-                    "doc2_name": rules["doc2_name"],
-                    "doc1_id": doc_id_map.get("datacheck_work_order", ""),
-                    "doc2_id": doc_id_map.get("datacheck_invoice", ""),
-                    **comparison_result
-                })
+                for comparison_type, doc1_type, doc2_type, rules in specs
+            ], return_exceptions=True)
             
-            # 比較2: 作業依頼書 vs 輸出申告
-            if "datacheck_work_order" in doc_map and "datacheck_export_declaration" in doc_map:
-                rules = COMPARISON_RULES["work_order_vs_export"]
-                comparison_result = await self._execute_comparison_with_llm(
-                    agent_client,
-                    doc_map["datacheck_work_order"],
-                    doc_map["datacheck_export_declaration"],
-                    rules
-                )
-                results.append({
-                    "comparison_type": "work_order_vs_export",
-                    "doc1_name": rules["doc1_name"],
-                    "doc2_name": rules["doc2_name"],
-                    "doc1_id": doc_id_map.get("datacheck_work_order", ""),
-                    "doc2_id": doc_id_map.get("datacheck_export_declaration", ""),
-                    **comparison_result
-                })
-            
-            # 比較3: INVOICE vs 輸出申告
-            if "datacheck_invoice" in doc_map and "datacheck_export_declaration" in doc_map:
-                rules = COMPARISON_RULES["invoice_vs_export"]
-                comparison_result = await self._execute_comparison_with_llm(
-                    agent_client,
-                    doc_map["datacheck_invoice"],
-                    doc_map["datacheck_export_declaration"],
-                    rules
-                )
+            results = []
+            for (comparison_type, doc1_type, doc2_type, rules), comparison_result in zip(specs, comparison_results):
+                if isinstance(comparison_result, Exception):
+                    raise comparison_result
                 results.append({
-                    "comparison_type": "invoice_vs_export",
+                    "comparison_type": comparison_type,
                     "doc1_name": rules["doc1_name"],
                     "doc2_name": rules["doc2_name"],
-                    "doc1_id": doc_id_map.get("datacheck_invoice", ""),
-                    "doc2_id": doc_id_map.get("datacheck_export_declaration", ""),
+                    "doc1_id": doc_id_map.get(doc1_type, ""),
+                    "doc2_id": doc_id_map.get(doc2_type, ""),
                     **comparison_result
                 })
             
@@ -295,56 +537,25 @@ class DataCheckService:
     async def _execute_comparison_with_llm(
         self,
         agent_client: AgentClient,
+        comparison_type: str,
         doc1_data: dict,
         doc2_data: dict,
-        rules: dict
+        rules: dict,
+        pairs: tuple
     ) -> dict:
         """LLMを使って比較実行"""
         
-        # システムプロンプト
-        system_prompt = """あなたは2つのドキュメントのデータを比較する専門家です。
-
-# 判断基準
-1. **表記ゆれは許容**: "ABC Company" と "ABC Co., Ltd." は同一とみなす
-2. **言語の違いは許容**: "東京" と "Tokyo" は同一とみなす
-3. **数値の単位は無視**: "1,500 kg" と "1500" は同一とみなす（数値部分のみ比較）
-4. **港コード比較**: 港名の場合は lookup_port_code ツールを使って港コードを取得し比較
-5. **計算ロジック**: FOB価格の場合は CIF * 0.9 を計算して検証（誤差5%許容）
-
-# 重要: 必ず以下のJSON形式で回答してください
-他の説明文は一切不要です。JSONのみを出力してください。
-
-{
-  "results": [
-    {
-      "field1": "フィールド名1",
-      "field2": "フィールド名2",
-      "value1": "値1",
-      "value2": "値2",
-      "match": true,
-      "reason": "判断理由"
-    }
-  ],
-  "total": 5,
-  "matched": 3
-}"""
-        
         # ユーザープロンプト
-        prompt = f"""以下の項目について、2つのドキュメントの値が一致しているか判断してください。
-
-# ドキュメント1: {rules["doc1_name"]}
-{json.dumps(doc1_data, ensure_ascii=False, indent=2)}
-
-# ドキュメント2: {rules["doc2_name"]}
-{json.dumps(doc2_data, ensure_ascii=False, indent=2)}
-
-# 比較項目
-{json.dumps(rules["field_pairs"], ensure_ascii=False, indent=2)}"""
+        prompt = PROMPT_TEMPLATES[comparison_type].format(
+            doc1_json=_to_prompt_json(doc1_data),
+            doc2_json=_to_prompt_json(doc2_data)
+        )
         
         # AgentCoreを呼び出し
-        agent_result = await agent_client.invoke_agent(
+        agent_result = await _invoke_with_retry(
+            agent_client,
             messages=[],
-            system_prompt=system_prompt,
+            system_prompt=_SYSTEM_PROMPT,
             prompt=prompt,
             model_info={
                 "modelId": settings.MODEL_ID,
@@ -356,14 +567,22 @@ class DataCheckService:
         comparison_data = self._parse_agent_comparison_result(agent_result)
         
         # レスポンス形式に整形
+        # LLMの結果を(field1, field2)で引けるようにする（順序が入れ替わっても対応できるように）
+        llm_results = comparison_data.get("results", [])
+        results_by_pair = {
+            (r.get("field1"), r.get("field2")): r for r in llm_results if isinstance(r, dict)
+        }
+        
         items = []
-        for i, pair in enumerate(rules["field_pairs"]):
-            result = comparison_data["results"][i] if i < len(comparison_data.get("results", [])) else {}
+        for i, pair in enumerate(pairs):
+            result = results_by_pair.get((pair.field1, pair.field2))
+            if result is None:
+                result = llm_results[i] if i < len(llm_results) else {}
             items.append({
-                "field1_name": pair["field1"],
-                "field2_name": pair["field2"],
-                "field1_display": pair["display1"],
-                "field2_display": pair["display2"],
+                "field1_name": pair.field1,
+                "field2_name": pair.field2,
+                "field1_display": pair.display1,
+                "field2_display": pair.display2,
                 "value1": result.get("value1", ""),
                 "value2": result.get("value2", ""),
                 "status": "match" if result.get("match") else "mismatch",
@@ -383,14 +602,17 @@ class DataCheckService:
     def _parse_agent_comparison_result(self, agent_result: str) -> dict:
         """AgentCoreの結果をパース"""
         
-        # JSON部分を抽出（マークダウンのコードブロックなどを除去）
-        json_match = re.search(r'\{[\s\S]*\}', agent_result)
-        if json_match:
-            json_str = json_match.group(0)
+        # JSON部分を抽出（マークダウンのコードブロックなどの前置きは読み飛ばす）
+        # 各 '{' の位置からデコードを試み、最初に読み取れたオブジェクトを採用する
+        start = agent_result.find('{')
+        while start >= 0:
             try:
-                return json.loads(json_str)
-            except:
+                obj, _ = _JSON_DECODER.raw_decode(agent_result, start)
+                if isinstance(obj, dict):
+                    return obj
+            except json.JSONDecodeError:
                 pass
+            start = agent_result.find('{', start + 1)
         
         # パースに失敗した場合はデフォルト値を返す
         logger.warning(f"Failed to parse agent result: {agent_result}")
@@ -400,9 +622,9 @@ class DataCheckService:
         """プロジェクト情報を取得"""
         project = datacheck_repository.get_project(project_id)
         if not project:
-            raise ValueError(f"Project not found: {project_id}")
+            raise NotFoundError(f"Project not found: {project_id}")
         
-        documents = get_images_by_project_id(project_id)
+        documents = await self._get_docs(project_id, _STATUS_ATTRS)
         
         # OCR処理中の場合、全ドキュメントが完了しているかチェック
         if project["status"] == "ocr_processing":
@@ -418,13 +640,13 @@ class DataCheckService:
             name=project.get("name"),
             status=project["status"],
             created_at=project["created_at"],
-            documents=[{
-                "id": doc["id"],
-                "document_type": doc.get("document_type"),
-                "filename": doc["filename"],
-                "status": doc["status"],
-                "ocr_confirmed": doc.get("ocr_confirmed", False)
-            } for doc in documents],
+            documents=[ProjectDocument(
+                id=doc["id"],
+                document_type=doc.get("document_type"),
+                filename=doc["filename"],
+                status=doc["status"],
+                ocr_confirmed=doc.get("ocr_confirmed", False)
+            ) for doc in documents],
             check_result=project.get("check_results")
         )
     
@@ -480,7 +702,7 @@ class DataCheckService:
         # プロジェクトを取得
         project = datacheck_repository.get_project(project_id)
         if not project:
-            raise ValueError(f"Project not found: {project_id}")
+            raise NotFoundError(f"Project not found: {project_id}")
         
         # 保存データがあればそれを返す（レコメンデーション付与）
         if project.get("dock_receipt_data"):
@@ -488,15 +710,9 @@ class DataCheckService:
             fields = saved_data.get("fields", [])
             
             # 空フィールドにレコメンデーションを追加
-            recommendations = {
-                "container_number": "CLPを確認しましょう",
-                "ship_number": "CLPを確認しましょう",
-                "booking_number": "Booking Confirmationを確認しましょう"
-            }
-            
             for field in fields:
-                if not field.get("filled") and field["name"] in recommendations:
-                    field["recommendation"] = recommendations[field["name"]]
+                if not field.get("filled") and field["name"] in _DOCK_RECEIPT_RECOMMENDATIONS:
+                    field["recommendation"] = _DOCK_RECEIPT_RECOMMENDATIONS[field["name"]]
             
             return {
                 "project_id": project_id,
@@ -507,10 +723,10 @@ class DataCheckService:
             }
         
         # 保存データがなければ計算
-        documents = get_images_by_project_id(project_id)
+        documents = await self._get_docs(project_id)
         
         if not documents:
-            raise ValueError(f"Project not found: {project_id}")
+            raise NotFoundError(f"Project not found: {project_id}")
         
         # ドキュメントタイプ別に分類
         doc_map = {}
@@ -521,60 +737,8 @@ class DataCheckService:
                 "data": doc.get("extracted_info", {})
             }
         
-        # フィールドマッピング定義
-        field_mappings = [
-            {"name": "exporter_name", "display": "輸出者名", "doc_type": "datacheck_work_order", "field": "exporter_name"},
-            {"name": "deadline", "display": "締切日", "doc_type": "datacheck_work_order", "field": "deadline"},
-            {"name": "loading_port", "display": "積込港", "doc_type": "datacheck_work_order", "field": "loading_port"},
-            {"name": "final_destination", "display": "最終仕向地", "doc_type": "datacheck_work_order", "field": "final_destination"},
-            {"name": "invoice_no", "display": "Invoice No.", "doc_type": "datacheck_invoice", "field": "invoice_no"},
-            {"name": "country_code", "display": "国コード", "doc_type": "datacheck_export_declaration", "field": "country_code"},
-            {"name": "export_cert_division", "display": "輸出認証等区分", "doc_type": "datacheck_export_declaration", "field": "export_cert_division"},
-            {"name": "container_number", "display": "コンテナナンバー", "doc_type": None, "field": None, "recommendation": "CLPを確認しましょう"},
-            {"name": "ship_number", "display": "船番号", "doc_type": None, "field": None, "recommendation": "CLPを確認しましょう"},
-            {"name": "booking_number", "display": "Booking Number", "doc_type": None, "field": None, "recommendation": "Booking Confirmationを確認しましょう"},
-        ]
-        
-        # ドキュメント名マッピング
-        doc_names = {
-            "datacheck_work_order": "作業依頼書",
-            "datacheck_invoice": "INVOICE",
-            "datacheck_export_declaration": "輸出申告事項登録"
-        }
-        
-        # データをマッピング
-        fields = []
-        for mapping in field_mappings:
-            if mapping["doc_type"] and mapping["field"]:
-                doc = doc_map.get(mapping["doc_type"])
-                if doc:
-                    value = doc["data"].get(mapping["field"], "")
-                    fields.append({
-                        "name": mapping["name"],
-                        "display": mapping["display"],
-                        "value": value,
-                        "source": doc_names.get(mapping["doc_type"]),
-                        "source_document_id": doc["id"],
-                        "filled": bool(value)
-                    })
-                else:
-                    fields.append({
-                        "name": mapping["name"],
-                        "display": mapping["display"],
-                        "value": "",
-                        "source": None,
-                        "filled": False
-                    })
-            else:
-                # 未入力フィールド（レコメンデーション付き）
-                fields.append({
-                    "name": mapping["name"],
-                    "display": mapping["display"],
-                    "value": "",
-                    "source": None,
-                    "filled": False,
-                    "recommendation": mapping.get("recommendation")
-                })
+        # データをマッピング（ドキュメントの検索は1行につき1回）
+        fields = [_build_dock_receipt_field(row, doc_map) for row in _DOCK_RECEIPT_FIELDS]
         
         filled_count = sum(1 for f in fields if f["filled"])
         
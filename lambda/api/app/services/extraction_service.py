@@ -1,18 +1,24 @@
+import hashlib
+import io
 import logging
+import orjson
+import reprlib
 from typing import Dict, Any, Optional
 from abc import ABC, abstractmethod
 
 from repositories import (
     get_image, update_extracted_info,
-    update_image_status, get_extraction_fields_for_app,
-    get_field_names_for_app, get_custom_prompt_for_app,
-    get_app_display_name, DEFAULT_APP
+    update_image_status, get_app_config, DEFAULT_APP,
+    get_cached_extraction, put_cached_extraction
 )
 from schemas import ExtractionRequest
 from config import settings
+from exceptions import NotFoundError
 from background import BackgroundTaskExtension
-from utils import decimal_to_float
-from clients import s3_client
+from utils import decimal_to_float, orjson_default, read_s3_body
+from clients import (
+    s3_client, s3_download_pool, s3_large_download_config, S3_RANGED_GET_THRESHOLD
+)
 from domains.extraction_engine import (
     extract_information_from_multi_images_with_ocr,
     extract_information_from_single_image_with_ocr
@@ -21,85 +27,151 @@ from domains.extraction_engine import (
 logger = logging.getLogger(__name__)
 
 
+def _fetch_page_image(s3_key: str, preloaded_images: Optional[dict] = None):
+    """
+    変換済み画像を1ページ分S3から取得する（OCR時に取得済みの画像があればそれを使う）
+
+    Returns:
+        (画像データ, Content-Type)。取得に失敗した場合は None
+    """
+    if preloaded_images and s3_key in preloaded_images:
+        return preloaded_images[s3_key]
+
+    try:
+        s3_response = s3_client.get_object(
+            Bucket=settings.BUCKET_NAME,
+            Key=s3_key
+        )
+        content_type = s3_response.get('ContentType', 'image/jpeg')
+
+        # 大きな画像はバイト範囲GETを並列に発行する転送マネージャーで取得し直す
+        if s3_response.get('ContentLength', 0) > S3_RANGED_GET_THRESHOLD:
+            s3_response['Body'].close()
+            buffer = io.BytesIO()
+            s3_client.download_fileobj(
+                settings.BUCKET_NAME, s3_key, buffer, Config=s3_large_download_config)
+            return buffer.getvalue(), content_type
+
+        return read_s3_body(s3_response), content_type
+    except Exception as s3_error:
+        logger.error("S3画像取得エラー %s: %s", s3_key, s3_error)
+        return None
+
+
+def _extraction_cache_key(page_images: list, app_name: str, app_extraction_fields: dict,
+                          custom_prompt: str, ocr_results) -> str:
+    """
+    抽出結果キャッシュのキーを計算する
+
+    画像の内容・アプリ・フィールド定義・カスタムプロンプト・OCR結果・モデルのいずれかが
+    変われば別のキーになるため、スキーマ更新後に古い結果が返ることはない
+    """
+    schema_version = hashlib.sha256(orjson.dumps(
+        app_extraction_fields, option=orjson.OPT_SORT_KEYS, default=orjson_default
+    )).hexdigest()
+
+    digest = hashlib.sha256()
+    for image_bytes in page_images:
+        digest.update(image_bytes)
+    digest.update(orjson.dumps(
+        [app_name, schema_version, custom_prompt or "", settings.MODEL_ID, ocr_results],
+        option=orjson.OPT_SORT_KEYS | orjson.OPT_NON_STR_KEYS,
+        default=orjson_default
+    ))
+    return digest.hexdigest()
+
+
 # ===== 抽出プロセッサークラス =====
 
 class InformationExtractor(ABC):
     """情報抽出の基底クラス"""
 
-    def __init__(self, image_id: str, image_data: dict):
+    def __init__(self, image_id: str, image_data: dict, preloaded_images: Optional[dict] = None):
         self.image_id = image_id
         self.image_data = image_data
+        self.preloaded_images = preloaded_images
 
     @abstractmethod
-    def extract(self) -> None:
-        """情報抽出を実行"""
+    def extract(self) -> Dict[str, Any]:
+        """情報抽出を実行し、結果（{"extracted_info": ..., "mapping": ...}）を返す"""
         pass
 
 
 class MultiImageExtractor(InformationExtractor):
     """複数画像情報抽出プロセッサー"""
 
-    def extract(self) -> None:
+    def extract(self) -> Dict[str, Any]:
         """複数画像からの情報抽出を実行"""
-        logger.info(f"複数画像での情報抽出を実行: {self.image_id}")
+        logger.info("複数画像での情報抽出を実行: %s", self.image_id)
 
         try:
-            image_data = get_image(self.image_id)
+            # 画像情報は ExtractionService で取得済みのものを使う
+            image_data = self.image_data
             if not image_data:
-                logger.error(f"画像 {self.image_id} が見つかりません")
+                logger.error("画像 %s が見つかりません", self.image_id)
                 update_image_status(self.image_id, "failed")
-                raise ValueError(f"画像 {self.image_id} が見つかりません")
+                raise NotFoundError(f"画像 {self.image_id} が見つかりません")
 
             app_name = image_data.get("app_name", DEFAULT_APP)
-            app_extraction_fields = get_extraction_fields_for_app(app_name)
-            field_names = get_field_names_for_app(app_name)
-            custom_prompt = get_custom_prompt_for_app(app_name)
+            app_config = get_app_config(app_name)
+            app_extraction_fields = app_config["extraction_fields"]
+            field_names = app_config["field_names"]
+            custom_prompt = app_config["custom_prompt"]
 
             logger.info(
-                f"処理アプリ: {app_name}, フィールド数: {len(app_extraction_fields.get('fields', []))}")
+                "処理アプリ: %s, フィールド数: %s", app_name, len(app_extraction_fields.get('fields', [])))
 
             converted_s3_keys = image_data.get("converted_s3_key", [])
 
             if not converted_s3_keys:
-                raise ValueError("変換済み画像が見つかりません")
+                raise NotFoundError("変換済み画像が見つかりません")
 
             if not isinstance(converted_s3_keys, list):
                 converted_s3_keys = [converted_s3_keys]
 
             from domains.extraction_engine import get_multipage_ocr_results
-            ocr_results = get_multipage_ocr_results(self.image_id)
+            ocr_results = get_multipage_ocr_results(self.image_id, image_data)
 
             if not ocr_results:
-                raise ValueError("OCR結果が見つかりません")
-
-            page_images = []
-            content_type = 'image/jpeg'
-            for s3_key in converted_s3_keys:
-                try:
-                    s3_response = s3_client.get_object(
-                        Bucket=settings.BUCKET_NAME,
-                        Key=s3_key
-                    )
-                    image_bytes = s3_response['Body'].read()
-                    page_images.append(image_bytes)
-                    if len(page_images) == 1:
-                        content_type = s3_response.get(
-                            'ContentType', 'image/jpeg')
-                except Exception as s3_error:
-                    logger.error(f"S3画像取得エラー {s3_key}: {str(s3_error)}")
-                    continue
-
-            if not page_images:
-                raise ValueError("画像データを取得できませんでした")
-
-            result = extract_information_from_multi_images_with_ocr(
-                page_images=page_images,
-                content_type=content_type,
-                ocr_results=ocr_results,
-                app_extraction_fields=app_extraction_fields,
-                field_names=field_names,
-                custom_prompt=custom_prompt
-            )
+                raise NotFoundError("OCR結果が見つかりません")
+
+            if app_config["needs_vision"]:
+                # 全ページを並列に取得（map の結果はページ順のまま）
+                fetched_pages = [
+                    page for page in s3_download_pool.map(
+                        lambda s3_key: _fetch_page_image(s3_key, self.preloaded_images),
+                        converted_s3_keys)
+                    if page is not None
+                ]
+                page_images = [image_bytes for image_bytes, _ in fetched_pages]
+                # Content-Type はレコードに保存済みの値を優先し、ない場合（古いレコード）のみレスポンスヘッダーを使う
+                content_type = image_data.get("content_type") or (
+                    fetched_pages[0][1] if fetched_pages else 'image/jpeg')
+
+                if not page_images:
+                    raise ValueError("画像データを取得できませんでした")
+            else:
+                # 画像を使わないアプリはOCR結果のみで抽出するため、S3から取得しない
+                page_images, content_type = [], None
+
+            cache_key = _extraction_cache_key(
+                page_images, app_name, app_extraction_fields, custom_prompt, ocr_results)
+            result = get_cached_extraction(cache_key)
+            if result is not None:
+                logger.info("抽出キャッシュを使用: %s", self.image_id)
+            else:
+                result = extract_information_from_multi_images_with_ocr(
+                    page_images=page_images,
+                    content_type=content_type,
+                    ocr_results=ocr_results,
+                    app_extraction_fields=app_extraction_fields,
+                    field_names=field_names,
+                    custom_prompt=custom_prompt
+                )
+                # 応答を解析できなかった場合の失敗結果はキャッシュしない（再抽出で再試行できるようにする）
+                if "error" not in result["extracted_info"]:
+                    put_cached_extraction(
+                        cache_key, result["extracted_info"], result["mapping"])
 
             update_extracted_info(
                 self.image_id,
@@ -109,10 +181,11 @@ class MultiImageExtractor(InformationExtractor):
             )
             update_image_status(self.image_id, "completed")
 
-            logger.info(f"複数画像情報抽出完了: {self.image_id}")
+            logger.info("複数画像情報抽出完了: %s", self.image_id)
+            return result
 
         except Exception as e:
-            logger.error(f"複数画像情報抽出エラー: {str(e)}")
+            logger.error("複数画像情報抽出エラー: %s", e)
             update_image_status(self.image_id, "failed")
             raise
 
@@ -120,30 +193,32 @@ class MultiImageExtractor(InformationExtractor):
 class SingleImageExtractor(InformationExtractor):
     """単一画像情報抽出プロセッサー"""
 
-    def extract(self) -> None:
+    def extract(self) -> Dict[str, Any]:
         """単一画像からの情報抽出を実行"""
-        logger.info(f"単一画像での情報抽出を実行: {self.image_id}")
+        logger.info("単一画像での情報抽出を実行: %s", self.image_id)
 
         try:
-            image_data = get_image(self.image_id)
+            # 画像情報は ExtractionService で取得済みのものを使う
+            image_data = self.image_data
             if not image_data:
-                logger.error(f"画像 {self.image_id} が見つかりません")
+                logger.error("画像 %s が見つかりません", self.image_id)
                 update_image_status(self.image_id, "failed")
-                raise ValueError(f"画像 {self.image_id} が見つかりません")
+                raise NotFoundError(f"画像 {self.image_id} が見つかりません")
 
             app_name = image_data.get("app_name", DEFAULT_APP)
-            app_extraction_fields = get_extraction_fields_for_app(app_name)
-            field_names = get_field_names_for_app(app_name)
-            custom_prompt = get_custom_prompt_for_app(app_name)
+            app_config = get_app_config(app_name)
+            app_extraction_fields = app_config["extraction_fields"]
+            field_names = app_config["field_names"]
+            custom_prompt = app_config["custom_prompt"]
 
             logger.info(
-                f"処理アプリ: {app_name}, フィールド数: {len(app_extraction_fields.get('fields', []))}")
+                "処理アプリ: %s, フィールド数: %s", app_name, len(app_extraction_fields.get('fields', [])))
 
             ocr_result = image_data.get("ocr_result", {})
             converted_s3_keys = image_data.get("converted_s3_key", [])
 
             if not converted_s3_keys:
-                raise ValueError("変換済み画像が見つかりません")
+                raise NotFoundError("変換済み画像が見つかりません")
 
             s3_key = converted_s3_keys[0] if isinstance(
                 converted_s3_keys, list) else converted_s3_keys
@@ -151,21 +226,35 @@ class SingleImageExtractor(InformationExtractor):
             if not s3_key:
                 raise ValueError("有効なS3キーが見つかりません")
 
-            s3_response = s3_client.get_object(
-                Bucket=settings.BUCKET_NAME,
-                Key=s3_key
-            )
-            image_bytes = s3_response['Body'].read()
-            content_type = s3_response.get('ContentType', 'image/jpeg')
-
-            result = extract_information_from_single_image_with_ocr(
-                image_data=image_bytes,
-                content_type=content_type,
-                ocr_result=ocr_result,
-                app_extraction_fields=app_extraction_fields,
-                field_names=field_names,
-                custom_prompt=custom_prompt
-            )
+            if app_config["needs_vision"]:
+                fetched_page = _fetch_page_image(s3_key, self.preloaded_images)
+                if fetched_page is None:
+                    raise ValueError("画像データを取得できませんでした")
+                image_bytes, content_type = fetched_page
+                # Content-Type はレコードに保存済みの値を優先する（ない場合は古いレコード）
+                content_type = image_data.get("content_type") or content_type
+            else:
+                # 画像を使わないアプリはOCR結果のみで抽出するため、S3から取得しない
+                image_bytes, content_type = None, None
+
+            cache_key = _extraction_cache_key(
+                [image_bytes] if image_bytes else [], app_name, app_extraction_fields, custom_prompt, ocr_result)
+            result = get_cached_extraction(cache_key)
+            if result is not None:
+                logger.info("抽出キャッシュを使用: %s", self.image_id)
+            else:
+                result = extract_information_from_single_image_with_ocr(
+                    image_data=image_bytes,
+                    content_type=content_type,
+                    ocr_result=ocr_result,
+                    app_extraction_fields=app_extraction_fields,
+                    field_names=field_names,
+                    custom_prompt=custom_prompt
+                )
+                # 応答を解析できなかった場合の失敗結果はキャッシュしない（再抽出で再試行できるようにする）
+                if "error" not in result["extracted_info"]:
+                    put_cached_extraction(
+                        cache_key, result["extracted_info"], result["mapping"])
 
             update_extracted_info(
                 self.image_id,
@@ -175,10 +264,11 @@ class SingleImageExtractor(InformationExtractor):
             )
             update_image_status(self.image_id, "completed")
 
-            logger.info(f"単一画像情報抽出完了: {self.image_id}")
+            logger.info("単一画像情報抽出完了: %s", self.image_id)
+            return result
 
         except Exception as e:
-            logger.error(f"単一画像情報抽出エラー: {str(e)}")
+            logger.error("単一画像情報抽出エラー: %s", e)
             update_image_status(self.image_id, "failed")
             raise
 
@@ -191,23 +281,28 @@ class ExtractionService:
     def __init__(self, background_task: Optional[BackgroundTaskExtension] = None):
         self.background_task = background_task
 
-    async def get_extraction_result(self, image_id: str) -> Dict[str, Any]:
-        """情報抽出結果を取得する"""
+    async def get_extraction_result(self, image_id: str, status_only: bool = False) -> Dict[str, Any]:
+        """
+        情報抽出結果を取得する
+
+        status_only の場合は抽出結果の変換を行わず、ステータスとアプリ情報のみを返す
+        """
         try:
             image_data = get_image(image_id)
 
             if not image_data:
-                logger.warning(f"画像が見つかりません (image_id: {image_id})")
-                raise ValueError("画像が見つかりません")
+                logger.warning("画像が見つかりません (image_id: %s)", image_id)
+                raise NotFoundError("画像が見つかりません")
 
             app_name = image_data.get("app_name", DEFAULT_APP)
-            app_display_name = get_app_display_name(app_name)
-            app_extraction_fields = get_extraction_fields_for_app(app_name)[
-                "fields"]
+            app_config = get_app_config(app_name)
+            app_display_name = app_config["display_name"]
+            app_extraction_fields = app_config["extraction_fields"]["fields"]
 
             extraction_status = image_data.get("extraction_status")
-            if extraction_status != "completed":
-                logger.info(f"抽出処理が完了していません (status: {extraction_status})")
+            if status_only or extraction_status != "completed":
+                if extraction_status != "completed":
+                    logger.info("抽出処理が完了していません (status: %s)", extraction_status)
                 return {
                     "extracted_info": {},
                     "mapping": {},
@@ -220,10 +315,12 @@ class ExtractionService:
             extracted_info = image_data.get("extracted_info", {})
             extraction_mapping = image_data.get("extraction_mapping", {})
 
-            logger.info(
-                f"DBから取得した抽出情報 (型: {type(extracted_info)}): {extracted_info}")
-            logger.info(
-                f"DBから取得したマッピング (型: {type(extraction_mapping)}): {extraction_mapping}")
+            # 抽出結果は大きくなりうるため、DEBUG 時のみ省略表記で出力する
+            if logger.isEnabledFor(logging.DEBUG):
+                logger.debug(
+                    "DBから取得した抽出情報 (型: %s): %s", type(extracted_info), reprlib.repr(extracted_info))
+                logger.debug(
+                    "DBから取得したマッピング (型: %s): %s", type(extraction_mapping), reprlib.repr(extraction_mapping))
 
             extracted_info = decimal_to_float(extracted_info)
             extraction_mapping = decimal_to_float(extraction_mapping)
@@ -237,29 +334,27 @@ class ExtractionService:
                 "fields": app_extraction_fields
             }
 
-            logger.info(f"Retrieved extraction result for image {image_id}")
+            logger.info("Retrieved extraction result for image %s", image_id)
             return result
 
         except Exception as e:
-            logger.error(f"Error getting extraction result: {str(e)}")
+            logger.error("Error getting extraction result: %s", e)
             raise
 
     async def start_extraction(self, image_id: str, request: ExtractionRequest) -> Dict[str, Any]:
         """情報抽出を開始する"""
         try:
-            logger.info(f"情報抽出を開始: {image_id}")
+            logger.info("情報抽出を開始: %s", image_id)
 
-            self.extract_information(image_id)
+            # 抽出結果は保存済みのものと同じなので、DBから取得し直さずにそのまま返す
+            result = self.extract_information(image_id)
+            extracted_info = result["extracted_info"]
 
-            # 結果を取得
-            image_data = get_image(image_id)
-            extracted_info = image_data.get("extracted_info", {})
-
-            logger.info(f"情報抽出完了: {image_id}")
+            logger.info("情報抽出完了: %s", image_id)
             return {"status": "success", "extracted_info": extracted_info}
 
         except Exception as e:
-            logger.error(f"情報抽出エラー: {str(e)}")
+            logger.error("情報抽出エラー: %s", e)
             update_image_status(image_id, "failed")
             raise
 
@@ -269,11 +364,11 @@ class ExtractionService:
             image_data = get_image(image_id)
 
             if not image_data:
-                raise ValueError("Image not found")
+                raise NotFoundError("Image not found")
 
             return {"status": image_data.get("extraction_status") or "not_started"}
         except Exception as e:
-            logger.error(f"Error getting extraction status: {str(e)}")
+            logger.error("Error getting extraction status: %s", e)
             raise
 
     async def update_extraction_result(self, image_id: str, edited_data: dict) -> None:
@@ -284,33 +379,40 @@ class ExtractionService:
 
             update_extracted_info(image_id, extracted_info, mapping)
 
-            logger.info(f"Updated extraction result for image {image_id}")
+            logger.info("Updated extraction result for image %s", image_id)
 
         except Exception as e:
-            logger.error(f"Error updating extraction result: {str(e)}")
+            logger.error("Error updating extraction result: %s", e)
             raise
 
-    def extract_information(self, image_id: str) -> None:
-        """OCR結果から情報抽出を実行"""
+    def extract_information(self, image_id: str, preloaded_images: Optional[dict] = None) -> Dict[str, Any]:
+        """
+        OCR結果から情報抽出を実行し、結果（{"extracted_info": ..., "mapping": ...}）を返す
+
+        preloaded_images（S3キー → (画像データ, Content-Type)）を渡した場合、該当する画像はS3から再取得しない
+        """
         try:
             logger.info(
-                f"Starting information extraction for image {image_id}")
+                "Starting information extraction for image %s", image_id)
 
             image_data = get_image(image_id)
             if not image_data:
-                raise ValueError(f"Image not found: {image_id}")
+                raise NotFoundError(f"Image not found: {image_id}")
 
-            extractor = self._get_extractor(image_id, image_data)
-            extractor.extract()
+            extractor = self._get_extractor(
+                image_id, image_data, preloaded_images)
+            result = extractor.extract()
 
             logger.info(
-                f"Successfully completed extraction for image {image_id}")
+                "Successfully completed extraction for image %s", image_id)
+            return result
 
         except Exception as e:
-            logger.error(f"Error during information extraction: {str(e)}")
+            logger.error("Error during information extraction: %s", e)
             raise
 
-    def _get_extractor(self, image_id: str, image_data: dict):
+    def _get_extractor(self, image_id: str, image_data: dict,
+                       preloaded_images: Optional[dict] = None):
         """処理モードに応じた抽出器を返す"""
         page_processing_mode = image_data.get(
             "page_processing_mode", "combined")
@@ -323,6 +425,6 @@ class ExtractionService:
         )
 
         if is_multiimage_combined:
-            return MultiImageExtractor(image_id, image_data)
+            return MultiImageExtractor(image_id, image_data, preloaded_images)
         else:
-            return SingleImageExtractor(image_id, image_data)
+            return SingleImageExtractor(image_id, image_data, preloaded_images)
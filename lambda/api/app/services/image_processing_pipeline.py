@@ -4,6 +4,7 @@ OCR→情報抽出の完全フローを管理
 アップロードされた画像に対してOCR処理と情報抽出を順次実行
 """
 import logging
+from typing import Optional
 from services.ocr_service import OcrService
 from services.extraction_service import ExtractionService
 
@@ -13,25 +14,37 @@ logger = logging.getLogger(__name__)
 class ImageProcessingPipeline:
     """OCR→情報抽出の完全パイプライン"""
 
-    def __init__(self):
-        self.ocr_service = OcrService()
-        self.extraction_service = ExtractionService()
-
-    def process_complete_pipeline(self, image_id: str) -> None:
-        """OCR→情報抽出の完全パイプラインを実行"""
+    def __init__(self, ocr_service: Optional[OcrService] = None,
+                 extraction_service: Optional[ExtractionService] = None):
+        # サービスは状態を持たないため、呼び出し元のインスタンスを共有できる
+        self.ocr_service = ocr_service or OcrService()
+        self.extraction_service = extraction_service or ExtractionService()
+
+    def process_complete_pipeline(self, image_id: str, image_data: Optional[dict] = None,
+                                  preloaded_images: Optional[dict] = None) -> None:
+        """
+        OCR→情報抽出の完全パイプラインを実行
+
+        image_data を渡した場合、OCR処理では画像情報を再取得しない
+        （情報抽出はOCR結果の保存後の最新データが必要なため取得し直す）
+        OCR時にS3から取得した画像はメモリ上で情報抽出に引き継ぐ
+        （preloaded_images に先読み済みの画像を渡した場合はそれも使う）
+        """
         try:
-            logger.info(f"Starting complete pipeline for image {image_id}")
+            logger.info("Starting complete pipeline for image %s", image_id)
 
             # 1. OCR処理
-            self.ocr_service.process_image_ocr(image_id)
+            preloaded_images = self.ocr_service.process_image_ocr(
+                image_id, image_data, preloaded_images)
 
             # 2. 情報抽出処理
-            self.extraction_service.extract_information(image_id)
+            self.extraction_service.extract_information(
+                image_id, preloaded_images=preloaded_images)
 
             logger.info(
-                f"Successfully completed pipeline for image {image_id}")
+                "Successfully completed pipeline for image %s", image_id)
 
         except Exception as e:
-            logger.error(f"Pipeline failed for {image_id}: {e}")
+            logger.error("Pipeline failed for %s: %s", image_id, e)
             # 既存ロジックに合わせて、エラーハンドリングは各サービス内で実行済み
             raise
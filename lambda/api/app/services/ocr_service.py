@@ -1,40 +1,64 @@
-import uuid
+import secrets
 import logging
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError, as_completed
 from typing import Optional, Dict, Any
 from abc import ABC, abstractmethod
 
 from repositories import (
     create_job, get_images, get_job, get_images_by_job_id,
-    get_image, update_ocr_result as db_update_ocr_result,
+    get_image, get_images_batch, update_ocr_result as db_update_ocr_result,
     update_image_status
 )
 from schemas import OcrResult, OcrResultResponse
 from config import settings
+from exceptions import NotFoundError
 from background import BackgroundTaskExtension
-from domains.ocr_engine import perform_ocr_multipage, perform_ocr_individual_page, perform_ocr_single_image
+from domains.ocr_engine import (
+    perform_ocr_multipage, perform_ocr_individual_page, perform_ocr_single_image, prefetch_images
+)
 
 logger = logging.getLogger(__name__)
 
+# 次のバッチの画像の先読みを待つ最大秒数（超えた場合はOCR処理でS3から取得する）
+PREFETCH_WAIT_TIMEOUT = 30
+
 
 class OcrProcessor(ABC):
     """OCR処理の基底クラス"""
 
-    def __init__(self, image_id: str):
+    def __init__(self, image_id: str, image_data: Optional[dict] = None,
+                 preloaded_images: Optional[dict] = None):
         self.image_id = image_id
+        self.image_data = image_data
+        self.preloaded_images = preloaded_images
 
     @abstractmethod
     def execute_ocr(self) -> None:
         """OCR処理を実行"""
         pass
 
+    @abstractmethod
+    def source_keys(self) -> list:
+        """OCR処理で読み込む画像のS3キー（先読み用）"""
+        pass
+
+    @staticmethod
+    def _first_key(s3_key):
+        """S3キーがリストの場合は最初の要素を返す"""
+        return s3_key[0] if isinstance(s3_key, list) else s3_key
+
 
 class MultipageOcrProcessor(OcrProcessor):
     """複数画像統合処理プロセッサー"""
 
     def execute_ocr(self) -> None:
         """複数ページのPDFを統合してOCR処理を実行"""
-        logger.info(f"複数画像統合処理を実行: {self.image_id}")
-        perform_ocr_multipage(self.image_id)
+        logger.info("複数画像統合処理を実行: %s", self.image_id)
+        perform_ocr_multipage(
+            self.image_id, self.image_data, self.preloaded_images)
+
+    def source_keys(self) -> list:
+        return list(self.image_data.get("converted_s3_key") or [])
 
 
 class IndividualPageOcrProcessor(OcrProcessor):
@@ -42,8 +66,13 @@ class IndividualPageOcrProcessor(OcrProcessor):
 
     def execute_ocr(self) -> None:
         """PDFから分割された個別ページのOCR処理を実行"""
-        logger.info(f"個別ページ処理を実行: {self.image_id}")
-        perform_ocr_individual_page(self.image_id)
+        logger.info("個別ページ処理を実行: %s", self.image_id)
+        perform_ocr_individual_page(
+            self.image_id, self.image_data, self.preloaded_images)
+
+    def source_keys(self) -> list:
+        s3_key = self._first_key(self.image_data.get("s3_key"))
+        return [s3_key] if s3_key else []
 
 
 class SingleImageOcrProcessor(OcrProcessor):
@@ -51,8 +80,14 @@ class SingleImageOcrProcessor(OcrProcessor):
 
     def execute_ocr(self) -> None:
         """単一画像ファイルのOCR処理を実行"""
-        logger.info(f"単一画像処理を実行: {self.image_id}")
-        perform_ocr_single_image(self.image_id)
+        logger.info("単一画像処理を実行: %s", self.image_id)
+        perform_ocr_single_image(
+            self.image_id, self.image_data, self.preloaded_images)
+
+    def source_keys(self) -> list:
+        s3_key = self._first_key(
+            self.image_data.get("converted_s3_key") or self.image_data.get("s3_key"))
+        return [s3_key] if s3_key else []
 
 
 class OcrService:
@@ -64,7 +99,7 @@ class OcrService:
 
     async def start_ocr_job(self, app_name: Optional[str] = None) -> str:
         """OCR処理ジョブを開始する"""
-        job_id = str(uuid.uuid4())
+        job_id = secrets.token_hex(16)
 
         try:
             # ジョブを作成
@@ -75,7 +110,7 @@ class OcrService:
                 # 特定アプリの画像のみをGSI経由で効率的に取得（DynamoDB scanの1MB制限を回避）
                 images_list = get_images(app_name)
                 logger.info(
-                    f"アプリ '{app_name}' の画像を取得しました: {len(images_list)}件")
+                    "アプリ '%s' の画像を取得しました: %s件", app_name, len(images_list))
             else:
                 # 全アプリの画像を取得（小規模データ用、大量データがある場合は要注意）
                 images_list = get_images()
@@ -93,24 +128,24 @@ class OcrService:
             # バックグラウンドタスクとしてOCR処理を実行
             if processing_images:
                 logger.info(
-                    f"バックグラウンドタスクを開始します: job_id={job_id}, images={len(processing_images)}")
+                    "バックグラウンドタスクを開始します: job_id=%s, images=%s", job_id, len(processing_images))
                 if self.background_task:
                     # バックグラウンドタスクとして実行
                     task_id = self.background_task.add_task(
                         self._process_job_pipeline, job_id)
                     logger.info(
-                        f"Started OCR job {job_id} with task ID {task_id}")
+                        "Started OCR job %s with task ID %s", job_id, task_id)
                 else:
                     # 同期実行（テスト用）
                     await self._process_ocr_background(job_id, processing_images, app_name)
             else:
-                logger.warning(f"処理対象の画像がありません: job_id={job_id}")
+                logger.warning("処理対象の画像がありません: job_id=%s", job_id)
 
-            logger.info(f"Started OCR job: {job_id}")
+            logger.info("Started OCR job: %s", job_id)
             return job_id
 
         except Exception as e:
-            logger.error(f"OCRジョブの開始エラー: {str(e)}")
+            logger.error("OCRジョブの開始エラー: %s", e)
             raise
 
     async def get_job_status(self, job_id: str) -> Dict[str, Any]:
@@ -118,7 +153,7 @@ class OcrService:
         try:
             return get_job(job_id)
         except Exception as e:
-            logger.error(f"Error getting job status: {str(e)}")
+            logger.error("Error getting job status: %s", e)
             raise
 
     async def get_ocr_result(self, image_id: str) -> OcrResultResponse:
@@ -126,7 +161,7 @@ class OcrService:
         image_data = get_image(image_id)
 
         if not image_data:
-            raise ValueError("Image not found")
+            raise NotFoundError("Image not found")
 
         ocr_result = image_data.get("ocr_result", {})
 
@@ -159,57 +194,134 @@ class OcrService:
     def _process_job_pipeline(self, job_id: str) -> None:
         """バックグラウンドタスク用のジョブパイプライン処理"""
         try:
-            logger.info(f"バックグラウンドタスク開始: job_id={job_id}")
+            logger.info("バックグラウンドタスク開始: job_id=%s", job_id)
             # ジョブに関連する画像を取得
             images = get_images_by_job_id(job_id)
-            logger.info(f"Processing job {job_id} with {len(images)} images")
-
-            # 同時処理数を制限（例: 最大2枚ずつ処理）
-            batch_size = 2
-            for i in range(0, len(images), batch_size):
-                batch = images[i:i+batch_size]
-                logger.info(
-                    f"Processing batch {i//batch_size + 1} with {len(batch)} images")
-
-                for image in batch:
-                    image_id = image.get("id")
-                    # 新実装（ImageProcessingPipelineを直接使用）
-                    from services.image_processing_pipeline import ImageProcessingPipeline
-                    pipeline = ImageProcessingPipeline()
-                    pipeline.process_complete_pipeline(image_id)
+            logger.info("Processing job %s with %s images", job_id, len(images))
+
+            # 画像情報をまとめて取得し、OCR処理での画像ごとの再取得を省く
+            images_by_id = get_images_batch([image.get("id") for image in images])
+
+            # 新実装（ImageProcessingPipelineを直接使用）
+            # image_processing_pipeline が本モジュールを import するため、ここで遅延 import する
+            from services.image_processing_pipeline import ImageProcessingPipeline
+
+            # パイプラインはジョブ内の全画像・全スレッドで共有する（状態を持たない）
+            pipeline = ImageProcessingPipeline(ocr_service=self)
+
+            def run_pipeline(image_id: str, preloaded_images: dict) -> None:
+                pipeline.process_complete_pipeline(
+                    image_id, image_data=images_by_id.get(image_id),
+                    preloaded_images=preloaded_images)
+
+            def prefetch_batch(batch: list) -> Dict[str, dict]:
+                return {
+                    image.get("id"): self.prefetch_images(
+                        image.get("id"), images_by_id.get(image.get("id")))
+                    for image in batch
+                }
+
+            # 同時処理数を制限し、バッチ内の画像は並行して処理する
+            batch_size = max(1, settings.PIPELINE_BATCH_SIZE)
+            batches = [images[i:i+batch_size] for i in range(0, len(images), batch_size)]
+            failed_image_ids = []
+            with ThreadPoolExecutor(max_workers=batch_size, thread_name_prefix="pipeline") as executor, \
+                    ThreadPoolExecutor(max_workers=1, thread_name_prefix="prefetch") as prefetcher:
+                # 現在のバッチを処理している間に次のバッチの画像を先読みする（ダブルバッファ）
+                next_prefetch = prefetcher.submit(prefetch_batch, batches[0]) if batches else None
+                for batch_index, batch in enumerate(batches):
+                    logger.info(
+                        "Processing batch %s with %s images", batch_index + 1, len(batch))
+
+                    try:
+                        preloaded_by_id = next_prefetch.result(timeout=PREFETCH_WAIT_TIMEOUT)
+                    except FutureTimeoutError:
+                        logger.warning("画像の先読みが間に合わなかったため、S3から直接取得します (batch %s)", batch_index + 1)
+                        preloaded_by_id = {}
+                    except Exception as e:
+                        logger.warning("画像の先読みに失敗しました: %s", e)
+                        preloaded_by_id = {}
+
+                    if batch_index + 1 < len(batches):
+                        next_prefetch = prefetcher.submit(prefetch_batch, batches[batch_index + 1])
+
+                    futures = {
+                        executor.submit(
+                            run_pipeline, image.get("id"), preloaded_by_id.get(image.get("id"))
+                        ): image.get("id")
+                        for image in batch
+                    }
+                    # 1枚の失敗でバッチ全体を止めない（失敗した画像のステータスは各サービスで更新済み）
+                    for future in as_completed(futures):
+                        try:
+                            future.result()
+                        except Exception as e:
+                            logger.error("Pipeline failed for %s: %s", futures[future], e)
+                            failed_image_ids.append(futures[future])
+
+            if failed_image_ids:
+                logger.warning(
+                    "Job %s: %s/%s images failed: %s", job_id, len(failed_image_ids), len(images), failed_image_ids)
 
         except Exception as e:
-            logger.error(f"Error in background OCR processing: {str(e)}")
+            logger.error("Error in background OCR processing: %s", e)
             raise
 
-    def process_image_ocr(self, image_id: str) -> None:
-        """画像のOCR処理のみを実行"""
+    def prefetch_images(self, image_id: str, image_data: Optional[dict]) -> dict:
+        """
+        OCR処理で読み込む画像をS3から先読みする
+
+        Returns:
+            S3キー → (画像データ, Content-Type) の辞書（process_image_ocr の preloaded_images に渡す）
+        """
+        if not image_data:
+            return {}
+        processor = self._get_ocr_processor(image_id, image_data)
+        return prefetch_images(processor.source_keys())
+
+    def process_image_ocr(self, image_id: str, image_data: Optional[dict] = None,
+                          preloaded_images: Optional[dict] = None) -> Dict[str, Any]:
+        """
+        画像のOCR処理のみを実行（image_data を渡した場合は再取得しない）
+
+        preloaded_images に先読み済みの画像を渡した場合、該当する画像はS3から取得しない
+
+        Returns:
+            OCR用にS3から取得した画像（S3キー → (画像データ, Content-Type)）。
+            情報抽出に渡すと同じ画像を再取得せずに済む
+        """
         try:
-            logger.info(f"Processing single image: {image_id}")
+            logger.info("Processing single image: %s", image_id)
 
             # 画像情報を取得
-            image_data = get_image(image_id)
+            if image_data is None:
+                image_data = get_image(image_id)
             if not image_data:
-                raise ValueError(f"Image not found: {image_id}")
+                raise NotFoundError(f"Image not found: {image_id}")
 
             # ステータスを処理中に更新
             update_image_status(image_id, "processing")
 
             # 処理モードを判定してOCRプロセッサーを選択
-            processor = self._get_ocr_processor(image_id, image_data)
+            if preloaded_images is None:
+                preloaded_images = {}
+            processor = self._get_ocr_processor(
+                image_id, image_data, preloaded_images)
 
             # OCR実行
             processor.execute_ocr()
 
-            logger.info(f"Successfully completed OCR for image {image_id}")
+            logger.info("Successfully completed OCR for image %s", image_id)
+            return preloaded_images
 
         except Exception as e:
             logger.error(
-                f"Error processing OCR for image {image_id}: {str(e)}")
+                "Error processing OCR for image %s: %s", image_id, e)
             update_image_status(image_id, "failed")
             raise
 
-    def _get_ocr_processor(self, image_id: str, image_data: dict):
+    def _get_ocr_processor(self, image_id: str, image_data: dict,
+                           preloaded_images: Optional[dict] = None):
         """画像の種類と処理モードに応じて適切なOCRプロセッサーを返す"""
         # クラスは同じファイル内に定義済み
 
@@ -229,12 +341,12 @@ class OcrService:
         is_individual_page = image_data.get("parent_document_id") is not None
 
         logger.info(
-            f"Processing image {image_id} (mode: {page_processing_mode})")
+            "Processing image %s (mode: %s)", image_id, page_processing_mode)
 
         # 処理モードに応じてプロセッサーを選択
         if is_multiimage_combined:
-            return MultipageOcrProcessor(image_id)
+            return MultipageOcrProcessor(image_id, image_data, preloaded_images)
         elif is_individual_page:
-            return IndividualPageOcrProcessor(image_id)
+            return IndividualPageOcrProcessor(image_id, image_data, preloaded_images)
         else:
-            return SingleImageOcrProcessor(image_id)
+            return SingleImageOcrProcessor(image_id, image_data, preloaded_images)
@@ -1,28 +1,50 @@
-from clients import s3_client
+from clients import (
+    s3_client, s3_download_pool, s3_copy_transfer_config, S3_MULTIPART_COPY_THRESHOLD
+)
+import asyncio
 import logging
 import uuid
 from datetime import datetime
 from typing import Dict, Any, Optional, List
 from botocore.exceptions import ClientError
+from cachetools import TTLCache
 
 from config import settings
-from repositories import get_app_input_methods
-from repositories import create_image_record
+from repositories import get_app_config
+from repositories import create_image_record, create_image_records_batch
 
 logger = logging.getLogger(__name__)
 
+# S3ファイル一覧のキャッシュ有効期間（秒）。同期画面のポーリングで同じ一覧を取り直さないようにする
+S3_LIST_CACHE_TTL = 30
+
 
 class S3SyncService:
     """S3同期処理を管理するサービスクラス"""
 
     def __init__(self):
         self.bucket_name = settings.BUCKET_NAME
+        # (バケット名, プレフィックス) -> ファイル一覧
+        self._list_cache = TTLCache(maxsize=128, ttl=S3_LIST_CACHE_TTL)
+
+    def invalidate_list_cache(self, bucket_name: Optional[str] = None, prefix: Optional[str] = None) -> None:
+        """
+        S3ファイル一覧のキャッシュを破棄する
+
+        バケット名を指定した場合はそのバケット（prefix も指定した場合はそのプレフィックス）のみ破棄する
+        """
+        if bucket_name is None:
+            self._list_cache.clear()
+            return
+        for key in list(self._list_cache.keys()):
+            if key[0] == bucket_name and (prefix is None or key[1] == prefix):
+                self._list_cache.pop(key, None)
 
     async def sync_s3_files(self, app_name: str, prefix: Optional[str] = None) -> Dict[str, Any]:
         """S3バケットからファイルを同期する"""
         try:
             # アプリケーションの入力方法設定を取得
-            input_methods = get_app_input_methods(app_name)
+            input_methods = get_app_config(app_name)["input_methods"]
 
             # S3同期が有効かチェック
             if not input_methods.get("s3_sync", False):
@@ -55,7 +77,7 @@ class S3SyncService:
             files = await self._list_s3_files(bucket_name, s3_path)
 
             logger.info(
-                f"Found {len(files)} files in S3 bucket {bucket_name}/{s3_path}")
+                "Found %s files in S3 bucket %s/%s", len(files), bucket_name, s3_path)
 
             return {
                 "status": "success",
@@ -66,24 +88,28 @@ class S3SyncService:
             }
 
         except Exception as e:
-            logger.error(f"Error syncing S3 files: {str(e)}")
+            logger.error("Error syncing S3 files: %s", e)
             raise
 
-    async def import_s3_file(self, app_name: str, file_data: dict) -> Dict[str, str]:
-        """S3バケットからファイルをインポートしてOCR処理を開始する"""
-        try:
-            # アプリケーションの入力方法設定を取得
-            input_methods = get_app_input_methods(app_name)
+    def _check_s3_import_enabled(self, app_name: str) -> None:
+        """アプリケーションでS3からのインポートが有効かチェックする"""
+        # アプリケーションの入力方法設定を取得
+        input_methods = get_app_config(app_name)["input_methods"]
 
-            # S3同期が有効かチェック
-            if not input_methods.get("s3_sync", False):
-                raise ValueError(f"S3同期はこのアプリケーションでは有効になっていません: {app_name}")
+        # S3同期が有効かチェック
+        if not input_methods.get("s3_sync", False):
+            raise ValueError(f"S3同期はこのアプリケーションでは有効になっていません: {app_name}")
 
-            # S3 URIを取得
-            s3_uri = input_methods.get("s3_uri", "")
+        # S3 URIを取得
+        s3_uri = input_methods.get("s3_uri", "")
 
-            if not s3_uri:
-                raise ValueError(f"S3 URIが設定されていません: {app_name}")
+        if not s3_uri:
+            raise ValueError(f"S3 URIが設定されていません: {app_name}")
+
+    async def import_s3_file(self, app_name: str, file_data: dict) -> Dict[str, str]:
+        """S3バケットからファイルをインポートしてOCR処理を開始する"""
+        try:
+            self._check_s3_import_enabled(app_name)
 
             # ファイル情報を取得
             source_bucket = file_data.get("bucket")
@@ -100,7 +126,8 @@ class S3SyncService:
             destination_key = f"s3-imports/{datetime.now().isoformat()}_{filename}"
 
             # ファイルを自分のバケットにコピー
-            await self._copy_s3_file(source_bucket, source_key, destination_key)
+            await self._copy_s3_file(
+                source_bucket, source_key, destination_key, file_data.get("size"))
 
             # DynamoDBにレコードを作成
             create_image_record(
@@ -111,7 +138,10 @@ class S3SyncService:
                 status="uploaded"
             )
 
-            logger.info(f"Imported S3 file {source_key} as image {image_id}")
+            # 同期元が自分のバケットの場合はコピーで一覧が変わるため破棄する
+            self.invalidate_list_cache(self.bucket_name)
+
+            logger.info("Imported S3 file %s as image %s", source_key, image_id)
 
             return {
                 "status": "success",
@@ -120,56 +150,195 @@ class S3SyncService:
             }
 
         except Exception as e:
-            logger.error(f"Error importing S3 file: {str(e)}")
+            logger.error("Error importing S3 file: %s", e)
             raise
 
-    async def _list_s3_files(self, bucket_name: str, prefix: str) -> List[Dict[str, Any]]:
-        """S3バケットからファイル一覧を取得する"""
+    async def import_s3_files(self, app_name: str, files: List[dict]) -> Dict[str, Any]:
+        """
+        S3バケットから複数ファイルをまとめてインポートする
+
+        コピーは並列に実行し、成功したファイルの画像レコードは BatchWriteItem でまとめて作成する。
+        失敗したファイルはファイルごとに errors で返す
+        """
         try:
-            files = []
-            paginator = s3_client.get_paginator('list_objects_v2')
+            self._check_s3_import_enabled(app_name)
+
+            timestamp = datetime.now().isoformat()
+            loop = asyncio.get_running_loop()
+
+            copies = []
+            sizes = []
+            errors = []
+            for file_data in files:
+                source_bucket = file_data.get("bucket")
+                source_key = file_data.get("key")
+                filename = file_data.get("filename")
+
+                if not all([source_bucket, source_key, filename]):
+                    errors.append({
+                        "key": source_key,
+                        "filename": filename,
+                        "error": "bucket, key, filename are required"
+                    })
+                    continue
+
+                image_id = str(uuid.uuid4())
+                # 同じタイムスタンプを共有するため、同名ファイルが衝突しないよう画像IDを含める
+                destination_key = f"s3-imports/{timestamp}_{image_id}_{filename}"
+                copies.append((image_id, source_bucket, source_key, filename, destination_key))
+                sizes.append(file_data.get("size"))
+
+            copy_results = await asyncio.gather(*[
+                loop.run_in_executor(
+                    s3_download_pool, self._copy_object,
+                    source_bucket, source_key, destination_key, size)
+                for (_, source_bucket, source_key, _, destination_key), size in zip(copies, sizes)
+            ], return_exceptions=True)
+
+            records = []
+            for (image_id, _, source_key, filename, destination_key), copy_result in zip(copies, copy_results):
+                if isinstance(copy_result, Exception):
+                    errors.append({
+                        "key": source_key,
+                        "filename": filename,
+                        "error": str(copy_result)
+                    })
+                    continue
+                records.append({
+                    "image_id": image_id,
+                    "filename": filename,
+                    "s3_key": destination_key,
+                    "app_name": app_name,
+                    "status": "uploaded"
+                })
+
+            # DynamoDBにレコードをまとめて作成
+            # 失敗した場合もコピー済みの結果は失わず、対象ファイルをファイルごとのエラーとして返す
+            # （一部のレコードは書き込み済みの可能性があるため、コピーしたオブジェクトは削除しない）
+            try:
+                await asyncio.to_thread(create_image_records_batch, records)
+            except Exception as e:
+                logger.error("Error creating image records for S3 import: %s", e)
+                detail = getattr(e, "detail", None) or str(e)
+                errors.extend(
+                    {
+                        "key": source_key,
+                        "filename": filename,
+                        "error": f"Failed to create image record: {detail}"
+                    }
+                    for (_, _, source_key, filename, _), copy_result in zip(copies, copy_results)
+                    if not isinstance(copy_result, Exception)
+                )
+                records = []
+
+            # 同期元が自分のバケットの場合はコピーで一覧が変わるため破棄する
+            self.invalidate_list_cache(self.bucket_name)
 
-            page_iterator = paginator.paginate(
-                Bucket=bucket_name,
-                Prefix=prefix
-            )
+            logger.info(
+                "Imported %s/%s S3 files for app %s", len(records), len(files), app_name)
+
+            return {
+                "status": "success" if not errors else "partial_success",
+                "imported": [
+                    {"image_id": record["image_id"], "filename": record["filename"]}
+                    for record in records
+                ],
+                "errors": errors
+            }
+
+        except Exception as e:
+            logger.error("Error importing S3 files: %s", e)
+            raise
+
+    async def _list_s3_files(self, bucket_name: str, prefix: str) -> List[Dict[str, Any]]:
+        """
+        S3バケットからファイル一覧を取得する
 
-            for page in page_iterator:
-                if 'Contents' in page:
-                    for obj in page['Contents']:
-                        # ファイルのみを対象とする（フォルダは除外）
-                        if not obj['Key'].endswith('/'):
-                            files.append({
-                                "key": obj['Key'],
-                                "filename": obj['Key'].split('/')[-1],
-                                "size": obj['Size'],
-                                "last_modified": obj['LastModified'].isoformat(),
-                                "bucket": bucket_name
-                            })
+        list_objects_v2 はスレッドで実行し、現在のページを処理している間に次のページを先読みする
+        （last_modified は datetime のまま返し、レスポンスのシリアライズ時に文字列化する）
+        """
+        cached_files = self._list_cache.get((bucket_name, prefix))
+        if cached_files is not None:
+            return cached_files
 
+        try:
+            files = []
+
+            def list_page(continuation_token: Optional[str]):
+                params = {"Bucket": bucket_name, "Prefix": prefix}
+                if continuation_token:
+                    params["ContinuationToken"] = continuation_token
+                return s3_client.list_objects_v2(**params)
+
+            page = await asyncio.to_thread(list_page, None)
+            while page is not None:
+                next_page_task = None
+                if page.get('IsTruncated'):
+                    next_page_task = asyncio.create_task(asyncio.to_thread(
+                        list_page, page.get('NextContinuationToken')))
+
+                # ファイルのみを対象とする（フォルダは除外）
+                files.extend(
+                    {
+                        "key": obj['Key'],
+                        "filename": obj['Key'].rsplit('/', 1)[-1],
+                        "size": obj['Size'],
+                        "last_modified": obj['LastModified'],
+                        "bucket": bucket_name
+                    }
+                    for obj in page.get('Contents', ())
+                    if not obj['Key'].endswith('/')
+                )
+
+                page = await next_page_task if next_page_task else None
+
+            self._list_cache[(bucket_name, prefix)] = files
             return files
 
         except ClientError as e:
-            logger.error(f"Error listing S3 files: {str(e)}")
+            logger.error("Error listing S3 files: %s", e)
             raise ValueError(f"S3バケットへのアクセスに失敗しました: {str(e)}")
 
-    async def _copy_s3_file(self, source_bucket: str, source_key: str, destination_key: str) -> None:
+    async def _copy_s3_file(self, source_bucket: str, source_key: str, destination_key: str,
+                            size: Optional[int] = None) -> None:
         """S3ファイルを自分のバケットにコピーする"""
+        self._copy_object(source_bucket, source_key, destination_key, size)
+
+    def _copy_object(self, source_bucket: str, source_key: str, destination_key: str,
+                     size: Optional[int] = None) -> None:
+        """
+        S3ファイルを自分のバケットにコピーする（ブロッキング。スレッドプールからも呼ばれる）
+
+        大きなファイルはマネージドコピーでマルチパートに分割し、サーバー側で並列にコピーする。
+        size（一覧取得時のサイズ）が分からない場合は head_object で確認する
+        """
         try:
             copy_source = {
                 'Bucket': source_bucket,
                 'Key': source_key
             }
 
-            s3_client.copy_object(
-                CopySource=copy_source,
-                Bucket=self.bucket_name,
-                Key=destination_key
-            )
+            if size is None:
+                size = s3_client.head_object(
+                    Bucket=source_bucket, Key=source_key)['ContentLength']
+
+            if int(size) > S3_MULTIPART_COPY_THRESHOLD:
+                s3_client.copy(
+                    copy_source,
+                    self.bucket_name,
+                    destination_key,
+                    Config=s3_copy_transfer_config
+                )
+            else:
+                s3_client.copy_object(
+                    CopySource=copy_source,
+                    Bucket=self.bucket_name,
+                    Key=destination_key
+                )
 
             logger.info(
-                f"Copied S3 file from {source_bucket}/{source_key} to {self.bucket_name}/{destination_key}")
+                "Copied S3 file from %s/%s to %s/%s", source_bucket, source_key, self.bucket_name, destination_key)
 
         except ClientError as e:
-            logger.error(f"Error copying S3 file: {str(e)}")
+            logger.error("Error copying S3 file: %s", e)
             raise ValueError(f"S3ファイルのコピーに失敗しました: {str(e)}")
@@ -1,15 +1,28 @@
-from clients import s3_client
+from clients import s3_client, generate_presigned_url_async
+import base64
+import hashlib
+import json
 import logging
+import os
+import re
 import uuid
-from datetime import datetime
-from typing import Dict, Any
+import asyncio
+from asyncio import Lock
+from typing import Dict, Any, Optional, Callable, Awaitable, Tuple
+
+import orjson
+from cachetools import TTLCache
+from pydantic import BaseModel
 
 from schemas import (
-    SchemaGenerateRequest, PresignedUrlRequest, CustomPromptRequest, PresignedUrlResponse, SchemaSaveRequest
+    SchemaGenerateRequest, PresignedUrlRequest, CustomPromptRequest, PresignedUrlResponse, SchemaSaveRequest,
+    AppListResponse
 )
 from config import settings
+from exceptions import BadRequestError, NotFoundError
+from utils import decimal_to_float, orjson_default, render_first_page_jpeg_async, safe_filename
 from repositories import (
-    get_app_schemas, get_app_schema, get_extraction_fields_for_app,
+    get_app_schemas, load_app_schemas_page, get_app_schema, find_app, get_extraction_fields_for_app,
     get_field_names_for_app, get_custom_prompt_for_app, update_app_schema,
     delete_app_schema
 )
@@ -17,70 +30,167 @@ from domains.schema_generator import generate_schema_fields_from_image
 
 logger = logging.getLogger(__name__)
 
+# アプリ名に使用できる文字（英数字とアンダースコアのみ）
+_APP_NAME_RE = re.compile(r'^[a-zA-Z0-9_]+\Z')
+
+# アプリ情報キャッシュの設定（更新頻度が低いため短期間キャッシュする）
+APPS_CACHE_MAXSIZE = 256
+APPS_CACHE_TTL = 30  # 秒
+APPS_CACHE_ALL_KEY = "all"
+
+# ページングの next_token に含まれる主キー属性
+_START_KEY_ATTRS = frozenset({"schema_type", "name"})
+
+
+def _compute_etag(payload: Any) -> str:
+    """レスポンス内容から弱い ETag を計算する（キャッシュ格納時に一度だけ計算する）"""
+    if isinstance(payload, BaseModel):
+        payload = payload.model_dump(mode="json", exclude_none=True)
+    body = orjson.dumps(payload, default=orjson_default)
+    return f'W/"{hashlib.blake2b(body, digest_size=8).hexdigest()}"'
+
 
 class SchemaService:
     """スキーマ・アプリ管理を行うサービスクラス"""
 
     def __init__(self):
         self.bucket_name = settings.BUCKET_NAME
-
-    async def get_apps_list(self) -> Dict[str, Any]:
-        """アプリ一覧を取得する"""
+        self._apps_cache = TTLCache(maxsize=APPS_CACHE_MAXSIZE, ttl=APPS_CACHE_TTL)
+        # キャッシュキーごとのロック（同じキーの読み込みだけをまとめ、他のキーの読み込みは待たせない）
+        self._cache_locks: Dict[Any, Lock] = {}
+
+    async def _get_cached(self, key: Any, loader: Callable[[], Awaitable[Any]]) -> Tuple[Any, str]:
+        """
+        キャッシュから (結果, ETag) を取得し、無ければ loader の結果と ETag を格納して返す
+        ETag は読み込み時に一度だけ計算し、キャッシュが有効な間はリクエストごとに計算しない
+        """
+        if key in self._apps_cache:
+            return self._apps_cache[key]
+
+        lock = self._cache_locks.setdefault(key, Lock())
         try:
-            return get_app_schemas()
+            async with lock:
+                # 待っている間に他のリクエストが読み込んでいればそれを使う
+                if key in self._apps_cache:
+                    return self._apps_cache[key]
+                result = await loader()
+                entry = (result, _compute_etag(result))
+                self._apps_cache[key] = entry
+                return entry
+        finally:
+            # 解放済みのロックは辞書から外し、キーの数だけロックが残らないようにする
+            # （待機中のリクエストは手元のロックで続行し、読み込み済みの結果を使う）
+            if not lock.locked() and self._cache_locks.get(key) is lock:
+                del self._cache_locks[key]
+
+    def _invalidate_cache(self, app_name: str) -> None:
+        """アプリ更新時に関連するキャッシュを破棄する"""
+        self._apps_cache.pop(APPS_CACHE_ALL_KEY, None)
+        self._apps_cache.pop(("fields", app_name), None)
+        self._apps_cache.pop(("custom_prompt", app_name), None)
+
+    async def get_apps_list(self) -> Tuple[AppListResponse, str]:
+        """アプリ一覧と ETag を取得する"""
+        try:
+            return await self._get_cached(APPS_CACHE_ALL_KEY, self._load_apps_list)
         except Exception as e:
             logger.error(f"Error getting apps list: {str(e)}")
             raise
 
+    async def _load_apps_list(self) -> AppListResponse:
+        """アプリ一覧をDynamoDBから取得する"""
+        apps = await asyncio.to_thread(get_app_schemas)
+        # DynamoDB の Decimal を JSON 化可能な値に揃えてからモデル化する
+        return AppListResponse(**decimal_to_float(apps))
+
+    async def get_apps_page(self, limit: int, next_token: Optional[str] = None) -> Tuple[AppListResponse, str]:
+        """アプリ一覧を1ページ分と ETag を取得する"""
+        try:
+            start_key = None
+            if next_token:
+                try:
+                    start_key = json.loads(base64.urlsafe_b64decode(next_token))
+                except Exception:
+                    raise BadRequestError("無効な next_token です")
+                # ExclusiveStartKey として渡すため、主キー（schema_type, name）の文字列のみで構成されているか確認する
+                if (not isinstance(start_key, dict) or set(start_key) != _START_KEY_ATTRS
+                        or not all(isinstance(value, str) for value in start_key.values())):
+                    raise BadRequestError("無効な next_token です")
+
+            apps, last_key = await asyncio.to_thread(
+                load_app_schemas_page, limit=limit, start_key=start_key)
+
+            result = AppListResponse(
+                apps=decimal_to_float(apps),
+                next_token=base64.urlsafe_b64encode(
+                    json.dumps(last_key).encode('utf-8')).decode('ascii') if last_key else None
+            )
+            return result, _compute_etag(result)
+        except Exception as e:
+            logger.error(f"Error getting apps page: {str(e)}")
+            raise
+
     async def get_app_details(self, app_name: str) -> Dict[str, Any]:
         """アプリ詳細を取得する"""
         try:
-            app_schemas = get_app_schemas()
-            for app in app_schemas.get("apps", []):
-                if app["name"] == app_name:
-                    return app
-            raise ValueError(f"App '{app_name}' not found")
+            app = await asyncio.to_thread(find_app, app_name)
+            if app is None:
+                raise NotFoundError(f"App '{app_name}' not found")
+            return app
         except Exception as e:
             logger.error(f"Error getting app details: {str(e)}")
             raise
 
-    async def get_app_fields(self, app_name: str) -> Dict[str, Any]:
-        """アプリのフィールド一覧を取得する"""
+    async def get_app_fields(self, app_name: str) -> Tuple[Dict[str, Any], str]:
+        """アプリのフィールド一覧と ETag を取得する"""
         try:
-            extraction_fields = get_extraction_fields_for_app(app_name)
-            field_names = get_field_names_for_app(app_name)
-
-            return {
-                "app_name": app_name,
-                "extraction_fields": extraction_fields,
-                "field_names": field_names
-            }
+            return await self._get_cached(("fields", app_name), lambda: self._load_app_fields(app_name))
         except Exception as e:
             logger.error(f"Error getting app fields: {str(e)}")
             raise
 
-    async def get_custom_prompt(self, app_name: str) -> Dict[str, str]:
-        """カスタムプロンプトを取得する"""
+    async def _load_app_fields(self, app_name: str) -> Dict[str, Any]:
+        """アプリのフィールド情報をDynamoDBから取得する"""
+        # 抽出フィールドとフィールド名はそれぞれDynamoDBを参照するため並行して取得する
+        extraction_fields, field_names = await asyncio.gather(
+            asyncio.to_thread(get_extraction_fields_for_app, app_name),
+            asyncio.to_thread(get_field_names_for_app, app_name)
+        )
+        return {
+            "app_name": app_name,
+            "extraction_fields": extraction_fields,
+            "field_names": field_names
+        }
+
+    async def get_custom_prompt(self, app_name: str) -> Tuple[Dict[str, str], str]:
+        """カスタムプロンプトと ETag を取得する"""
         try:
-            custom_prompt = get_custom_prompt_for_app(app_name)
-            return {"custom_prompt": custom_prompt}
+            return await self._get_cached(
+                ("custom_prompt", app_name),
+                lambda: self._load_custom_prompt(app_name))
         except Exception as e:
             logger.error(f"Error getting custom prompt: {str(e)}")
             raise
 
+    async def _load_custom_prompt(self, app_name: str) -> Dict[str, str]:
+        """カスタムプロンプトをDynamoDBから取得する"""
+        custom_prompt = await asyncio.to_thread(get_custom_prompt_for_app, app_name)
+        return {"custom_prompt": custom_prompt}
+
     async def update_custom_prompt(self, app_name: str, request: CustomPromptRequest) -> None:
         """カスタムプロンプトを更新する"""
         try:
             # 既存のアプリスキーマを取得
-            app_schema = get_app_schema(app_name)
+            app_schema = await asyncio.to_thread(get_app_schema, app_name)
             if not app_schema:
-                raise ValueError(f"App '{app_name}' not found")
+                raise NotFoundError(f"App '{app_name}' not found")
 
             # カスタムプロンプトを更新
             app_schema["custom_prompt"] = request.custom_prompt
 
             # スキーマを保存
-            update_app_schema(app_name, app_schema)
+            await asyncio.to_thread(update_app_schema, app_name, app_schema)
+            self._invalidate_cache(app_name)
 
             logger.info(f"Updated custom prompt for app {app_name}")
         except Exception as e:
@@ -92,16 +202,17 @@ class SchemaService:
         try:
             app_name = app_data.get("name")
             if not app_name:
-                raise ValueError("アプリ名が指定されていません")
+                raise BadRequestError("アプリ名が指定されていません")
 
             # 必須フィールドの検証
             required_fields = ["display_name", "fields"]
             for field in required_fields:
                 if field not in app_data:
-                    raise ValueError(f"必須フィールドがありません: {field}")
+                    raise BadRequestError(f"必須フィールドがありません: {field}")
 
             # アプリスキーマを更新
-            update_app_schema(app_name, app_data)
+            await asyncio.to_thread(update_app_schema, app_name, app_data)
+            self._invalidate_cache(app_name)
 
             logger.info(f"Created/updated app: {app_name}")
             return {"status": "success", "message": f"アプリ '{app_name}' を作成/更新しました"}
@@ -112,43 +223,52 @@ class SchemaService:
     async def delete_app(self, app_name: str) -> None:
         """アプリを削除する"""
         try:
-            delete_app_schema(app_name)
+            await asyncio.to_thread(delete_app_schema, app_name)
+            self._invalidate_cache(app_name)
             logger.info(f"Deleted app: {app_name}")
         except Exception as e:
             logger.error(f"Error deleting app: {str(e)}")
             raise
 
+    def _build_app_data(self, request: SchemaSaveRequest) -> Dict[str, Any]:
+        """スキーマ保存リクエストを検証し、保存するアプリデータを作成する（保存・更新で共通）"""
+        # 入力バリデーション
+        if not request.name or not request.display_name:
+            raise BadRequestError("アプリ名と表示名は必須です")
+
+        # アプリ名のバリデーション（英数字とアンダースコアのみ）
+        if not _APP_NAME_RE.match(request.name):
+            raise BadRequestError("アプリ名は英数字とアンダースコアのみ使用できます")
+
+        # 入力方法のバリデーション
+        input_methods = request.input_methods
+        if not input_methods.get("file_upload", False) and not input_methods.get("s3_sync", False):
+            raise BadRequestError("ファイルアップロードまたはS3同期のいずれかを有効にする必要があります")
+
+        # S3同期が有効な場合、S3 URIが必要
+        if input_methods.get("s3_sync", False) and not input_methods.get("s3_uri"):
+            raise BadRequestError("S3同期が有効な場合、S3 URIを指定する必要があります")
+
+        app_data = {
+            "name": request.name,
+            "display_name": request.display_name,
+            "description": request.description or f"{request.display_name}からの情報抽出",
+            "fields": request.fields,
+            "input_methods": input_methods
+        }
+        # needs_vision が未指定の場合は含めず、保存済みの値を維持する
+        if request.needs_vision is not None:
+            app_data["needs_vision"] = request.needs_vision
+        return app_data
+
     async def save_schema(self, request: SchemaSaveRequest) -> Dict[str, str]:
         """スキーマを保存する"""
         try:
-            # 入力バリデーション
-            if not request.name or not request.display_name:
-                raise ValueError("アプリ名と表示名は必須です")
-
-            # アプリ名のバリデーション（英数字とアンダースコアのみ）
-            import re
-            if not re.match(r'^[a-zA-Z0-9_]+$', request.name):
-                raise ValueError("アプリ名は英数字とアンダースコアのみ使用できます")
-
-            # 入力方法のバリデーション
-            if not request.input_methods.get("file_upload", False) and not request.input_methods.get("s3_sync", False):
-                raise ValueError("ファイルアップロードまたはS3同期のいずれかを有効にする必要があります")
-
-            # S3同期が有効な場合、S3 URIが必要
-            if request.input_methods.get("s3_sync", False) and not request.input_methods.get("s3_uri"):
-                raise ValueError("S3同期が有効な場合、S3 URIを指定する必要があります")
-
-            # スキーマデータを作成
-            app_data = {
-                "name": request.name,
-                "display_name": request.display_name,
-                "description": request.description or f"{request.display_name}からの情報抽出",
-                "fields": request.fields,
-                "input_methods": request.input_methods
-            }
+            app_data = self._build_app_data(request)
 
             # スキーマを保存
-            update_app_schema(request.name, app_data)
+            await asyncio.to_thread(update_app_schema, request.name, app_data)
+            self._invalidate_cache(request.name)
 
             logger.info(f"Saved schema for app: {request.name}")
             return {"status": "success", "message": "スキーマが正常に保存されました"}
@@ -161,17 +281,17 @@ class SchemaService:
         try:
             # 一意のS3キーを生成
             image_id = str(uuid.uuid4())
-            s3_key = f"schema-uploads/{datetime.now().isoformat()}_{request.filename}"
+            s3_key = f"schema-uploads/{image_id}/{safe_filename(request.filename)}"
 
             # 署名付きURLの生成（有効期限は15分）
-            presigned_url = s3_client.generate_presigned_url(
+            presigned_url = await generate_presigned_url_async(
                 'put_object',
-                Params={
+                {
                     'Bucket': self.bucket_name,
                     'Key': s3_key,
                     'ContentType': request.content_type
                 },
-                ExpiresIn=900,  # 15分
+                900  # 15分
             )
 
             logger.info(
@@ -186,51 +306,46 @@ class SchemaService:
             logger.error(f"Error generating schema presigned URL: {str(e)}")
             raise
 
+    def _read_uploaded_file(self, s3_key: str) -> bytes:
+        """スキーマ生成用にアップロードされたファイルをS3から読み込む"""
+        s3_response = s3_client.get_object(Bucket=settings.BUCKET_NAME, Key=s3_key)
+        return s3_response['Body'].read()
+
     async def generate_schema(self, request: SchemaGenerateRequest) -> Dict[str, Any]:
         """スキーマを自動生成する"""
         try:
             # S3からファイルを取得
             try:
-                s3_response = s3_client.get_object(
-                    Bucket=settings.BUCKET_NAME,
-                    Key=request.s3_key
-                )
-                file_data = s3_response['Body'].read()
+                file_data = await asyncio.to_thread(self._read_uploaded_file, request.s3_key)
             except Exception as e:
                 logger.error(f"S3からのファイル取得エラー: {str(e)}")
-                raise ValueError("ファイルが見つかりません")
+                raise NotFoundError("ファイルが見つかりません")
 
             # ファイルの種類を拡張子で判定
-            import os
             _, ext = os.path.splitext(request.filename)
             ext = ext.lower()
 
             # PDFの場合は画像に変換
+            mime_type = None
             if ext == '.pdf':
                 try:
-                    import fitz
-                    pdf_document = fitz.open(stream=file_data, filetype="pdf")
-                    if pdf_document.page_count > 0:
-                        page = pdf_document[0]
-                        # 高解像度で変換
-                        pix = page.get_pixmap(
-                            matrix=fitz.Matrix(300/72, 300/72))
-                        file_data = pix.tobytes("jpeg")
-                        logger.info(f"PDFを画像に変換しました: {request.filename}")
-                    else:
-                        raise ValueError("PDFにページがありません")
-                    pdf_document.close()
+                    # 高解像度で変換（CPU負荷が高いためイベントループの外で描画する）
+                    file_data = await render_first_page_jpeg_async(file_data)
+                    mime_type = "image/jpeg"
+                    logger.info(f"PDFを画像に変換しました: {request.filename}")
                 except Exception as e:
                     logger.error(f"PDF変換エラー: {str(e)}")
-                    raise ValueError("PDFの変換に失敗しました。有効なPDFファイルをアップロードしてください。")
+                    raise BadRequestError("PDFの変換に失敗しました。有効なPDFファイルをアップロードしてください。")
             elif ext not in ['.jpg', '.jpeg', '.png', '.gif']:
-                raise ValueError(
+                raise BadRequestError(
                     "サポートされていないファイル形式です。JPG、PNG、GIF、PDFのみ対応しています。")
 
-            # スキーマフィールドを生成
-            schema = generate_schema_fields_from_image(
+            # スキーマフィールドを生成（Bedrock の応答を待つ間イベントループを塞がないようスレッドで実行）
+            schema = await asyncio.to_thread(
+                generate_schema_fields_from_image,
                 file_data,
-                request.instructions
+                request.instructions,
+                mime_type
             )
 
             # 常に {"fields": [...]} の形式で返す
@@ -246,34 +361,11 @@ class SchemaService:
     async def update_schema(self, app_name: str, request: SchemaSaveRequest) -> Dict[str, str]:
         """既存のスキーマを更新する"""
         try:
-            # 入力バリデーション
-            if not request.name or not request.display_name:
-                raise ValueError("アプリ名と表示名は必須です")
-
-            # アプリ名のバリデーション（英数字とアンダースコアのみ）
-            import re
-            if not re.match(r'^[a-zA-Z0-9_]+$', request.name):
-                raise ValueError("アプリ名は英数字とアンダースコアのみ使用できます")
-
-            # 入力方法のバリデーション
-            if not request.input_methods.get("file_upload", False) and not request.input_methods.get("s3_sync", False):
-                raise ValueError("ファイルアップロードまたはS3同期のいずれかを有効にする必要があります")
-
-            # S3同期が有効な場合、S3 URIが必要
-            if request.input_methods.get("s3_sync", False) and not request.input_methods.get("s3_uri"):
-                raise ValueError("S3同期が有効な場合、S3 URIを指定する必要があります")
-
-            # スキーマデータを作成
-            app_data = {
-                "name": request.name,
-                "display_name": request.display_name,
-                "description": request.description or f"{request.display_name}からの情報抽出",
-                "fields": request.fields,
-                "input_methods": request.input_methods
-            }
+            app_data = self._build_app_data(request)
 
             # スキーマを更新
-            update_app_schema(app_name, app_data)
+            await asyncio.to_thread(update_app_schema, app_name, app_data)
+            self._invalidate_cache(app_name)
 
             logger.info(f"Updated schema for app: {app_name}")
             return {"status": "success", "message": f"アプリ '{app_name}' を更新しました"}
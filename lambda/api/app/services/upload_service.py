@@ -1,23 +1,48 @@
-from clients import s3_client
+from clients import s3_client, s3_download_pool, generate_presigned_url_async
+import asyncio
+import re
+import time
 import uuid
 import logging
-from datetime import datetime
-from typing import Dict, Any
-from fastapi.responses import StreamingResponse
-import io
+from typing import Dict, Any, Optional
+from botocore.exceptions import ClientError
+from fastapi.responses import Response, StreamingResponse
+from starlette.background import BackgroundTask
 
 from repositories import (
-    create_image_record, get_image, get_images, update_image_status, update_converted_image
+    create_image_record, get_image, get_images, update_image_status, update_converted_image,
+    update_download_url_cache
 )
 from schemas import (
-    PresignedUrlRequest, PresignedUrlResponse, UploadCompleteRequest
+    PresignedUrlRequest, PresignedUrlResponse, UploadCompleteRequest, ImageListResponse
 )
 from config import settings
-from utils import resize_image, convert_pdf_to_image
-from repositories import get_app_schemas, get_app_input_methods
+from exceptions import BadRequestError, NotFoundError
+from utils import (
+    resize_image, convert_pdf_to_image, safe_filename, probe_image_size,
+    IMAGE_MAX_DIMENSION, IMAGE_HEADER_PROBE_BYTES
+)
+from repositories import app_exists, get_app_input_methods
 
 logger = logging.getLogger(__name__)
 
+# 画像ストリーミング時のチャンクサイズ
+STREAM_CHUNK_SIZE = 64 * 1024
+
+# 画像ストリーミングで受け付ける Range ヘッダー（単一範囲のみ）
+_RANGE_HEADER_RE = re.compile(r'bytes=(\d*)-(\d*)\Z')
+
+# 署名付きURLの有効期限（秒）
+UPLOAD_URL_EXPIRES = 900  # 15分
+DOWNLOAD_URL_EXPIRES = 3600  # 1時間
+
+# 保存済みのダウンロードURLを再利用する条件（有効期限までの残り時間がこれ以上ある場合）
+DOWNLOAD_URL_REUSE_MARGIN = 300  # 5分
+
+# ダウンロード時のCache-Control
+# アップロード・変換後の画像は同じキーで上書きされないため、URLの有効期間中はブラウザにキャッシュさせる
+DOWNLOAD_CACHE_CONTROL = f"private, max-age={DOWNLOAD_URL_EXPIRES}, immutable"
+
 # 共通のS3クライアントを使用
 
 DEFAULT_APP = "default"
@@ -28,54 +53,71 @@ class UploadService:
 
     def __init__(self):
         self.bucket_name = settings.BUCKET_NAME
+        self._upload_params = {'Bucket': self.bucket_name}
+        self._download_params = {'ResponseCacheControl': DOWNLOAD_CACHE_CONTROL}
+
+    async def _sign_upload_url(self, s3_key: str, content_type: str) -> str:
+        """アップロード用（PUT）の署名付きURLを生成する"""
+        return await generate_presigned_url_async(
+            'put_object',
+            {**self._upload_params, 'Key': s3_key, 'ContentType': content_type},
+            UPLOAD_URL_EXPIRES,
+            'PUT'
+        )
+
+    async def _sign_download_url(self, bucket_name: str, s3_key: str, content_type: str) -> str:
+        """ダウンロード用（GET）の署名付きURLを生成する"""
+        return await generate_presigned_url_async(
+            'get_object',
+            {**self._download_params, 'Bucket': bucket_name, 'Key': s3_key,
+             'ResponseContentType': content_type},
+            DOWNLOAD_URL_EXPIRES,
+            'GET'
+        )
+
+    def _head_content_type(self, bucket_name: str, s3_key: str) -> str:
+        """S3オブジェクトのContent-Typeを取得する（取得できない場合は application/octet-stream）"""
+        try:
+            s3_response = s3_client.head_object(Bucket=bucket_name, Key=s3_key)
+            return s3_response.get('ContentType', 'application/octet-stream')
+        except Exception:
+            return 'application/octet-stream'
 
     async def generate_presigned_url(self, request: PresignedUrlRequest) -> PresignedUrlResponse:
         """署名付きURLを生成する"""
         try:
             # app_nameのバリデーション
-            valid_app = False
-            app_schemas = get_app_schemas()
-            for app in app_schemas.get("apps", []):
-                if app["name"] == request.app_name:
-                    valid_app = True
-                    break
-
-            if not valid_app:
+            if not await asyncio.to_thread(app_exists, request.app_name):
                 logger.warning(
                     f"Invalid app name: {request.app_name}, using default: {DEFAULT_APP}")
                 request.app_name = DEFAULT_APP
 
             # アプリケーションの入力方法設定を取得
-            input_methods = get_app_input_methods(request.app_name)
+            input_methods = await asyncio.to_thread(get_app_input_methods, request.app_name)
 
             # ファイルアップロードが有効かチェック
             if not input_methods.get("file_upload", True):
-                raise ValueError(
+                raise BadRequestError(
                     f"ファイルアップロードはこのアプリケーションでは無効です: {request.app_name}")
 
             # 一意のS3キーを生成
             image_id = str(uuid.uuid4())
-            s3_key = f"uploads/{image_id}_{datetime.now().isoformat()}_{request.filename}"
+            # image_id で一意になるため、日時は含めずファイル名をその配下に置く
+            s3_key = f"uploads/{image_id}/{safe_filename(request.filename)}"
 
             # 署名付きURLの生成（有効期限は15分）
-            presigned_url = s3_client.generate_presigned_url(
-                'put_object',
-                Params={
-                    'Bucket': self.bucket_name,
-                    'Key': s3_key,
-                    'ContentType': request.content_type
-                },
-                ExpiresIn=900,  # 15分
-            )
+            presigned_url = await self._sign_upload_url(s3_key, request.content_type)
 
             # DynamoDBにレコードを作成
-            create_image_record(
+            await asyncio.to_thread(
+                create_image_record,
                 image_id=image_id,
                 filename=request.filename,
                 s3_key=s3_key,
                 app_name=request.app_name,
                 status="uploading",  # アップロード中ステータスを設定
-                page_processing_mode=request.page_processing_mode  # 追加
+                page_processing_mode=request.page_processing_mode,  # 追加
+                content_type=request.content_type
             )
 
             logger.info(
@@ -96,15 +138,17 @@ class UploadService:
         try:
             # S3オブジェクトの存在確認
             try:
-                s3_response = s3_client.head_object(
+                s3_response = await asyncio.to_thread(
+                    s3_client.head_object,
                     Bucket=settings.BUCKET_NAME,
                     Key=request.s3_key
                 )
                 content_type = s3_response.get(
                     'ContentType', 'application/octet-stream')
+                content_length = s3_response.get('ContentLength')
             except Exception as e:
                 logger.error(f"S3 object not found: {str(e)}")
-                raise ValueError("File not found in S3")
+                raise NotFoundError("File not found in S3")
 
             # ファイル種別を判定
             is_image = content_type.startswith('image/')
@@ -112,14 +156,14 @@ class UploadService:
 
             if is_image:
                 # 画像ファイルの場合はリサイズ処理
-                await self._handle_image_resize(request, content_type)
+                await self._handle_image_resize(request, content_type, content_length)
 
             # PDFファイルの場合は変換処理を開始
             if is_pdf:
                 return await self._handle_pdf_conversion(request)
             else:
                 # 画像ファイルの場合はそのまま処理待ちに
-                update_image_status(request.image_id, "pending")
+                await asyncio.to_thread(update_image_status, request.image_id, "pending")
                 return {
                     "status": "success",
                     "message": "Upload completed successfully",
@@ -131,16 +175,42 @@ class UploadService:
             logger.error(f"Error handling upload complete: {str(e)}")
             raise
 
-    async def _handle_image_resize(self, request: UploadCompleteRequest, content_type: str) -> None:
-        """画像のリサイズ処理"""
+    async def _handle_image_resize(self, request: UploadCompleteRequest, content_type: str,
+                                   content_length: Optional[int] = None) -> None:
+        """画像のリサイズ処理（S3の読み書きとリサイズはイベントループを塞がないようスレッドで実行）"""
+        await asyncio.to_thread(self._resize_uploaded_image, request, content_type, content_length)
+
+    def _resize_uploaded_image(self, request: UploadCompleteRequest, content_type: str,
+                               content_length: Optional[int] = None) -> None:
+        """
+        アップロードされた画像を取得し、必要に応じてリサイズして保存する
+
+        先頭部分だけを Range 指定で取得して画像サイズを判定し、リサイズが不要な画像は
+        全体をダウンロードしない
+        """
         try:
-            # S3から画像を取得
+            # S3から画像の先頭部分を取得
             s3_obj = s3_client.get_object(
                 Bucket=settings.BUCKET_NAME,
-                Key=request.s3_key
+                Key=request.s3_key,
+                Range=f"bytes=0-{IMAGE_HEADER_PROBE_BYTES - 1}"
             )
             image_data = s3_obj['Body'].read()
 
+            is_complete = content_length is not None and len(image_data) >= content_length
+            if not is_complete:
+                size = probe_image_size(image_data)
+                if size and size[0] <= IMAGE_MAX_DIMENSION and size[1] <= IMAGE_MAX_DIMENSION:
+                    logger.info(f"リサイズは不要です。元の画像を使用します: {size[0]}x{size[1]}px")
+                    return
+
+                # リサイズが必要、またはサイズを判定できない場合は全体を取得する
+                s3_obj = s3_client.get_object(
+                    Bucket=settings.BUCKET_NAME,
+                    Key=request.s3_key
+                )
+                image_data = s3_obj['Body'].read()
+
             # 画像をリサイズ（resize_image関数が存在する場合）
             try:
                 resized_image_data, was_resized, orig_size, new_size = resize_image(
@@ -148,7 +218,7 @@ class UploadService:
 
                 if was_resized:
                     # リサイズされた画像をS3にアップロード
-                    converted_s3_key = f"converted/{datetime.now().isoformat()}_{request.filename}"
+                    converted_s3_key = f"converted/{request.image_id}/{safe_filename(request.filename)}"
                     s3_client.put_object(
                         Bucket=settings.BUCKET_NAME,
                         Key=converted_s3_key,
@@ -163,7 +233,8 @@ class UploadService:
                         converted_s3_key,
                         "pending",
                         orig_size,
-                        new_size
+                        new_size,
+                        content_type=content_type
                     )
                 else:
                     logger.info("リサイズは不要です。元の画像を使用します。")
@@ -178,7 +249,7 @@ class UploadService:
         """PDF変換処理"""
         try:
             # ステータスを変換中に更新
-            update_image_status(request.image_id, "converting")
+            await asyncio.to_thread(update_image_status, request.image_id, "converting")
 
             # バックグラウンドタスクとして変換処理を実行
             from main import background_task
@@ -200,33 +271,75 @@ class UploadService:
             logger.error(f"PDF conversion setup error: {str(e)}")
             raise
 
-    async def get_image_stream(self, image_id: str) -> StreamingResponse:
-        """画像をストリーミングで返す"""
+    @staticmethod
+    def _is_valid_range(range_header: str) -> bool:
+        """Range ヘッダーが単一のバイト範囲（bytes=start-end / start- / -suffix）かどうか"""
+        match = _RANGE_HEADER_RE.match(range_header.strip())
+        if not match:
+            return False
+        start, end = match.groups()
+        if not start:
+            # 末尾からの範囲（bytes=-N）は N が 1 以上である必要がある
+            return bool(end) and int(end) > 0
+        return not end or int(start) <= int(end)
+
+    async def _range_not_satisfiable(self, s3_key: str) -> Response:
+        """416 Range Not Satisfiable を返す（Content-Range にオブジェクトのサイズを含める）"""
+        s3_response = await asyncio.to_thread(
+            s3_client.head_object, Bucket=self.bucket_name, Key=s3_key)
+        return Response(
+            status_code=416,
+            headers={"Content-Range": f"bytes */{s3_response['ContentLength']}"}
+        )
+
+    async def get_image_stream(self, image_id: str, range_header: Optional[str] = None) -> Response:
+        """画像をストリーミングで返す（Rangeリクエスト対応）"""
         try:
             # 画像情報を取得
-            image_data = get_image(image_id)
+            image_data = await asyncio.to_thread(get_image, image_id)
             if not image_data:
-                raise ValueError("Image not found")
+                raise NotFoundError("Image not found")
 
             s3_key = image_data.get("s3_key")
             if isinstance(s3_key, list):
                 s3_key = s3_key[0]  # リストの場合は最初の要素
 
-            # S3から画像を取得
-            s3_response = s3_client.get_object(
-                Bucket=self.bucket_name, Key=s3_key)
-            image_data_bytes = s3_response['Body'].read()
+            # S3から画像を取得（Rangeヘッダーは形式を確認してから転送）
+            get_params = {'Bucket': self.bucket_name, 'Key': s3_key}
+            if range_header:
+                if not self._is_valid_range(range_header):
+                    return await self._range_not_satisfiable(s3_key)
+                get_params['Range'] = range_header
+            # レスポンスヘッダーが届くまで待機するため、イベントループを塞がないようスレッドで呼び出す
+            try:
+                s3_response = await asyncio.to_thread(s3_client.get_object, **get_params)
+            except ClientError as e:
+                if e.response.get('Error', {}).get('Code') == 'InvalidRange':
+                    return await self._range_not_satisfiable(s3_key)
+                raise
 
             # Content-Typeを推定
             content_type = s3_response.get(
                 'ContentType', 'application/octet-stream')
 
-            # ストリーミングレスポンスを作成
+            headers = {
+                "Content-Disposition": f"inline; filename={image_data.get('filename', 'image')}",
+                "Accept-Ranges": "bytes",
+                "Content-Length": str(s3_response['ContentLength']),
+            }
+            content_range = s3_response.get('ContentRange')
+            if content_range:
+                headers["Content-Range"] = content_range
+
+            # 全体を読み込まずにチャンク単位でストリーミングする
+            # クライアントが途中で切断した場合も接続をプールに戻せるよう、送信後に Body を閉じる
+            body = s3_response['Body']
             return StreamingResponse(
-                io.BytesIO(image_data_bytes),
+                body.iter_chunks(STREAM_CHUNK_SIZE),
+                status_code=206 if content_range else 200,
                 media_type=content_type,
-                headers={
-                    "Content-Disposition": f"inline; filename={image_data.get('filename', 'image')}"}
+                headers=headers,
+                background=BackgroundTask(body.close)
             )
 
         except Exception as e:
@@ -237,9 +350,9 @@ class UploadService:
         """ダウンロード用の署名付きURLを生成する（複数ページ対応）"""
         try:
             # 画像情報を取得
-            image_data = get_image(image_id)
+            image_data = await asyncio.to_thread(get_image, image_id)
             if not image_data:
-                raise ValueError("Image not found")
+                raise NotFoundError("Image not found")
 
             # S3キーを抽出（リスト・文字列両対応）
             def extract_s3_keys_from_dynamo_data(dynamo_data):
@@ -266,41 +379,52 @@ class UploadService:
                 bucket_name = self.bucket_name
                 logger.info(f"元画像のダウンロードURLを生成します: {bucket_name}")
             else:
-                raise ValueError("Image file not found")
+                raise NotFoundError("Image file not found")
 
             # 複数ページの署名付きURLを生成
             presigned_urls = []
             main_presigned_url = None
             main_content_type = 'application/octet-stream'
 
-            for i, s3_key in enumerate(target_s3_keys):
-                if not s3_key:
-                    continue
-
-                # S3オブジェクトのContent-Typeを取得
-                try:
-                    s3_response = s3_client.head_object(
-                        Bucket=bucket_name,
-                        Key=s3_key
-                    )
-                    content_type = s3_response.get(
-                        'ContentType', 'application/octet-stream')
-                except Exception:
-                    content_type = 'application/octet-stream'
-
-                # 署名付きURLの生成（有効期限は1時間）
-                presigned_url = s3_client.generate_presigned_url(
-                    'get_object',
-                    Params={
-                        'Bucket': bucket_name,
-                        'Key': s3_key,
-                        'ResponseContentType': content_type,
-                        'ResponseCacheControl': 'no-cache'
-                    },
-                    ExpiresIn=3600,  # 1時間
-                    HttpMethod='GET'
-                )
-
+            pages = [(i, s3_key) for i, s3_key in enumerate(target_s3_keys) if s3_key]
+
+            # 前回生成したURLが十分な有効期間を残していれば再利用する
+            # （同じURLを返すことでブラウザのキャッシュも効く）
+            cached = image_data.get("download_url_cache")
+            if (cached and pages
+                    and int(cached.get("expires_at", 0)) - DOWNLOAD_URL_REUSE_MARGIN > time.time()
+                    and [url["s3_key"] for url in cached.get("presigned_urls", [])] == [s3_key for _, s3_key in pages]):
+                presigned_urls = [
+                    {**url, "page": int(url["page"])} for url in cached["presigned_urls"]
+                ]
+                main_content_type = cached.get("content_type", main_content_type)
+                if pages and pages[0][0] == 0:
+                    main_presigned_url = presigned_urls[0]["presigned_url"]
+                return self._download_url_response(
+                    image_data, presigned_urls, main_presigned_url, main_content_type, bool(converted_s3_keys))
+
+            expires_at = int(time.time()) + DOWNLOAD_URL_EXPIRES
+
+            # S3オブジェクトのContent-Typeを取得
+            # アップロード・変換時に記録したContent-Typeがあれば head_object を省略し、
+            # ない場合（古いレコード）は全ページ分を並行して問い合わせる
+            recorded_content_type = image_data.get("content_type")
+            if recorded_content_type:
+                content_types = [recorded_content_type] * len(pages)
+            else:
+                loop = asyncio.get_running_loop()
+                content_types = await asyncio.gather(*(
+                    loop.run_in_executor(s3_download_pool, self._head_content_type, bucket_name, s3_key)
+                    for _, s3_key in pages
+                ))
+
+            # 署名付きURLの生成（有効期限は1時間）
+            signed_urls = await asyncio.gather(*(
+                self._sign_download_url(bucket_name, s3_key, content_type)
+                for (_, s3_key), content_type in zip(pages, content_types)
+            ))
+
+            for (i, s3_key), content_type, presigned_url in zip(pages, content_types, signed_urls):
                 presigned_urls.append({
                     "page": i + 1,
                     "presigned_url": presigned_url,
@@ -315,33 +439,43 @@ class UploadService:
             if not presigned_urls:
                 raise ValueError("No valid S3 keys found")
 
+            await asyncio.to_thread(update_download_url_cache, image_id, {
+                "expires_at": expires_at,
+                "content_type": main_content_type,
+                "presigned_urls": presigned_urls
+            })
+
             logger.info(f"Generated download URL for image {image_id}")
 
-            return {
-                "presigned_url": main_presigned_url,  # 単一画像用のメインURL
-                "presigned_urls": presigned_urls,
-                "total_pages": len(presigned_urls),
-                "is_multipage": len(presigned_urls) > 1,
-                "content_type": main_content_type,
-                "filename": image_data.get("filename"),
-                "is_converted": bool(converted_s3_keys)
-            }
+            return self._download_url_response(
+                image_data, presigned_urls, main_presigned_url, main_content_type, bool(converted_s3_keys))
 
         except Exception as e:
             logger.error(f"Error generating download URL: {str(e)}")
             raise
 
-    async def get_images_list(self, app_name: str = None) -> Dict[str, Any]:
+    def _download_url_response(self, image_data: Dict[str, Any], presigned_urls: list,
+                               main_presigned_url: Optional[str], main_content_type: str,
+                               is_converted: bool) -> Dict[str, Any]:
+        """ダウンロードURLのレスポンスを組み立てる"""
+        return {
+            "presigned_url": main_presigned_url,  # 単一画像用のメインURL
+            "presigned_urls": presigned_urls,
+            "total_pages": len(presigned_urls),
+            "is_multipage": len(presigned_urls) > 1,
+            "content_type": main_content_type,
+            "filename": image_data.get("filename"),
+            "is_converted": is_converted
+        }
+
+    async def get_images_list(self, app_name: str = None) -> ImageListResponse:
         """画像一覧を取得する"""
         try:
             # app_nameでフィルタリングして画像を取得
-            images = get_images(app_name)
+            images = await asyncio.to_thread(get_images, app_name)
 
             # レスポンス形式に変換
-            result = {
-                "images": images,
-                "total": len(images)
-            }
+            result = ImageListResponse(images=images, total=len(images))
 
             logger.info(f"Retrieved {len(images)} images")
             return result
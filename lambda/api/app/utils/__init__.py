@@ -2,19 +2,32 @@
 Utilities package
 """
 
-from .helpers import decimal_to_float, resize_image, float_to_decimal
+from .helpers import (
+    decimal_to_float, resize_image, float_to_decimal, orjson_default, BytesIOPool, buffer_pool,
+    read_s3_body, safe_filename, probe_image_size, IMAGE_MAX_DIMENSION, IMAGE_HEADER_PROBE_BYTES
+)
 from .pdf import (
     convert_pdf_to_image, process_combined_pages, process_single_page_combined,
-    process_individual_pages, create_individual_page
+    process_individual_pages, create_individual_page, render_first_page_jpeg, render_first_page_jpeg_async
 )
 
 __all__ = [
     'decimal_to_float',
     'float_to_decimal',
+    'orjson_default',
     'resize_image',
+    'BytesIOPool',
+    'buffer_pool',
+    'read_s3_body',
+    'safe_filename',
+    'probe_image_size',
+    'IMAGE_MAX_DIMENSION',
+    'IMAGE_HEADER_PROBE_BYTES',
     'convert_pdf_to_image',
     'process_combined_pages',
     'process_single_page_combined', 
     'process_individual_pages',
-    'create_individual_page'
+    'create_individual_page',
+    'render_first_page_jpeg',
+    'render_first_page_jpeg_async'
 ]
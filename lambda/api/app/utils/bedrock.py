@@ -1,16 +1,44 @@
 """
 Bedrock関連のユーティリティ関数
 """
+import asyncio
 import logging
 import json
+import random
+import orjson
 import time
 import re
 from typing import Dict, Any, List, Optional
-from clients import create_bedrock_client
+from botocore.exceptions import ClientError
+from clients import get_bedrock_client
 from config import settings
 
 logger = logging.getLogger(__name__)
 
+# 推論パラメータの設定
+INFERENCE_CONFIG = {
+    "temperature": 0.2,
+    "maxTokens": 40000
+}
+
+# リトライ時の待機時間の上限（秒）
+BEDROCK_RETRY_MAX_DELAY = 20
+
+# リトライ対象のエラーコード（スロットリング・サーバー側の一時的なエラーのみ）
+# ValidationException などリクエスト自体の誤りは何度送っても失敗するためリトライしない
+_RETRYABLE_ERROR_CODES = frozenset({
+    "ThrottlingException",
+    "ServiceUnavailableException",
+    "ModelStreamErrorException",
+    "ModelNotReadyException",
+    "InternalServerException",
+})
+
+# JSON部分の走査で意味を持つ文字（波括弧・ダブルクォート・エスケープ）
+_JSON_TOKEN_RE = re.compile(r'[{}"\\]')
+# 先頭・末尾の Markdown コードブロック記号（```json / ```）を除去する正規表現
+_CODE_FENCE_RE = re.compile(r'^```(?:json)?\s*|\s*```\s*\Z')
+
 
 def call_bedrock(messages, system_prompts=None, model_id=None, model_region=None):
     """
@@ -30,14 +58,8 @@ def call_bedrock(messages, system_prompts=None, model_id=None, model_region=None
 
     logger.info(f"モデル {model_id} を使用して対話を実行します (リージョン: {model_region})")
 
-    # 動的リージョン対応のため、専用クライアントを作成
-    bedrock = create_bedrock_client(model_region)
-
-    # 推論パラメータの設定
-    inference_config = {
-        "temperature": 0.2,
-        "maxTokens": 40000
-    }
+    # リージョンごとに共有しているクライアントを使用
+    bedrock = get_bedrock_client(model_region)
 
     try:
         logger.info("Bedrock APIを呼び出し中")
@@ -45,7 +67,7 @@ def call_bedrock(messages, system_prompts=None, model_id=None, model_region=None
             modelId=model_id,
             messages=messages,
             system=system_prompts,
-            inferenceConfig=inference_config
+            inferenceConfig=INFERENCE_CONFIG
         )
         logger.info("Bedrock APIの呼び出しが成功しました")
         return response
@@ -55,6 +77,87 @@ def call_bedrock(messages, system_prompts=None, model_id=None, model_region=None
         raise
 
 
+def call_bedrock_stream(messages, system_prompts=None, model_id=None, model_region=None):
+    """
+    Bedrock Converse Stream API を呼び出し、生成されたテキストを順に返す
+
+    Args:
+        messages (list): モデルに送信するメッセージのリスト
+        system_prompts (list, optional): システムプロンプトのリスト
+        model_id (str, optional): 使用するモデルID
+        model_region (str, optional): モデルのリージョン
+
+    Yields:
+        str: 生成されたテキストの差分
+    """
+    model_id = model_id or settings.MODEL_ID
+    model_region = model_region or settings.MODEL_REGION
+
+    logger.info(f"モデル {model_id} を使用してストリーミング対話を実行します (リージョン: {model_region})")
+
+    bedrock = get_bedrock_client(model_region)
+    try:
+        response = bedrock.converse_stream(
+            modelId=model_id,
+            messages=messages,
+            system=system_prompts,
+            inferenceConfig=INFERENCE_CONFIG
+        )
+    except Exception as e:
+        logger.error(f"Bedrock API呼び出しエラー: {str(e)}")
+        raise
+
+    stream = response['stream']
+    try:
+        for event in stream:
+            text = event.get('contentBlockDelta', {}).get('delta', {}).get('text')
+            if text:
+                yield text
+    finally:
+        # 途中で読むのをやめた場合も接続を閉じる
+        stream.close()
+
+
+async def call_bedrock_stream_async(messages, system_prompts=None, model_id=None, model_region=None):
+    """
+    call_bedrock_stream の非同期版（StreamingResponse などイベントループ上での利用向け）
+
+    ストリームの読み込みはスレッドで行い、イベントループを塞がない
+    """
+    stream = call_bedrock_stream(messages, system_prompts, model_id, model_region)
+    try:
+        while True:
+            text = await asyncio.to_thread(next, stream, None)
+            if text is None:
+                break
+            yield text
+    finally:
+        stream.close()
+
+
+def call_bedrock_until_json(messages, system_prompts=None, model_id=None, model_region=None):
+    """
+    Bedrock をストリーミングで呼び出し、最初のJSONオブジェクトが閉じた時点で読み込みを終える
+
+    JSONの後に続く説明文などの生成を待たずに応答を返す
+
+    Returns:
+        str: 受信したテキスト（JSONが閉じた時点まで。JSONがない場合は全文）
+    """
+    parts = []
+    scanner = _JsonSpanScanner()
+    stream = call_bedrock_stream(messages, system_prompts, model_id, model_region)
+    try:
+        for text in stream:
+            parts.append(text)
+            if scanner.feed(text):
+                break
+    finally:
+        stream.close()
+
+    return "".join(parts)
+
+
 def call_bedrock_with_retry(messages, system_prompts=None, max_retries=5):
     """
     リトライ付きBedrock呼び出し
@@ -72,11 +175,15 @@ def call_bedrock_with_retry(messages, system_prompts=None, max_retries=5):
             logger.info(f"Bedrock API呼び出し（試行回数: {attempt+1}/{max_retries}）")
             return call_bedrock(messages, system_prompts)
 
-        except Exception as e:
-            logger.error(f"Bedrock API呼び出しエラー: {str(e)}")
+        except ClientError as e:
+            error_code = e.response.get("Error", {}).get("Code")
+            if error_code not in _RETRYABLE_ERROR_CODES:
+                raise
+
             if attempt < max_retries - 1:
-                wait_time = 2 ** attempt  # 指数バックオフ
-                logger.info(f"{wait_time}秒待機してリトライします...")
+                # 指数バックオフ（フルジッター）で、同時に失敗した呼び出しのリトライ時刻を分散させる
+                wait_time = random.uniform(0, min(2 ** attempt, BEDROCK_RETRY_MAX_DELAY))
+                logger.info(f"{error_code} のため {wait_time:.1f}秒待機してリトライします...")
                 time.sleep(wait_time)
             else:
                 logger.error(f"最大試行回数 {max_retries} 回で失敗しました")
@@ -107,6 +214,91 @@ def parse_converse_response(response):
         return ""
 
 
+class _JsonSpanScanner:
+    """
+    テキスト中で最初に現れるJSONオブジェクトの範囲を求める走査器
+
+    最初の { から波括弧の深さを数え、対応する } までを1回の走査で求める。
+    文字列リテラル内の波括弧とエスケープされたダブルクォートは無視する。
+    テキストを分割して順に渡せるため、ストリーミング応答の途中でもJSONの完了を判定できる
+    """
+
+    def __init__(self):
+        self._offset = 0
+        self._start = -1
+        self._depth = 0
+        self._in_string = False
+        self._escape_pending = False
+
+    def feed(self, chunk: str) -> Optional[tuple]:
+        """
+        続きのテキストを走査する
+
+        Returns:
+            tuple: JSONオブジェクトが完了した場合は (開始位置, 終了位置)、それ以外は None
+        """
+        base = self._offset
+        self._offset += len(chunk)
+
+        scan_from = 0
+        if self._start < 0:
+            scan_from = chunk.find('{')
+            if scan_from < 0:
+                return None
+            self._start = base + scan_from
+
+        # 前のチャンクの末尾がエスケープ文字だった場合は先頭の1文字を読み飛ばす
+        escaped_pos = 0 if self._escape_pending else -1
+        self._escape_pending = False
+        for match in _JSON_TOKEN_RE.finditer(chunk, scan_from):
+            pos = match.start()
+            if pos == escaped_pos:
+                continue
+
+            char = match.group()
+            if self._in_string:
+                if char == '\\':
+                    escaped_pos = pos + 1
+                    self._escape_pending = escaped_pos == len(chunk)
+                elif char == '"':
+                    self._in_string = False
+            elif char == '"':
+                self._in_string = True
+            elif char == '{':
+                self._depth += 1
+            elif char == '}':
+                self._depth -= 1
+                if self._depth == 0:
+                    return self._start, base + pos + 1
+
+        return None
+
+
+def _find_json_span(text: str) -> Optional[tuple]:
+    """
+    テキスト中で最初に現れるJSONオブジェクトの範囲を取得する
+
+    Args:
+        text: LLMの応答テキスト
+
+    Returns:
+        tuple: (開始位置, 終了位置)。対応する } が見つからない場合は None
+    """
+    return _JsonSpanScanner().feed(text)
+
+
+def _loads_json(json_str: str):
+    """
+    JSON文字列を解析する（orjson で解析し、失敗した場合のみ標準の json で再解析）
+
+    orjson は NaN など標準の json が受け付ける一部の表記を受け付けないため、フォールバックを残す
+    """
+    try:
+        return orjson.loads(json_str)
+    except orjson.JSONDecodeError:
+        return json.loads(json_str)
+
+
 def extract_json_from_response(response_text):
     """
     レスポンステキストからJSONを抽出する
@@ -119,10 +311,10 @@ def extract_json_from_response(response_text):
     """
     try:
         # JSONを含む部分を抽出
-        json_match = re.search(r'\{[\s\S]*\}', response_text)
-        if json_match:
-            json_str = json_match.group()
-            return json.loads(json_str)
+        json_span = _find_json_span(response_text)
+        if json_span:
+            start, end = json_span
+            return _loads_json(response_text[start:end])
         else:
             logger.warning("レスポンステキストにJSONが見つかりません")
             return {}
@@ -151,20 +343,13 @@ def parse_extraction_response(ai_response, field_names):
 
     try:
         # Markdownのコードブロックを除去
-        cleaned_text = ai_response.strip()
-        if cleaned_text.startswith("```json"):
-            cleaned_text = cleaned_text[7:]  # ```json を除去
-        if cleaned_text.startswith("```"):
-            cleaned_text = cleaned_text[3:]   # ``` を除去
-        if cleaned_text.endswith("```"):
-            cleaned_text = cleaned_text[:-3]  # 末尾の ``` を除去
-        cleaned_text = cleaned_text.strip()
+        cleaned_text = _CODE_FENCE_RE.sub('', ai_response.strip())
 
         # JSONを含む部分を抽出
-        json_match = re.search(r'\{[\s\S]*\}', cleaned_text)
-        if json_match:
-            json_str = json_match.group(0)
-            response_data = json.loads(json_str)
+        json_span = _find_json_span(cleaned_text)
+        if json_span:
+            start, end = json_span
+            response_data = _loads_json(cleaned_text[start:end])
 
             # 統合形式のデータを解析
             if "extracted_data" in response_data and "indices" in response_data:
@@ -182,7 +367,7 @@ def parse_extraction_response(ai_response, field_names):
                 mapping = {field_name: [] for field_name in field_names}
 
             logger.info(
-                f"LLMからマッピング情報を取得: {json.dumps(mapping, ensure_ascii=False, indent=0)}")
+                f"LLMからマッピング情報を取得: {orjson.dumps(mapping).decode('utf-8')}")
         else:
             extracted_info = {
                 "error": "Failed to parse JSON from AI response",
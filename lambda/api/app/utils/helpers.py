@@ -1,38 +1,231 @@
 """
 共通ヘルパー関数
 """
+import io
+import json
 import logging
+import re
+import threading
+import orjson
+from contextlib import contextmanager
 from decimal import Decimal
 from io import BytesIO
 from PIL import Image
 
 logger = logging.getLogger(__name__)
 
+# SIMD対応のリサイズライブラリ（未インストールの場合は Pillow を使用）
+# Pillow 本体を Pillow-SIMD に置き換える代わりに、Lanczos の縮小のみ SIMD 実装を使う
+# （Pillow-SIMD は Pillow の公式ホイールより更新が遅く、PyMuPDF などと同じ環境で API を揃えにくいため）
+try:
+    from cykooz.resizer import FilterType, ResizeAlg, Resizer, ResizeOptions
+    _LANCZOS_OPTIONS = ResizeOptions(resize_alg=ResizeAlg.convolution(FilterType.lanczos3))
+except ImportError:
+    Resizer = None
+    logger.warning("cykooz.resizer が見つからないため、画像の縮小には Pillow の Lanczos を使用します")
 
-def decimal_to_float(obj):
-    """Decimal型をfloat型に変換してJSON serializable にする"""
+# cykooz.resizer が対応している画像モード
+_SIMD_RESIZE_MODES = ("RGB", "RGBA", "L")
+
+# Resizer は内部バッファを持つためスレッドごとに使い回す
+_resizer_state = threading.local()
+
+
+class BytesIOPool:
+    """
+    再利用可能な BytesIO バッファのプール
+
+    - acquire() はコンテキストマネージャとして空のバッファを貸し出す
+    - 返却時に max_buffer_size を超えたバッファや上限数を超えた分は破棄する
+    """
+
+    def __init__(self, max_buffers=8, max_buffer_size=16 * 1024 * 1024):
+        self._max_buffers = max_buffers
+        self._max_buffer_size = max_buffer_size
+        self._buffers = []
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def acquire(self):
+        """空の BytesIO を貸し出し、ブロックを抜けるとプールへ返却する"""
+        with self._lock:
+            buffer = self._buffers.pop() if self._buffers else BytesIO()
+        try:
+            yield buffer
+        finally:
+            self.release(buffer)
+
+    def release(self, buffer):
+        """バッファをクリアしてプールへ返却する"""
+        try:
+            size = buffer.seek(0, io.SEEK_END)
+            buffer.seek(0)
+            buffer.truncate(0)
+        except (BufferError, ValueError):
+            # memoryview が残っている・close 済みのバッファは再利用しない
+            return
+        if size > self._max_buffer_size:
+            return
+        with self._lock:
+            if len(self._buffers) < self._max_buffers:
+                self._buffers.append(buffer)
+
+
+# 画像リサイズ処理で共有するバッファプール
+buffer_pool = BytesIOPool()
+
+# S3レスポンスを読み込む際のチャンクサイズ
+S3_READ_CHUNK_SIZE = 1024 * 1024
+
+
+def read_s3_body(s3_response):
+    """
+    get_object のレスポンス本文を ContentLength 分確保したバッファに読み込む
+
+    StreamingBody.read() は全体を読み込んだ後に連結するため、一時的に画像サイズの
+    約2倍のメモリを使う。事前に確保したバッファへチャンク単位で書き込むことでこれを避ける
+
+    Returns:
+        bytearray: オブジェクトの内容
+    """
+    body = s3_response['Body']
+    content_length = s3_response.get('ContentLength')
+    if content_length is None:
+        return bytearray(body.read())
+
+    data = bytearray(content_length)
+    view = memoryview(data)
+    offset = 0
+    for chunk in body.iter_chunks(S3_READ_CHUNK_SIZE):
+        view[offset:offset + len(chunk)] = chunk
+        offset += len(chunk)
+    view.release()
+
+    if offset != content_length:
+        raise IOError(
+            f"S3オブジェクトの読み込みサイズが一致しません: {offset} / {content_length} バイト")
+    return data
+
+
+# S3キーのファイル名部分に含めない文字（パス区切り・制御文字）
+_UNSAFE_FILENAME_CHARS_RE = re.compile(r'[\\/\x00-\x1f\x7f]')
+
+
+def safe_filename(filename):
+    """
+    ファイル名をS3キーの末尾に使える形に整える
+
+    パス区切りや制御文字を _ に置き換え、キーの階層がずれないようにする。
+    日本語などの非ASCII文字はそのまま残す
+
+    Returns:
+        str: 整形後のファイル名（空・. ・.. の場合は "file"）
+    """
+    name = _UNSAFE_FILENAME_CHARS_RE.sub('_', filename or '').strip()
+    if name in ('', '.', '..'):
+        return 'file'
+    return name
+
+
+def _decimal_default(obj):
+    """decimal_to_float 用の orjson.dumps の default（有限の Decimal のみ float に変換する）"""
+    if isinstance(obj, Decimal) and obj.is_finite():
+        return float(obj)
+    # NaN・±Infinity は orjson では null になるため、TypeError で再帰による変換に切り替える
+    raise TypeError(f"Type is not JSON serializable: {type(obj).__name__}")
+
+
+def _contains_non_finite(obj, data, default=None):
+    """
+    orjson で書き出した data の元の obj に NaN・±Infinity の float が含まれるかを判定する
+
+    orjson はこれらを null として書き出すため、null を含む場合のみ標準の json（C実装）で確認する
+    """
+    if b"null" not in data:
+        return False
+    try:
+        json.dumps(obj, allow_nan=False, default=default)
+    except ValueError:
+        return True
+    return False
+
+
+def _decimal_to_float_py(obj):
     if isinstance(obj, dict):
-        return {k: decimal_to_float(v) for k, v in obj.items()}
+        return {k: _decimal_to_float_py(v) for k, v in obj.items()}
     elif isinstance(obj, list):
-        return [decimal_to_float(item) for item in obj]
+        return [_decimal_to_float_py(item) for item in obj]
     elif isinstance(obj, Decimal):
         return float(obj)
     else:
         return obj
 
 
-def float_to_decimal(obj):
-    """float型をDecimal型に変換してDynamoDB保存可能にする"""
+def decimal_to_float(obj):
+    """
+    Decimal型をfloat型に変換してJSON serializable にする
+
+    入れ子の dict / list は orjson の往復で一括変換する（Python での再帰より高速）。
+    orjson が扱えない値（set など）や NaN・±Infinity を含む場合は再帰で変換する
+    （orjson の往復では NaN などが null になるため）。
+    入れ子の tuple は list として返す（呼び出し元は JSON・DynamoDB 由来の dict / list のみを渡す）
+    """
+    if isinstance(obj, Decimal):
+        return float(obj)
+    if not isinstance(obj, (dict, list)):
+        return obj
+
+    try:
+        data = orjson.dumps(obj, default=_decimal_default)
+    except TypeError:
+        return _decimal_to_float_py(obj)
+    if _contains_non_finite(obj, data, default=_decimal_default):
+        return _decimal_to_float_py(obj)
+    return orjson.loads(data)
+
+
+def orjson_default(obj):
+    """orjson が扱えない DynamoDB の Decimal を数値に変換する（orjson.dumps の default 用）"""
+    if isinstance(obj, Decimal):
+        return int(obj) if obj == obj.to_integral_value() else float(obj)
+    raise TypeError(f"Type is not JSON serializable: {type(obj).__name__}")
+
+
+def _float_to_decimal_py(obj):
     if isinstance(obj, dict):
-        return {k: float_to_decimal(v) for k, v in obj.items()}
+        return {k: _float_to_decimal_py(v) for k, v in obj.items()}
     elif isinstance(obj, list):
-        return [float_to_decimal(item) for item in obj]
+        return [_float_to_decimal_py(item) for item in obj]
     elif isinstance(obj, float):
         return Decimal(str(obj))
     else:
         return obj
 
 
+def float_to_decimal(obj):
+    """
+    float型をDecimal型に変換してDynamoDB保存可能にする
+
+    入れ子の dict / list は orjson で書き出し、json の C 実装で float を Decimal として読み直す
+    （Python での再帰より高速。Decimal(str(x)) と同じ値になる）。
+    orjson が扱えない値（Decimal・set など）や NaN・±Infinity を含む場合は再帰で変換する
+    （orjson の往復では NaN などが null になり、値が失われるため）。
+    入れ子の tuple は list として返す（呼び出し元は JSON 由来の dict / list のみを渡す）
+    """
+    if isinstance(obj, float):
+        return Decimal(str(obj))
+    if not isinstance(obj, (dict, list)):
+        return obj
+
+    try:
+        data = orjson.dumps(obj)
+    except TypeError:
+        return _float_to_decimal_py(obj)
+    if _contains_non_finite(obj, data):
+        return _float_to_decimal_py(obj)
+    return json.loads(data, parse_float=Decimal)
+
+
 def safe_get_from_dynamo_data(data, key, default=None):
     """
     DynamoDBのデータを安全に取得
@@ -55,15 +248,62 @@ def safe_get_from_dynamo_data(data, key, default=None):
         return default
 
 
-def resize_image(image_data, max_dimension=1568, min_dimension=200):
+def _resize_lanczos(img, size):
+    """Lanczos でリサイズする（可能なら SIMD 実装を使用）"""
+    if Resizer is not None and img.mode in _SIMD_RESIZE_MODES:
+        try:
+            resizer = getattr(_resizer_state, "resizer", None)
+            if resizer is None:
+                resizer = Resizer()
+                _resizer_state.resizer = resizer
+            dst_img = Image.new(img.mode, size)
+            resizer.resize_pil(img, dst_img, _LANCZOS_OPTIONS)
+            return dst_img
+        except Exception as e:
+            logger.warning(f"SIMDリサイズに失敗したため Pillow でリサイズします: {str(e)}")
+    return img.resize(size, Image.LANCZOS)
+
+
+# 画像の長辺の上限（px）。これを超える画像は resize_image で縮小する
+IMAGE_MAX_DIMENSION = 1568
+
+# リサイズ要否の判定に読み込む画像の先頭部分のサイズ（probe_image_size に渡す量）
+# JPEG の EXIF（サムネイルを含む）の後ろにある画像サイズまで届くようにする
+IMAGE_HEADER_PROBE_BYTES = 64 * 1024
+
+
+def probe_image_size(header_data):
+    """
+    画像の先頭部分だけからサイズを取得する（画素データはデコードしない）
+
+    Args:
+        header_data: 画像ファイルの先頭部分（バイト列）
+
+    Returns:
+        tuple: (幅, 高さ)。先頭部分だけでは判定できない場合は None
+    """
+    try:
+        with Image.open(BytesIO(header_data)) as img:
+            return img.size
+    except Exception:
+        return None
+
+
+def resize_image(image_data, max_dimension=IMAGE_MAX_DIMENSION, min_dimension=200, output=None):
     """
     画像をリサイズする関数
     - 長辺が max_dimension を超える場合はリサイズ
     - 短辺が min_dimension より小さい場合は警告
     - アスペクト比は維持
+    - image_data にはバイト列またはファイルライクオブジェクトを指定可能
+    - output を指定した場合はリサイズ結果をそのバッファへ書き込み、バッファを返す
     """
     try:
-        img = Image.open(BytesIO(image_data))
+        if hasattr(image_data, "read"):
+            image_data.seek(0)
+            img = Image.open(image_data)
+        else:
+            img = Image.open(BytesIO(image_data))
         width, height = img.size
         
         # 画像サイズのログ記録
@@ -86,13 +326,25 @@ def resize_image(image_data, max_dimension=1568, min_dimension=200):
             new_height = max_dimension
             new_width = int(width * (max_dimension / height))
         
+        # JPEG はデコード時に 1/2・1/4・1/8 に縮小できるため、目標サイズ以上を保つ範囲で縮小して読み込む
+        # （デコードと Lanczos の対象画素が減る。元のサイズは上で取得済み）
+        if img.format == 'JPEG':
+            img.draft(img.mode, (new_width, new_height))
+
         # リサイズ実行
-        resized_img = img.resize((new_width, new_height), Image.LANCZOS)
+        resized_img = _resize_lanczos(img, (new_width, new_height))
         logger.info(f"リサイズ後の画像サイズ: {new_width}x{new_height}px")
         
         # BytesIOに保存して返す
-        output = BytesIO()
         img_format = img.format or 'JPEG'
+        if output is not None:
+            output.seek(0)
+            output.truncate(0)
+            resized_img.save(output, format=img_format)
+            output.seek(0)
+            return output, True, (width, height), (new_width, new_height)
+        
+        output = BytesIO()
         resized_img.save(output, format=img_format)
         output.seek(0)
         
@@ -1,23 +1,195 @@
 """
 PDF処理関連のユーティリティ関数
 """
-from clients import s3_client
+from clients import s3_client, s3_download_pool
+import asyncio
 import logging
+import multiprocessing
+import threading
 import uuid
 import os
+from concurrent.futures import ProcessPoolExecutor
 from datetime import datetime
 import boto3
 import fitz
 from PIL import Image
-import tempfile
 
 from config import settings
 from repositories import get_image, update_image_status, update_converted_image, update_ocr_result, update_parent_document_status, create_individual_page_record
 from repositories import DEFAULT_APP, get_app_input_methods
-from utils.helpers import resize_image
+from utils.helpers import buffer_pool, IMAGE_MAX_DIMENSION
 
 logger = logging.getLogger(__name__)
 
+# PDFページの描画解像度
+RENDER_DPI = 300
+
+# 変換後のページ画像のJPEG品質
+PAGE_JPEG_QUALITY = 95
+
+# スキーマ自動生成用に描画する画像のJPEG品質
+# フィールド構成の把握には十分で、既定値（95）よりBedrockへ送るデータ量を大きく減らせる
+SCHEMA_RENDER_JPEG_QUALITY = 75
+
+# スキーマ自動生成用に描画する画像の長辺（px）
+# Bedrock の画像入力はこれを超えると縮小されるため、最初からこのサイズで描画する
+SCHEMA_RENDER_MAX_DIMENSION = 1568
+
+# ページ描画用プロセスプールのワーカー数の上限
+# 各プロセスが描画中のページを保持するため、メモリの限られた環境で増やしすぎないようにする
+RENDER_POOL_MAX_WORKERS = 4
+
+# ページ描画用のプロセスプール（初回の複数ページ変換時に生成）
+_render_pool = None
+_render_pool_workers = 0
+_render_pool_unavailable = False
+# イベントループのスレッド（スキーマ生成）とバックグラウンドタスクのスレッド（アップロード処理）の
+# 両方から初期化されるため、プールが二重に生成されないようにする
+_render_pool_lock = threading.Lock()
+
+
+def _get_render_pool():
+    """ページ描画用のプロセスプールを取得（使えない環境では None）"""
+    global _render_pool, _render_pool_workers, _render_pool_unavailable
+    if _render_pool is not None or _render_pool_unavailable:
+        return _render_pool
+
+    with _render_pool_lock:
+        if _render_pool is None and not _render_pool_unavailable:
+            workers = min(os.cpu_count() or 1, RENDER_POOL_MAX_WORKERS)
+            if workers < 2:
+                # 1 vCPU ではプロセスを分けても速くならない
+                _render_pool_unavailable = True
+                return None
+            try:
+                pool = ProcessPoolExecutor(
+                    max_workers=workers, mp_context=multiprocessing.get_context("spawn"))
+                # ワーカー数を先に設定してから公開する（ロックを取らずに参照する呼び出し元のため）
+                _render_pool_workers = workers
+                _render_pool = pool
+            except OSError as e:
+                # Lambda など /dev/shm が使えない環境ではプロセス間のロックを作成できない
+                logger.warning(f"プロセスプールを利用できないため逐次描画します: {str(e)}")
+                _render_pool_unavailable = True
+        return _render_pool
+
+
+def _page_scale(page, max_dimension: int) -> float:
+    """長辺が max_dimension に収まる描画倍率を求める（RENDER_DPI を上限とする）"""
+    return min(RENDER_DPI / 72, max_dimension / max(page.rect.width, page.rect.height))
+
+
+def _encode_page(page):
+    """
+    PDFページをJPEGとして描画する
+
+    RENDER_DPI で描画してから縮小するのではなく、長辺が IMAGE_MAX_DIMENSION に
+    収まる倍率で直接描画する
+
+    Returns:
+        tuple: (画像データ, 元のサイズ（RENDER_DPI で描画した場合のサイズ）, 保存サイズ)
+    """
+    scale = _page_scale(page, IMAGE_MAX_DIMENSION)
+    pix = page.get_pixmap(matrix=fitz.Matrix(scale, scale), alpha=False)
+    saved_size = (pix.width, pix.height)
+    if scale == RENDER_DPI / 72:
+        original_size = saved_size
+    else:
+        original_size = (round(page.rect.width * RENDER_DPI / 72), round(page.rect.height * RENDER_DPI / 72))
+
+    # 通常は収まっているため、MuPDF で直接JPEGにエンコードする（Pillow を経由しない）
+    if pix.width <= IMAGE_MAX_DIMENSION and pix.height <= IMAGE_MAX_DIMENSION:
+        return pix.tobytes("jpeg", jpg_quality=PAGE_JPEG_QUALITY), original_size, saved_size
+
+    # 端数の丸めで上限を超えた場合のみ Pillow で縮小する
+    # （画素データから直接縮小し、JPEGへのエンコードは1回だけにする）
+    ratio = IMAGE_MAX_DIMENSION / max(pix.width, pix.height)
+    new_size = (min(round(pix.width * ratio), IMAGE_MAX_DIMENSION),
+                min(round(pix.height * ratio), IMAGE_MAX_DIMENSION))
+    img = Image.frombytes("RGB", [pix.width, pix.height], pix.samples)
+    img = img.resize(new_size, Image.LANCZOS)
+    with buffer_pool.acquire() as img_byte_arr:
+        img.save(img_byte_arr, format='JPEG', quality=PAGE_JPEG_QUALITY)
+        return img_byte_arr.getvalue(), original_size, new_size
+
+
+def _render_page_block_in_worker(pdf_data: bytes, page_nums: list):
+    """
+    ワーカープロセスでPDFをメモリ上で1回だけ開き、連続したページのまとまりを描画する
+
+    Returns:
+        list: ページごとの _encode_page の結果、または失敗時の例外
+    """
+    results = []
+    with fitz.open(stream=pdf_data, filetype="pdf") as pdf_document:
+        for page_num in page_nums:
+            try:
+                results.append(_encode_page(pdf_document[page_num]))
+            except Exception as e:
+                results.append(e)
+    return results
+
+
+def render_first_page_jpeg(file_data: bytes) -> bytes:
+    """
+    PDFの1ページ目をJPEGとして描画する（スキーマ自動生成用）
+
+    Args:
+        file_data: PDFファイルのデータ
+
+    Returns:
+        bytes: JPEG画像データ
+    """
+    with fitz.open(stream=file_data, filetype="pdf") as pdf_document:
+        if pdf_document.page_count == 0:
+            raise ValueError("PDFにページがありません")
+        page = pdf_document[0]
+
+        # 長辺が SCHEMA_RENDER_MAX_DIMENSION になる倍率で描画する（RENDER_DPI を上限とする）
+        scale = _page_scale(page, SCHEMA_RENDER_MAX_DIMENSION)
+        pix = page.get_pixmap(matrix=fitz.Matrix(scale, scale))
+        return pix.tobytes("jpeg", jpg_quality=SCHEMA_RENDER_JPEG_QUALITY)
+
+
+async def render_first_page_jpeg_async(file_data: bytes) -> bytes:
+    """
+    イベントループを塞がないよう、PDFの1ページ目をプロセスプールで描画する
+    プロセスプールが使えない環境ではスレッドで描画する
+    """
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_get_render_pool(), render_first_page_jpeg, file_data)
+
+
+def _render_pages(pdf_document, pdf_data, total_pages: int):
+    """
+    全ページを描画する（複数ページかつプロセスプールが使える場合は並列に描画）
+
+    Returns:
+        list: ページごとの _encode_page の結果、または失敗時の例外
+    """
+    pool = _get_render_pool() if pdf_data and total_pages > 1 else None
+    if pool is None:
+        results = []
+        for page_num in range(total_pages):
+            try:
+                results.append(_encode_page(pdf_document[page_num]))
+            except Exception as e:
+                results.append(e)
+        return results
+
+    # ページごとではなくワーカー数分の連続したまとまりに分け、PDFを開く回数をワーカー数に抑える
+    block_size = -(-total_pages // _render_pool_workers)
+    blocks = [list(range(start, min(start + block_size, total_pages)))
+              for start in range(0, total_pages, block_size)]
+    futures = [pool.submit(_render_page_block_in_worker, pdf_data, block) for block in blocks]
+    results = []
+    for block, future in zip(blocks, futures):
+        try:
+            results.extend(future.result())
+        except Exception as e:
+            results.extend([e] * len(block))
+    return results
+
 
 def convert_pdf_to_image(image_id: str, s3_key: str):
     """
@@ -53,15 +225,8 @@ def convert_pdf_to_image(image_id: str, s3_key: str):
         s3_response = s3_client.get_object(Bucket=bucket_name, Key=s3_key)
         file_content = s3_response['Body'].read()
 
-        # 一時ファイルに保存
-        with tempfile.NamedTemporaryFile(delete=False, suffix='.pdf') as temp_pdf:
-            temp_pdf.write(file_content)
-            temp_pdf_path = temp_pdf.name
-
-        try:
-            # PDFを開く
-            pdf_document = fitz.open(temp_pdf_path)
-
+        # 一時ファイルを介さずメモリ上のデータからPDFを開く
+        with fitz.open(stream=file_content, filetype="pdf") as pdf_document:
             if pdf_document.page_count == 0:
                 raise ValueError("PDF has no pages")
 
@@ -75,26 +240,17 @@ def convert_pdf_to_image(image_id: str, s3_key: str):
             # 処理モードに応じて分岐
             if processing_mode == "combined":
                 process_combined_pages(
-                    pdf_document, image_id, s3_key, upload_bucket)
+                    pdf_document, image_id, s3_key, upload_bucket, pdf_data=file_content)
             elif processing_mode == "individual" and pdf_document.page_count == 1:
                 # 1ページの個別処理は統合処理として扱う
                 logger.info("1ページの個別処理を統合処理として実行")
                 process_combined_pages(
-                    pdf_document, image_id, s3_key, upload_bucket)
+                    pdf_document, image_id, s3_key, upload_bucket, pdf_data=file_content)
             else:
                 # 2ページ以上の個別処理
                 process_individual_pages(
-                    pdf_document, image_id, s3_key, upload_bucket)
-
-            # PDFを閉じる
-            pdf_document.close()
-
-        finally:
-            # 一時ファイルの削除
-            try:
-                os.unlink(temp_pdf_path)
-            except Exception as e:
-                logger.warning(f"一時ファイルの削除に失敗しました: {str(e)}")
+                    pdf_document, image_id, s3_key, upload_bucket, pdf_data=file_content,
+                    parent_data=image_data)
 
     except Exception as e:
         logger.error(f"PDF変換エラー: {str(e)}")
@@ -110,9 +266,12 @@ def convert_pdf_to_image(image_id: str, s3_key: str):
             logger.error(f"エラー情報の保存に失敗しました: {str(db_error)}")
 
 
-def process_combined_pages(pdf_document, image_id: str, s3_key: str, upload_bucket: str):
+def process_combined_pages(pdf_document, image_id: str, s3_key: str, upload_bucket: str,
+                           pdf_data: bytes = None):
     """
     複数ページPDFを複数画像として処理する（元の実装）
+
+    pdf_data（PDFファイルのデータ）を指定した場合、ページの描画はプロセスプールで並列に行う
     """
     try:
         total_pages = pdf_document.page_count
@@ -128,30 +287,15 @@ def process_combined_pages(pdf_document, image_id: str, s3_key: str, upload_buck
             return process_single_page_combined(pdf_document, image_id, s3_key, upload_bucket)
 
         # 複数ページを個別画像として保存
-        page_s3_keys = []
         filename_base = os.path.splitext(os.path.basename(s3_key))[0]
 
-        for page_num in range(total_pages):
-            page = pdf_document[page_num]
-            pix = page.get_pixmap(dpi=300)  # 高解像度で画像化
+        rendered_pages = _render_pages(pdf_document, pdf_data, total_pages)
+        for rendered in rendered_pages:
+            if isinstance(rendered, Exception):
+                raise rendered
 
-            # PILイメージに変換
-            img = Image.frombytes("RGB", [pix.width, pix.height], pix.samples)
-
-            # 画像をバイトストリームに変換
-            import io
-            img_byte_arr = io.BytesIO()
-            img.save(img_byte_arr, format='JPEG', quality=95)
-            img_data = img_byte_arr.getvalue()
-
-            # 画像をリサイズ
-            try:
-                resized_image_data, was_resized, orig_size, new_size = resize_image(
-                    img_data)
-            except ImportError:
-                # resize_image関数がない場合はそのまま使用
-                resized_image_data = img_data
-                was_resized = False
+        def upload_page(page_num):
+            page_image_data, _, _ = rendered_pages[page_num]
 
             # S3キーを生成
             page_s3_key = f"converted/{datetime.now().isoformat()}_{filename_base}_page_{page_num + 1}.jpeg"
@@ -160,13 +304,15 @@ def process_combined_pages(pdf_document, image_id: str, s3_key: str, upload_buck
             s3_client.put_object(
                 Bucket=upload_bucket,
                 Key=page_s3_key,
-                Body=resized_image_data if was_resized else img_data,
+                Body=page_image_data,
                 ContentType='image/jpeg'
             )
-
-            page_s3_keys.append(page_s3_key)
             logger.info(
                 f"ページ {page_num + 1}/{total_pages} 保存完了: {page_s3_key}")
+            return page_s3_key
+
+        # 各ページのアップロードは並行して行う（結果はページ順）
+        page_s3_keys = list(s3_download_pool.map(upload_page, range(total_pages)))
 
         # DynamoDBを更新（複数S3キーを保存）
         update_converted_image(
@@ -176,7 +322,8 @@ def process_combined_pages(pdf_document, image_id: str, s3_key: str, upload_buck
             None,  # original_size（複数画像の場合は個別管理）
             None,  # new_size（複数画像の場合は個別管理）
             page_processing_mode="combined",
-            total_pages=total_pages
+            total_pages=total_pages,
+            content_type='image/jpeg'
         )
         logger.info(f"複数画像処理完了: {image_id}, {total_pages}ページ")
 
@@ -192,30 +339,8 @@ def process_single_page_combined(pdf_document, image_id: str, s3_key: str, uploa
     try:
         logger.info("単一ページPDFを処理します（統合モード）")
 
-        # ページを画像として処理
-        page = pdf_document[0]
-        pix = page.get_pixmap(dpi=300)  # 高解像度で画像化
-
-        # バイトデータをBytesIOオブジェクトに変換
-        import io
-        img_byte_arr = io.BytesIO()
-        img = Image.frombytes("RGB", [pix.width, pix.height], pix.samples)
-        img.save(img_byte_arr, format='JPEG', quality=95)
-        img_data = img_byte_arr.getvalue()
-
-        # 元のサイズを記録
-        original_size = (pix.width, pix.height)
-
-        # 画像をリサイズ
-        try:
-            resized_image_data, was_resized, orig_size, new_size = resize_image(
-                img_data)
-        except ImportError:
-            # resize_image関数がない場合はそのまま使用
-            resized_image_data = img_data
-            was_resized = False
-            orig_size = original_size
-            new_size = original_size
+        # ページを画像として処理（高解像度で画像化し、必要に応じてリサイズ）
+        img_data, orig_size, new_size = _encode_page(pdf_document[0])
 
         # 変換後のS3キーを生成
         filename_base = os.path.splitext(os.path.basename(s3_key))[0]
@@ -225,7 +350,7 @@ def process_single_page_combined(pdf_document, image_id: str, s3_key: str, uploa
         s3_client.put_object(
             Bucket=upload_bucket,
             Key=converted_s3_key,
-            Body=resized_image_data if was_resized else img_data,
+            Body=img_data,
             ContentType='image/jpeg'
         )
 
@@ -234,10 +359,11 @@ def process_single_page_combined(pdf_document, image_id: str, s3_key: str, uploa
             image_id,
             [converted_s3_key],  # 単一ページでもリスト形式
             "pending",
-            orig_size if was_resized else original_size,
-            new_size if was_resized else original_size,
+            orig_size,
+            new_size,
             page_processing_mode="combined",
-            total_pages=1
+            total_pages=1,
+            content_type='image/jpeg'
         )
         logger.info(f"単一ページ処理完了: {image_id}")
 
@@ -246,9 +372,13 @@ def process_single_page_combined(pdf_document, image_id: str, s3_key: str, uploa
         raise
 
 
-def process_individual_pages(pdf_document, parent_image_id: str, s3_key: str, upload_bucket: str):
+def process_individual_pages(pdf_document, parent_image_id: str, s3_key: str, upload_bucket: str,
+                             pdf_data: bytes = None, parent_data: dict = None):
     """
     複数ページPDFを個別ページとして処理する
+
+    pdf_data（PDFファイルのデータ）を指定した場合、ページの描画はプロセスプールで並列に行う
+    parent_data（取得済みの親ドキュメントの画像レコード）を指定した場合、親ドキュメントを再取得しない
     """
     try:
         total_pages = pdf_document.page_count
@@ -261,27 +391,42 @@ def process_individual_pages(pdf_document, parent_image_id: str, s3_key: str, up
             total_pages=total_pages
         )
 
-        created_page_ids = []
+        # 全ページを先に描画（プロセスプールが使える場合は並列）
+        rendered_pages = _render_pages(pdf_document, pdf_data, total_pages)
 
-        # 各ページを個別に処理
-        for page_num in range(total_pages):
+        # 親ドキュメントの情報は全ページで共通のため一度だけ取得する（取得済みの場合は再利用）
+        if parent_data is None:
+            parent_data = get_image(parent_image_id)
+
+        def create_page(page_num):
+            rendered = rendered_pages[page_num]
             try:
+                if isinstance(rendered, Exception):
+                    raise rendered
                 page_id = create_individual_page(
                     pdf_document,
                     page_num,
                     parent_image_id,
                     s3_key,
                     upload_bucket,
-                    total_pages
+                    total_pages,
+                    rendered=rendered,
+                    parent_data=parent_data
                 )
-                created_page_ids.append(page_id)
                 logger.info(
                     f"個別ページ {page_num + 1}/{total_pages} 作成完了: {page_id}")
+                return page_id
 
             except Exception as page_error:
                 logger.error(f"ページ {page_num + 1} の処理でエラー: {str(page_error)}")
                 # 個別ページのエラーでも処理を続行
-                continue
+                return None
+
+        # 各ページのアップロードとレコード作成は並行して行う
+        created_page_ids = [
+            page_id for page_id in s3_download_pool.map(create_page, range(total_pages))
+            if page_id
+        ]
 
         # 親ドキュメントのステータスを更新
         if created_page_ids:
@@ -298,38 +443,22 @@ def process_individual_pages(pdf_document, parent_image_id: str, s3_key: str, up
 
 
 def create_individual_page(pdf_document, page_num: int, parent_image_id: str,
-                           s3_key: str, upload_bucket: str, total_pages: int):
+                           s3_key: str, upload_bucket: str, total_pages: int, rendered=None,
+                           parent_data=None):
     """
     個別ページを作成・保存する
 
+    Args:
+        rendered (tuple, optional): 描画済みの (画像データ, 元のサイズ, 保存サイズ)
+        parent_data (dict, optional): 取得済みの親ドキュメントの画像レコード
+
     Returns:
         str: 作成されたページのID
     """
-    # ページを画像として処理
-    page = pdf_document[page_num]
-    pix = page.get_pixmap(dpi=300)
-
-    # PILイメージに変換
-    img = Image.frombytes("RGB", [pix.width, pix.height], pix.samples)
-
-    # 画像をバイトストリームに変換
-    import io
-    img_byte_arr = io.BytesIO()
-    img.save(img_byte_arr, format='JPEG', quality=95)
-    img_data = img_byte_arr.getvalue()
-
-    # 元のサイズを記録
-    original_size = (pix.width, pix.height)
-
-    # 画像をリサイズ
-    try:
-        resized_image_data, was_resized, orig_size, new_size = resize_image(
-            img_data)
-    except ImportError:
-        resized_image_data = img_data
-        was_resized = False
-        orig_size = original_size
-        new_size = original_size
+    # ページを画像として処理（描画済みでなければここで描画）
+    if rendered is None:
+        rendered = _encode_page(pdf_document[page_num])
+    page_image_data, orig_size, new_size = rendered
 
     # S3キーを生成
     filename_base = os.path.splitext(os.path.basename(s3_key))[0]
@@ -339,13 +468,14 @@ def create_individual_page(pdf_document, page_num: int, parent_image_id: str,
     s3_client.put_object(
         Bucket=upload_bucket,
         Key=page_s3_key,
-        Body=resized_image_data if was_resized else img_data,
+        Body=page_image_data,
         ContentType='image/jpeg'
     )
 
     # 個別ページレコードを作成
     page_id = str(uuid.uuid4())
-    parent_data = get_image(parent_image_id)
+    if parent_data is None:
+        parent_data = get_image(parent_image_id)
 
     create_individual_page_record(
         page_id=page_id,
@@ -355,8 +485,8 @@ def create_individual_page(pdf_document, page_num: int, parent_image_id: str,
         page_number=page_num + 1,
         total_pages=total_pages,
         app_name=parent_data.get("app_name"),
-        original_size=orig_size if was_resized else original_size,
-        new_size=new_size if was_resized else original_size
+        original_size=orig_size,
+        new_size=new_size
     )
 
     return page_id
@@ -2,6 +2,7 @@
 import json
 import boto3
 import os
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
 
 s3 = boto3.client("s3")
@@ -10,6 +11,9 @@ dynamodb = boto3.resource("dynamodb")
 MASTER_DATA_BUCKET = os.environ.get("MASTER_DATA_BUCKET_NAME")
 SCHEMAS_TABLE = os.environ.get("SCHEMAS_TABLE_NAME")
 
+# Lambda の実行環境が再利用される間は Table リソースも使い回す
+schemas_table = dynamodb.Table(SCHEMAS_TABLE) if SCHEMAS_TABLE else None
+
 
 def handler(event, context):
     """CDK Custom Resource handler"""
@@ -52,31 +56,39 @@ def load_datacheck_schemas():
         }
     ]
     
-    table = dynamodb.Table(SCHEMAS_TABLE)
+    table = schemas_table
     
-    for schema_info in schemas:
-        # S3からスキーマJSONを読み込み
-        response = s3.get_object(Bucket=MASTER_DATA_BUCKET, Key=schema_info["s3_key"])
-        schema_json = response['Body'].read().decode('utf-8')
-        fields = json.loads(schema_json)
-        
-        # スキーマを登録
-        item = {
-            "schema_type": "app",
-            "name": schema_info["name"],
-            "display_name": schema_info["display_name"],
-            "description": schema_info["description"],
-            "fields": fields,
-            "input_methods": {
-                "file_upload": True,
-                "s3_sync": False
-            },
-            "created_at": datetime.utcnow().isoformat(),
-            "updated_at": datetime.utcnow().isoformat(),
-        }
-        
-        table.put_item(Item=item)
-        print(f"Loaded {schema_info['name']} schema with {len(fields)} fields")
+    # S3からスキーマJSONを並行して読み込み
+    with ThreadPoolExecutor(max_workers=len(schemas)) as executor:
+        fields_list = list(executor.map(
+            lambda schema_info: read_schema_fields(schema_info["s3_key"]), schemas))
+    
+    # スキーマをまとめて登録
+    with table.batch_writer() as batch:
+        for schema_info, fields in zip(schemas, fields_list):
+            item = {
+                "schema_type": "app",
+                "name": schema_info["name"],
+                "display_name": schema_info["display_name"],
+                "description": schema_info["description"],
+                "fields": fields,
+                "input_methods": {
+                    "file_upload": True,
+                    "s3_sync": False
+                },
+                "created_at": datetime.utcnow().isoformat(),
+                "updated_at": datetime.utcnow().isoformat(),
+            }
+            
+            batch.put_item(Item=item)
+            print(f"Loaded {schema_info['name']} schema with {len(fields)} fields")
+
+
+def read_schema_fields(s3_key):
+    """Read schema fields JSON from S3"""
+    response = s3.get_object(Bucket=MASTER_DATA_BUCKET, Key=s3_key)
+    # json.loads は UTF-8 のバイト列をそのまま受け付けるため、文字列へのデコードを挟まない
+    return json.loads(response['Body'].read())
 
 
 def send_response(event, context, status, data):
@@ -3,13 +3,18 @@ import json
 import boto3
 import os
 import csv
+import codecs
+import queue
+from concurrent.futures import ThreadPoolExecutor
 
 s3 = boto3.client("s3")
-dynamodb = boto3.resource("dynamodb")
 
 MASTER_DATA_BUCKET = os.environ.get("MASTER_DATA_BUCKET_NAME")
 PORT_CODES_TABLE = os.environ.get("PORT_CODES_TABLE_NAME")
 
+# DynamoDB への書き込みを並行して行うスレッド数
+WRITER_THREADS = 4
+
 
 def handler(event, context):
     """CDK Custom Resource handler"""
@@ -31,27 +36,62 @@ def handler(event, context):
 
 def load_port_codes():
     """Load port codes from S3 CSV to DynamoDB"""
-    # S3からCSVを読み込み
+    # S3からCSVを読み込み（全体を読み込まず1行ずつデコードする）
     response = s3.get_object(Bucket=MASTER_DATA_BUCKET, Key="data/port_codes.csv")
-    csv_content = response['Body'].read().decode('utf-8')
     
-    table = dynamodb.Table(PORT_CODES_TABLE)
+    # CSVをパース（列の位置はヘッダー行から決める）
+    csv_reader = csv.reader(codecs.getreader('utf-8')(response['Body']))
+    header = next(csv_reader)
+    port_code_idx = header.index("port_code")
+    port_name_idx = header.index("port_name")
+    country_idx = header.index("country")
+    
+    # 読み込んだ行をキュー経由で複数の batch_writer に振り分けて並行して書き込む
+    item_queue = queue.Queue(maxsize=WRITER_THREADS * 100)
+    with ThreadPoolExecutor(max_workers=WRITER_THREADS) as executor:
+        futures = [executor.submit(write_port_codes, item_queue) for _ in range(WRITER_THREADS)]
+        try:
+            for row in csv_reader:
+                if not row:
+                    continue
+                item_queue.put({
+                    "port_code": row[port_code_idx],
+                    "port_name": row[port_name_idx],
+                    "country": row[country_idx],
+                })
+        finally:
+            # 各スレッドに終了を知らせる
+            for _ in futures:
+                item_queue.put(None)
+        count = sum(future.result() for future in futures)
     
-    # CSVをパース
-    csv_reader = csv.DictReader(csv_content.splitlines())
+    print(f"Loaded {count} port codes")
+
+
+def write_port_codes(item_queue):
+    """Write port codes from the queue to DynamoDB until None is received"""
+    # boto3 のリソースはスレッド間で共有できないため、スレッドごとにセッションを作成する
+    table = boto3.session.Session().resource("dynamodb").Table(PORT_CODES_TABLE)
     count = 0
+    error = None
     
     with table.batch_writer() as batch:
-        for row in csv_reader:
-            item = {
-                "port_code": row["port_code"],
-                "port_name": row["port_name"],
-                "country": row["country"],
-            }
-            batch.put_item(Item=item)
-            count += 1
+        while True:
+            item = item_queue.get()
+            if item is None:
+                break
+            if error is not None:
+                # 書き込みに失敗した後もキューを読み進め、読み込み側が詰まらないようにする
+                continue
+            try:
+                batch.put_item(Item=item)
+                count += 1
+            except Exception as e:
+                error = e
     
-    print(f"Loaded {count} port codes")
+    if error is not None:
+        raise error
+    return count
 
 
 def send_response(event, context, status, data):
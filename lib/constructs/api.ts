@@ -49,6 +49,8 @@ export interface ApiProps {
   datacheckProjectsTable: Table;
   portCodesTable: Table;
   feedbackTable: Table;
+  extractionCacheTable: Table;
+  ocrCacheTable: Table;
   userPoolId: string;
   userPoolClientId: string;
   enableOcr: boolean;
@@ -140,6 +142,8 @@ export class Api extends Construct {
         actions: [
           "dynamodb:PutItem",
           "dynamodb:GetItem",
+          "dynamodb:BatchGetItem",
+          "dynamodb:BatchWriteItem",
           "dynamodb:UpdateItem",
           "dynamodb:DeleteItem",
           "dynamodb:Query",
@@ -151,6 +155,8 @@ export class Api extends Construct {
           props.schemasTable.tableArn,
           props.datacheckProjectsTable.tableArn,
           props.feedbackTable.tableArn,
+          props.extractionCacheTable.tableArn,
+          props.ocrCacheTable.tableArn,
           ...(props.toolsTable ? [props.toolsTable.tableArn] : []),
           `${imagesTable.tableArn}/index/*`, // GSIへのアクセス権限も追加
           `${props.feedbackTable.tableArn}/index/*`, // FeedbackテーブルのGSI
@@ -173,6 +179,8 @@ export class Api extends Construct {
         TOOLS_TABLE_NAME: props.toolsTable?.tableName || "",
         DATACHECK_PROJECTS_TABLE_NAME: props.datacheckProjectsTable.tableName,
         FEEDBACK_TABLE_NAME: props.feedbackTable.tableName,
+        EXTRACTION_CACHE_TABLE_NAME: props.extractionCacheTable.tableName,
+        OCR_CACHE_TABLE_NAME: props.ocrCacheTable.tableName,
         ENABLE_OCR: props.enableOcr.toString(),
         SAGEMAKER_ENDPOINT_NAME: props.sagemakerEndpointName || "",
         SAGEMAKER_INFERENCE_COMPONENT_NAME:
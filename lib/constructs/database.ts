@@ -9,6 +9,8 @@ export class Database extends Construct {
   public readonly datacheckProjectsTable: Table;
   public readonly portCodesTable: Table;
   public readonly feedbackTable: Table;
+  public readonly extractionCacheTable: Table;
+  public readonly ocrCacheTable: Table;
 
   constructor(scope: Construct, id: string) {
     super(scope, id);
@@ -84,6 +86,22 @@ export class Database extends Construct {
       sortKey: { name: "timestamp", type: AttributeType.STRING },
     });
 
+    // 情報抽出結果のキャッシュテーブル（画像・設定のハッシュをキーに、TTLで自動削除）
+    this.extractionCacheTable = new Table(this, "ExtractionCacheTable", {
+      partitionKey: { name: "cache_key", type: AttributeType.STRING },
+      billingMode: BillingMode.PAY_PER_REQUEST,
+      removalPolicy: RemovalPolicy.DESTROY,
+      timeToLiveAttribute: "expires_at",
+    });
+
+    // OCR結果のキャッシュテーブル（画像のハッシュとOCRエンジンのバージョンをキーに、TTLで自動削除）
+    this.ocrCacheTable = new Table(this, "OcrCacheTable", {
+      partitionKey: { name: "cache_key", type: AttributeType.STRING },
+      billingMode: BillingMode.PAY_PER_REQUEST,
+      removalPolicy: RemovalPolicy.DESTROY,
+      timeToLiveAttribute: "expires_at",
+    });
+
     // テーブル名を出力
     new CfnOutput(this, "ImagesTableName", {
       value: this.imagesTable.tableName,
@@ -114,5 +132,15 @@ export class Database extends Construct {
       value: this.feedbackTable.tableName,
       description: "DynamoDB DataCheck Feedback Table Name",
     });
+
+    new CfnOutput(this, "ExtractionCacheTableName", {
+      value: this.extractionCacheTable.tableName,
+      description: "DynamoDB Extraction Cache Table Name",
+    });
+
+    new CfnOutput(this, "OcrCacheTableName", {
+      value: this.ocrCacheTable.tableName,
+      description: "DynamoDB OCR Cache Table Name",
+    });
   }
 }
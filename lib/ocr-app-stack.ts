@@ -49,6 +49,8 @@ export class OcrAppStack extends cdk.Stack {
       datacheckProjectsTable: database.datacheckProjectsTable,
       portCodesTable: database.portCodesTable,
       feedbackTable: database.feedbackTable,
+      extractionCacheTable: database.extractionCacheTable,
+      ocrCacheTable: database.ocrCacheTable,
       userPoolId: auth.userPool.userPoolId,
       userPoolClientId: auth.client.userPoolClientId,
       enableOcr: enableOcr,
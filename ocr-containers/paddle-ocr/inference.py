@@ -1,12 +1,16 @@
 import os
-import json
+import asyncio
 import logging
 import traceback
 import base64
+import io
 import numpy as np
 import cv2
+import orjson
+from concurrent.futures import ThreadPoolExecutor
+from PIL import Image
 from fastapi import FastAPI, Request
-from fastapi.responses import JSONResponse
+from fastapi.responses import ORJSONResponse
 from paddleocr import PaddleOCR
 import uvicorn
 import sys
@@ -21,23 +25,71 @@ if not logger.handlers:
     ))
     logger.addHandler(h)
 
-app = FastAPI()
+app = FastAPI(default_response_class=ORJSONResponse)
 ocr_instance = None
 
+# Pool of loaded PaddleOCR instances shared by concurrent /invocations
+ocr_pool = None
+ocr_executor = None
+
+# Inference device (USE_GPU is set by the CDK OCR construct)
+USE_GPU = os.environ.get('USE_GPU', 'true').lower() == 'true'
+
+# CPU cores given to each PaddleOCR instance when running on CPU
+CPU_CORES_PER_MODEL = 4
+
+# Number of PaddleOCR instances. On GPU a single instance keeps device memory
+# bounded; on CPU one instance per CPU_CORES_PER_MODEL cores
+OCR_MODEL_INSTANCES = int(os.environ.get(
+    'OCR_MODEL_INSTANCES',
+    1 if USE_GPU else max(1, (os.cpu_count() or 1) // CPU_CORES_PER_MODEL)
+))
+
+# TensorRT is required for reduced-precision (fp16) inference in PaddleOCR 3.x.
+# It is off by default because the base image does not ship TensorRT.
+USE_TENSORRT = os.environ.get('USE_TENSORRT', 'false').lower() == 'true'
+OCR_PRECISION = os.environ.get('OCR_PRECISION', 'fp16')
+
+# Images whose shorter side stays at or above this size after reduction are
+# decoded at 1/2 or 1/4 scale (JPEG is scaled inside the decoder)
+REDUCED_DECODE_MIN_SIDE = 2000
+
+_REDUCED_DECODE_FLAGS = (
+    (4, cv2.IMREAD_REDUCED_COLOR_4),
+    (2, cv2.IMREAD_REDUCED_COLOR_2),
+)
+
 
 def load_ocr_models():
-    """Initialize PaddleOCR model"""
-    global ocr_instance
+    """Initialize PaddleOCR models (OCR_MODEL_INSTANCES instances) and the model pool"""
+    global ocr_instance, ocr_pool, ocr_executor
 
-    logger.info("Initializing PaddleOCR...")
+    device = 'gpu:0' if USE_GPU else 'cpu'
+    device_options = {'device': device}
+    if USE_GPU and USE_TENSORRT:
+        device_options.update(use_tensorrt=True, precision=OCR_PRECISION)
+
+    logger.info(f"Initializing PaddleOCR x{OCR_MODEL_INSTANCES}... ({device_options})")
 
     try:
-        ocr_instance = PaddleOCR(
-            lang='japan',
-            use_doc_orientation_classify=False,
-            use_doc_unwarping=False,
-            use_textline_orientation=False
-        )
+        models = [
+            PaddleOCR(
+                lang='japan',
+                use_doc_orientation_classify=False,
+                use_doc_unwarping=False,
+                use_textline_orientation=False,
+                **device_options
+            )
+            for _ in range(OCR_MODEL_INSTANCES)
+        ]
+
+        ocr_pool = asyncio.Queue()
+        for model in models:
+            ocr_pool.put_nowait(model)
+        ocr_executor = ThreadPoolExecutor(
+            max_workers=OCR_MODEL_INSTANCES, thread_name_prefix="ocr")
+
+        ocr_instance = models[0]
         logger.info("PaddleOCR initialization completed")
         return ocr_instance
 
@@ -54,7 +106,7 @@ def parse_request_data(request_body: bytes, content_type: str):
     try:
         if content_type == 'application/json':
             # Expect base64 encoded image in JSON format
-            input_data = json.loads(request_body)
+            input_data = orjson.loads(request_body)
             if 'image' in input_data:
                 image_data = base64.b64decode(input_data['image'])
                 return {'image_data': image_data}
@@ -70,6 +122,63 @@ def parse_request_data(request_body: bytes, content_type: str):
         return {'error': str(e)}
 
 
+def probe_image_size(image_data: bytes):
+    """Read image width/height from the header without decoding pixels"""
+    try:
+        with Image.open(io.BytesIO(image_data)) as img:
+            return img.size
+    except Exception:
+        return None
+
+
+def decode_image(image_data: bytes):
+    """
+    Decode image data with OpenCV, using reduced decoding for oversized images
+
+    Returns:
+        tuple: (decoded image or None, (scale_x, scale_y) to map coordinates
+               back to the original image)
+    """
+    buf = np.frombuffer(image_data, dtype="uint8")
+
+    size = probe_image_size(image_data)
+    if size is not None:
+        width, height = size
+        for factor, flag in _REDUCED_DECODE_FLAGS:
+            if min(width, height) // factor >= REDUCED_DECODE_MIN_SIDE:
+                img = cv2.imdecode(buf, flag)
+                if img is not None:
+                    logger.info(
+                        f"Decoded {width}x{height} image at 1/{factor} scale: "
+                        f"{img.shape[1]}x{img.shape[0]}")
+                    # imdecode applies EXIF orientation (axes may be swapped), so scale
+                    # back by the reduction factor rather than the stored dimensions
+                    return img, (float(factor), float(factor))
+                break
+
+    return cv2.imdecode(buf, cv2.IMREAD_COLOR), (1.0, 1.0)
+
+
+def scale_polys(polys, scale):
+    """
+    Map detected polygons back to original image coordinates in one numpy pass
+
+    The arrays are returned as-is; ORJSONResponse serializes numpy natively
+    """
+    if len(polys) == 0:
+        return []
+    try:
+        stacked = np.stack([np.asarray(poly) for poly in polys])
+    except ValueError:
+        # Polygons with differing point counts cannot be stacked
+        if scale == (1.0, 1.0):
+            return [np.asarray(poly) for poly in polys]
+        return [np.asarray(poly, dtype=np.float64) * scale for poly in polys]
+    if scale != (1.0, 1.0):
+        stacked = stacked.astype(np.float64) * scale
+    return stacked
+
+
 def perform_ocr(input_data, ocr_model):
     """Perform OCR processing and return results"""
     logger.info("Starting OCR processing")
@@ -83,9 +192,7 @@ def perform_ocr(input_data, ocr_model):
             return {'error': 'No image data available', 'words': []}
 
         # Load image data with OpenCV
-        image_data = input_data['image_data']
-        img = np.frombuffer(image_data, dtype="uint8")
-        img = cv2.imdecode(img, cv2.IMREAD_COLOR)
+        img, scale = decode_image(input_data['image_data'])
         if img is None:
             return {'error': 'Failed to decode image', 'words': []}
 
@@ -100,19 +207,19 @@ def perform_ocr(input_data, ocr_model):
 
         for result in results:
             if isinstance(result, dict) and 'rec_texts' in result and 'rec_polys' in result and 'rec_scores' in result:
-                for i, (text, poly, score) in enumerate(zip(
-                    result['rec_texts'],
-                    result['rec_polys'], 
-                    result['rec_scores']
-                )):
-                    if text.strip():  # Skip empty strings
-                        word_dict = {
-                            "id": i,
-                            "content": text,
-                            "rec_score": float(score),
-                            "points": poly.tolist() if hasattr(poly, 'tolist') else poly
-                        }
-                        json_data["words"].append(word_dict)
+                texts = result['rec_texts']
+                polys = scale_polys(result['rec_polys'], scale)
+                scores = np.asarray(result['rec_scores'], dtype=np.float64)
+                json_data["words"].extend(
+                    {
+                        "id": i,
+                        "content": text,
+                        "rec_score": score,
+                        "points": poly
+                    }
+                    for i, (text, poly, score) in enumerate(zip(texts, polys, scores))
+                    if text.strip()  # Skip empty strings
+                )
 
         logger.info(f"OCR completed: {len(json_data['words'])} words detected")
         return json_data
@@ -129,7 +236,7 @@ async def ping():
     logger.info("Health check requested")
     health = ocr_instance is not None
     status = 200 if health else 404
-    return JSONResponse(
+    return ORJSONResponse(
         content={"status": "healthy" if health else "unhealthy"},
         status_code=status
     )
@@ -149,16 +256,21 @@ async def invocations(request: Request):
         # Parse request data
         input_data = parse_request_data(request_body, content_type)
 
-        # Execute OCR processing
-        prediction = perform_ocr(input_data, ocr_instance)
+        # Execute OCR processing on a pooled model, off the event loop
+        model = await ocr_pool.get()
+        try:
+            loop = asyncio.get_running_loop()
+            prediction = await loop.run_in_executor(ocr_executor, perform_ocr, input_data, model)
+        finally:
+            ocr_pool.put_nowait(model)
 
         logger.info("Returning OCR results")
-        return JSONResponse(content=prediction)
+        return ORJSONResponse(content=prediction)
 
     except Exception as e:
         logger.error(f"Inference error: {str(e)}")
         logger.error(traceback.format_exc())
-        return JSONResponse(
+        return ORJSONResponse(
             content={"error": str(e), "words": []},
             status_code=500
         )
@@ -174,4 +286,4 @@ if __name__ == '__main__':
     # Start FastAPI server
     port = int(os.environ.get('PORT', 8080))
     logger.info(f"Starting FastAPI server on port {port}")
-    uvicorn.run(app, host='0.0.0.0', port=port)
+    uvicorn.run(app, host='0.0.0.0', port=port, loop='uvloop', http='httptools')